@@ -13,9 +13,18 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 
 load_dotenv()
 
+# Профиль настроек (DJANGO_PROFILE): development - DEBUG и инструменты разработчика
+# (django_extensions, debug toolbar); production - без них: воркер стартует быстрее
+# и не импортирует ничего лишнего. От профиля зависят значения по умолчанию ниже
+SETTINGS_PROFILE = os.getenv("DJANGO_PROFILE", "development")
+
+# Запуск manage.py test
+TESTING = sys.argv[1:2] == ["test"]
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -26,11 +35,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv("SECRET_KEY")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-small-latest")
+# stub - ответы ассистента без обращения к API (по умолчанию, если нет ключа)
+ASSISTANT_BACKEND = os.getenv("ASSISTANT_BACKEND", "")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = SETTINGS_PROFILE != "production"
 
-ALLOWED_HOSTS = []
+# В production обязательно: ALLOWED_HOSTS=example.com,www.example.com
+ALLOWED_HOSTS = [host.strip() for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()]
 
 
 # Application definition
@@ -43,22 +56,32 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "django_extensions",
-    "debug_toolbar",
     "core",
 ]
 
 MIDDLEWARE = [
+    # Первым - чтобы время ответа включало все остальные middleware
+    "core.metrics.QueryMetricsMiddleware",
+    # Выбор базы для чтения: реплика или основная сразу после записи
+    "core.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Собранная статика отдается до сессий и обращений к базе
+    "core.staticfiles.StaticFilesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# Приложения и middleware только для разработки
+DEV_APPS = ["django_extensions", "debug_toolbar"]
+DEV_MIDDLEWARE = ["debug_toolbar.middleware.DebugToolbarMiddleware"]
+if SETTINGS_PROFILE == "development":
+    INSTALLED_APPS += DEV_APPS
+    MIDDLEWARE += DEV_MIDDLEWARE
+
 ROOT_URLCONF = "barbershop.urls"
 
 TEMPLATES = [
@@ -77,8 +100,26 @@ TEMPLATES = [
     },
 ]
 
+# Продакшен-режим шаблонов: явный кэширующий загрузчик и компиляция всех шаблонов
+# при старте процесса со связыванием include (core/templating.py)
+TEMPLATE_PRECOMPILE = os.getenv("TEMPLATE_PRECOMPILE", "0" if DEBUG else "1") == "1"
+if TEMPLATE_PRECOMPILE:
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        ),
+    ]
+
 WSGI_APPLICATION = "barbershop.wsgi.application"
 
+# Асинхронные версии основных страниц (core/async_views.py) - для запуска под ASGI
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -87,9 +128,98 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # BEGIN IMMEDIATE берут только транзакции записи с проверкой (core.writes.immediate_atomic)
+        "OPTIONS": {},
+    }
+}
+
+# DATABASE_PROFILE=production - настройки SQLite для работы под нагрузкой:
+# WAL (читатели не блокируются писателем), ожидание блокировки вместо ошибки,
+# mmap для чтения, synchronous=NORMAL (в режиме WAL это безопасно)
+# и постоянные соединения
+DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", SETTINGS_PROFILE)
+# Настройки соединения для чтения - их же получают реплики
+SQLITE_READ_PRAGMAS = ""
+if DATABASE_PROFILE == "production":
+    SQLITE_READ_PRAGMAS = "PRAGMA busy_timeout=%d;PRAGMA mmap_size=%d;PRAGMA temp_store=MEMORY;" % (
+        int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", 5000)),
+        int(os.getenv("DATABASE_MMAP_SIZE", 256 * 1024 * 1024)),
+    )
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": int(os.getenv("DATABASE_CONN_MAX_AGE", 600)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                **DATABASES["default"]["OPTIONS"],
+                "init_command": "PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;" + SQLITE_READ_PRAGMAS,
+            },
+        }
+    )
+
+# Реплики только для чтения: DATABASE_REPLICAS=/path/replica1.sqlite3,/path/replica2.sqlite3.
+# Локально это копии основной базы (обновляет команда sync_replicas) или путь к самому
+# db.sqlite3 - тогда чтение идет из основного файла отдельным соединением только для чтения.
+DATABASE_REPLICAS = []
+for _index, _path in enumerate(filter(None, os.getenv("DATABASE_REPLICAS", "").split(",")), start=1):
+    DATABASES[f"replica{_index}"] = {
+        **DATABASES["default"],
+        "NAME": f"file:{Path(_path.strip()).resolve()}?mode=ro",
+        "OPTIONS": {"init_command": SQLITE_READ_PRAGMAS} if SQLITE_READ_PRAGMAS else {},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_index}")
+
+DATABASE_ROUTERS = ["core.routers.PrimaryReplicaRouter"]
+# Сколько секунд после записи клиент читает из основной базы
+DATABASE_STICKY_SECONDS = int(os.getenv("DATABASE_STICKY_SECONDS", 15))
+
+# Записи из order_create и массовых действий админки выполняются по одной
+# в отдельном потоке (core/writes.py)
+DATABASE_WRITE_QUEUE = os.getenv("DATABASE_WRITE_QUEUE", "1" if DATABASE_PROFILE == "production" else "0") == "1"
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию - память процесса. Для нескольких воркеров задайте общий бэкенд, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "barbershop"),
     }
 }
 
+# Метрики запросов (core/metrics.py): сколько одинаковых SQL за запрос считать N+1
+METRICS_DUPLICATE_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "null": {"class": "logging.NullHandler"},
+    },
+    "loggers": {
+        # Строка на каждый запрос; в тестах по умолчанию не выводится
+        # (METRICS_LOG_HANDLER=console вернет вывод)
+        "core.metrics": {
+            "handlers": [os.getenv("METRICS_LOG_HANDLER", "null" if TESTING else "console")],
+            "level": os.getenv("METRICS_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+        # Сводка предкомпиляции шаблонов при старте воркера
+        "core.templating": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+# Время жизни кэша лендинга и его секций (секунды)
+LANDING_CACHE_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,12 +257,64 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+# collectstatic собирает сюда минифицированные файлы с хэшем в имени и копии .gz/.br
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+# Раздавать собранную статику из Django с долгим кэшированием (core/staticfiles.py)
+SERVE_STATIC = os.getenv("SERVE_STATIC", "0" if DEBUG else "1") == "1"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Фоновые задачи (core/jobs.py): повторы с задержкой base * 2^(n-1) секунд,
+# одновременно выполняемых задач каждого имени - не больше JOB_CONCURRENCY
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_SECONDS = 10
+JOB_BACKOFF_MAX_SECONDS = 3600
+JOB_LOCK_TIMEOUT = 15 * 60
+JOB_CONCURRENCY = {"assistant.comment_reply": 2, "thumbnails.refresh": 1}
+
+# Защита формы записи: срок жизни ключа идемпотентности (секунды) и лимиты
+# частоты заявок - (емкость корзины, пополнение токенов в секунду) по IP и телефону
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+ORDER_RATE_LIMITS = {
+    "ip": (5, 1 / 300),
+    "phone": (3, 1 / 600),
+}
+# Адрес клиента из X-Forwarded-For - только за своим обратным прокси
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "0") == "1"
+
+# Сводки выручки (core/rollups.py): сколько затронутых дней пересчитывать сразу
+# при изменении заявок вне транзакции (массовые действия админки), остальное - фоновой задачей
+ROLLUP_INLINE_DAYS = 7
+# refresh_rollups без аргументов проверяет заявки, измененные за столько последних дней
+ROLLUP_CATCH_UP_DAYS = 2
+
+# Админка заявок на большой таблице (core/admin.py): число строк из кэша или
+# с пределом, фильтр и поля мастера и услуг с автодополнением
+ORDER_ADMIN_SCALE_MODE = os.getenv("ORDER_ADMIN_SCALE_MODE", "0" if DEBUG else "1") == "1"
+# Сколько секунд кэшируется число строк без фильтров и до скольких считаются строки с фильтром
+ADMIN_COUNT_CACHE_TIMEOUT = 60
+ADMIN_COUNT_LIMIT = 10000
+# Массовые действия со статусом заявок: заявок в одной транзакции
+ORDER_ADMIN_ACTION_CHUNK_SIZE = 1000
+
+# Миниатюры фото мастеров и услуг (core/thumbnails.py)
+THUMBNAIL_WIDTHS = (160, 320, 640, 960)
+THUMBNAIL_FORMATS = ("avif", "webp")
+# False - строить варианты сразу после сохранения, а не в задаче thumbnails.refresh
+THUMBNAILS_ASYNC = True
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Рабочее время барбершопа (часы) и шаг сетки записи (минуты)
+BARBERSHOP_OPENING_HOUR = 10
+BARBERSHOP_CLOSING_HOUR = 22
+BOOKING_SLOT_MINUTES = 15
+
 # Где будет видно панель Django Debug Toolbar
 INTERNAL_IPS = ["127.0.0.1"]
 
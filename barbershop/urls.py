@@ -3,7 +3,6 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
-from debug_toolbar.toolbar import debug_toolbar_urls
 from core.views import (
     landing,
     thanks,
@@ -12,8 +11,20 @@ from core.views import (
     order_create,
     services_list,
     order_page,
+    order_slots,
+    metrics,
+    orders_export,
 )
 
+if settings.ASYNC_VIEWS:
+    from core.async_views import (
+        landing,
+        orders_list,
+        order_detail,
+        order_create,
+        services_list,
+    )
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -21,9 +32,12 @@ urlpatterns = [
     path("thanks/", thanks, name="thanks"),
     path("orders/", orders_list, name="orders"),
     path("orders/<int:order_id>/", order_detail, name="order_detail"),
+    path("orders/export/", orders_export, name="orders-export"),
     path("order/create/", order_create, name="order-create"),
     path("services/", services_list, name="services-list"),
     path("order/", order_page, name="order-page"),
+    path("order/slots/", order_slots, name="order-slots"),
+    path("metrics/", metrics, name="metrics"),
 ]
 
 # Добавляем Статику и Медиа ЕСЛИ в режиме разработки
@@ -32,5 +46,9 @@ if settings.DEBUG:
     urlpatterns += static(
         settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0]
     )
-    # Подключим Django Debug  Toolbar
+
+# Django Debug Toolbar - только в профиле разработки (импорт не нужен в production)
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+
     urlpatterns += debug_toolbar_urls()
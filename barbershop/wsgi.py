@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
 
 application = get_wsgi_application()
+
+# Шаблоны компилируются при старте воркера, а не на первых запросах
+from core.templating import precompile_on_startup  # noqa: E402
+
+precompile_on_startup()
@@ -1,11 +1,85 @@
+from datetime import timedelta
 from typing import Any
+from urllib.parse import urlencode
+from django.conf import settings
 from django.contrib import admin
-from django.db.models import QuerySet, Sum
-from .models import Master, Order, Service, Review
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import Now
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from . import rollups
+from .availability import engine as availability
+from .cache import bump_version
+from .jobs import retry as retry_jobs
+from .models import CustomerStats, DailyRevenue, DeadJob, Job, Master, Order, Service, Review
+from .pagination import EstimatedCountPaginator
+from .phone import normalize_phone
+from .stats import refresh_customer_stats, refresh_master_ratings
+from .writes import immediate_atomic, write_queue
 
-admin.site.register(Master)
 # admin.site.register(Order)
-admin.site.register(Service)
+
+
+# search_fields нужны автодополнению мастера и услуг в админке заявок
+@admin.register(Master)
+class MasterAdmin(admin.ModelAdmin):
+    search_fields = ('name', 'phone')
+    ordering = ('name',)
+
+
+@admin.register(Service)
+class ServiceAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Фильтр по внешнему ключу без загрузки всех связанных записей: на странице
+    только выбранное значение, остальные подгружает поиск через
+    admin:autocomplete. У админки связанной модели должны быть search_fields.
+    """
+    template = 'admin/core/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.related_model = model._meta.get_field(self.field_name).remote_field.model
+        super().__init__(request, params, model, model_admin)
+        self.autocomplete_url = reverse(f'{model_admin.admin_site.name}:autocomplete') + '?' + urlencode({
+            'app_label': model._meta.app_label,
+            'model_name': model._meta.model_name,
+            'field_name': self.field_name,
+        })
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return ()
+        return [(obj.pk, str(obj)) for obj in self.related_model._default_manager.filter(pk=value)]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{f'{self.field_name}__pk': self.value()})
+        except (ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error)
+
+
+class MasterAutocompleteFilter(AutocompleteFilter):
+    title = 'Мастер'
+    field_name = 'master'
+    # Тот же параметр, что у обычного фильтра по мастеру - ссылки работают в обоих режимах
+    parameter_name = 'master__id__exact'
+
 
 class TotalOrderPrice(admin.SimpleListFilter):
     title = 'По общей сумме заказа'
@@ -20,17 +94,36 @@ class TotalOrderPrice(admin.SimpleListFilter):
             ('up_two_thousends', 'Свыше 2 тысяч'),
         )
     def queryset(self, request, queryset):
-        queryset = queryset.annotate(total_price_agg=Sum('services__price'))
+        # total_price хранится в заказе - фильтр идет по индексу, без GROUP BY
         if self.value() == 'five_hundreds':
-            return queryset.filter(total_price_agg__lt=500)
+            return queryset.filter(total_price__lt=500)
         if self.value() == 'one_thousends':  # Исправлено
-            return queryset.filter(total_price_agg__gte=500, total_price_agg__lt=1000)
+            return queryset.filter(total_price__gte=500, total_price__lt=1000)
         if self.value() == 'two_thousends':  # Исправлено
-            return queryset.filter(total_price_agg__gte=1000, total_price_agg__lt=2000)
+            return queryset.filter(total_price__gte=1000, total_price__lt=2000)
         if self.value() == 'up_two_thousends':  # Исправлено
-            return queryset.filter(total_price_agg__gte=2000)
+            return queryset.filter(total_price__gte=2000)
         return queryset
 
+
+class OrderChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Выручку заявок с нераспознанным номером собираем одним запросом на страницу
+        phones = {order.phone for order in self.result_list if not order.phone_normalized}
+        if not phones:
+            return
+        totals = dict(
+            Order.objects.filter(phone__in=phones, status='completed')
+            .order_by()
+            .values_list('phone')
+            .annotate(total=Sum('total_price'))
+        )
+        for order in self.result_list:
+            if not order.phone_normalized:
+                order.phone_income = totals.get(order.phone) or 0
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('name', 
@@ -48,6 +141,8 @@ class OrderAdmin(admin.ModelAdmin):
 
     list_per_page = 20
 
+    list_select_related = ('master',)
+
     list_display_links = ('phone', 'name')
 
     list_editable = ('status',)
@@ -75,34 +170,209 @@ class OrderAdmin(admin.ModelAdmin):
         ),
     )
 
+    # Режим большой таблицы (ORDER_ADMIN_SCALE_MODE): без полного COUNT(*),
+    # мастер в фильтре и мастер с услугами в форме - через автодополнение
+    @property
+    def show_full_result_count(self):
+        return not settings.ORDER_ADMIN_SCALE_MODE
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if settings.ORDER_ADMIN_SCALE_MODE:
+            return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_list_filter(self, request):
+        if settings.ORDER_ADMIN_SCALE_MODE:
+            return ('status', MasterAutocompleteFilter, TotalOrderPrice)
+        return super().get_list_filter(request)
+
+    def get_autocomplete_fields(self, request):
+        if settings.ORDER_ADMIN_SCALE_MODE:
+            return ('master', 'services')
+        return super().get_autocomplete_fields(request)
+
+    def get_changelist(self, request, **kwargs):
+        return OrderChangeList
+
+    def get_queryset(self, request):
+        # Выручку клиента подтягиваем из CustomerStats подзапросом - без запроса на каждую строку
+        revenue = CustomerStats.objects.filter(phone_normalized=OuterRef('phone_normalized')).values('revenue')[:1]
+        return super().get_queryset(request).annotate(customer_revenue=Subquery(revenue))
+
+    def _update_status(self, queryset, status):
+        # Массовое обновление идет через очередь записи пачками по ORDER_ADMIN_ACTION_CHUNK_SIZE
+        # заявок: каждая пачка - короткая транзакция, записи клиентов не ждут всю операцию.
+        # update() идет мимо save() и сигналов, поэтому производные данные обновляются здесь:
+        # - CustomerStats - в транзакции каждой пачки (_apply_status);
+        # - дневные сводки - одной задачей rollups.refresh_days после всех пачек;
+        # - занятость мастеров: расписания затронутых дней сбрасываются в этом процессе,
+        #   другие воркеры увидят новый статус в слотах по истечении TTL движка
+        #   (бронирование все равно проверяет занятость по базе);
+        # - поисковый индекс статус не хранит, рейтинги мастеров и кэш лендинга от него не зависят
+        pks = list(queryset.exclude(status=status).order_by('pk').values_list('pk', flat=True))
+        size = settings.ORDER_ADMIN_ACTION_CHUNK_SIZE
+        days, schedules = set(), set()
+        for start in range(0, len(pks), size):
+            chunk_days, chunk_schedules = write_queue.run(self._apply_status, pks[start:start + size], status)
+            days |= chunk_days
+            schedules |= chunk_schedules
+        availability.forget(schedules)
+        # Сводки пересчитываем один раз за все пачки
+        write_queue.run(rollups.schedule_days, days)
+
+    @staticmethod
+    def _apply_status(pks, status):
+        with immediate_atomic():
+            orders = Order.objects.filter(pk__in=pks)
+            phones = set(orders.values_list('phone_normalized', flat=True))
+            # Расписания (мастер, день), в которых меняется занятость
+            schedules = {
+                (master_id, timezone.localtime(appointment).date())
+                for master_id, appointment in orders.filter(master__isnull=False, appointment_date__isnull=False)
+                .values_list('master_id', 'appointment_date')
+            }
+            days = rollups.order_days(pks)
+            orders.update(status=status, date_updated=Now())
+            refresh_customer_stats(phones)
+        return days, schedules
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полный номер телефона ищем точным совпадением по индексу
+        normalized = normalize_phone(search_term)
+        if normalized:
+            return queryset.filter(phone_normalized=normalized), False
+        return super().get_search_results(request, queryset, search_term)
+
     @admin.action(description='Отметить как завершенные')
     def mark_completed(self, request, queryset):
-        queryset.update(status='completed')
+        self._update_status(queryset, 'completed')
 
     @admin.action(description='Отметить как отмененные')
     def mark_canceled(self, request, queryset):
-        queryset.update(status='canceled')
+        self._update_status(queryset, 'canceled')
 
     @admin.action(description='Отметить как новые')
     def mark_new(self, request, queryset):
-        queryset.update(status='new')
+        self._update_status(queryset, 'new')
     
     @admin.action(description='Отметить как подтвержденные')
     def mark_confirmed(self, request, queryset):
-        queryset.update(status='confirmed')
+        self._update_status(queryset, 'confirmed')
 
-    @admin.display(description='Общая стоимость')
-    def total_price(self, obj):
-        return sum([service.price for service in obj.services.all()])
-    
     @admin.display(description='Выручка по номеру')
     def total_income(self, obj):
-        orders = Order.objects.filter(phone=obj.phone, status='completed').prefetch_related('services')
-        return sum([service.price for order in orders for service in order.services.all()])
+        if not obj.phone_normalized and hasattr(obj, 'phone_income'):
+            # В списке сумма уже собрана OrderChangeList
+            return obj.phone_income
+        if obj.phone_normalized:
+            # В списке значение уже пришло из CustomerStats через get_queryset()
+            if hasattr(obj, 'customer_revenue'):
+                return obj.customer_revenue or 0
+            stats = CustomerStats.objects.filter(phone_normalized=obj.phone_normalized).first()
+            return stats.revenue if stats else 0
+        # Номер не распознан (или еще не заполнен backfill_phones) - считаем по точной строке
+        orders = Order.objects.filter(phone=obj.phone, status='completed')
+        return orders.aggregate(total=Sum('total_price'))['total'] or 0
     
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ('phone_normalized', 'completed_orders', 'revenue', 'date_updated')
+    search_fields = ('phone_normalized',)
+    readonly_fields = ('phone_normalized', 'completed_orders', 'revenue', 'date_updated')
+
+
+@admin.register(DailyRevenue)
+class RevenueDashboardAdmin(admin.ModelAdmin):
+    """
+    Панель выручки и загрузки мастеров вместо списка строк сводки. Читает только
+    таблицы сводок (core/rollups.py), поэтому не зависит от объема истории заявок.
+    """
+    default_period_days = 30
+    max_period_days = 366
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def _period(self, request):
+        today = timezone.localdate()
+        last_day = parse_date(request.GET.get('to') or '') or today
+        first_day = parse_date(request.GET.get('from') or '') or last_day - timedelta(days=self.default_period_days - 1)
+        if first_day > last_day:
+            first_day, last_day = last_day, first_day
+        # Период ограничен - иначе время ответа снова росло бы вместе с историей
+        first_day = max(first_day, last_day - timedelta(days=self.max_period_days - 1))
+        return first_day, last_day
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        first_day, last_day = self._period(request)
+        context = {
+            **self.admin_site.each_context(request),
+            **rollups.dashboard(first_day, last_day),
+            'opts': self.model._meta,
+            'title': 'Выручка и загрузка мастеров',
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/core/revenue_dashboard.html', context)
+
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('name', 'rating', 'master', 'date_created', 'is_published')
     list_filter = ('rating', 'is_published', 'master')
     search_fields = ('name', 'text')
-    date_hierarchy = 'date_created'
\ No newline at end of file
+    date_hierarchy = 'date_created'
+    actions = ('publish', 'unpublish')
+
+    def _set_published(self, queryset, is_published):
+        # update() не вызывает сигналы - рейтинг мастеров и кэш отзывов на лендинге обновляем сами
+        master_ids = set(queryset.values_list('master_id', flat=True))
+        queryset.update(is_published=is_published)
+        refresh_master_ratings(master_ids)
+        bump_version('review')
+
+    @admin.action(description='Опубликовать')
+    def publish(self, request, queryset):
+        self._set_published(queryset, True)
+
+    @admin.action(description='Снять с публикации')
+    def unpublish(self, request, queryset):
+        self._set_published(queryset, False)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'date_updated')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'last_error', 'result', 'date_created', 'date_updated')
+    ordering = ('-id',)
+    actions = ('retry',)
+
+    @admin.action(description='Повторить')
+    def retry(self, request, queryset):
+        count = retry_jobs(queryset)
+        self.message_user(request, f'Возвращено в очередь задач: {count}')
+
+
+@admin.register(DeadJob)
+class DeadJobAdmin(JobAdmin):
+    """Задачи, исчерпавшие попытки: ошибка и повторный запуск."""
+    list_display = ('id', 'name', 'attempts', 'short_error', 'date_updated')
+    list_filter = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(status='dead')
+
+    @admin.display(description='Ошибка')
+    def short_error(self, obj):
+        # Последняя строка трейсбэка - само исключение
+        lines = obj.last_error.strip().splitlines()
+        return lines[-1] if lines else ''
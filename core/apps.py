@@ -5,3 +5,11 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Барбершоп'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов
+        from . import signals  # noqa: F401
+        # Метрики запросов подключаются к каждому новому соединению с базой
+        from . import metrics  # noqa: F401
+        # Регистрируем фоновые задачи
+        from . import tasks  # noqa: F401
@@ -0,0 +1,46 @@
+# core/assistant.py
+"""
+Обращения к AI-ассистенту (Mistral). Выполняются только из фоновых задач
+(core/tasks.py), чтобы запрос клиента не ждал внешний API.
+
+Без MISTRAL_API_KEY (локально и в тестах) используется StubAssistant -
+детерминированный ответ без сети.
+"""
+import json
+import urllib.request
+
+from django.conf import settings
+
+MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+
+
+class StubAssistant:
+    def complete(self, prompt):
+        return f"[stub] {prompt[:200]}"
+
+
+class MistralAssistant:
+    def __init__(self, api_key, model, timeout=30):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+
+    def complete(self, prompt):
+        body = json.dumps({"model": self.model, "messages": [{"role": "user", "content": prompt}]}).encode()
+        request = urllib.request.Request(
+            getattr(settings, "MISTRAL_API_URL", MISTRAL_API_URL),
+            data=body,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+        )
+        # Ошибки сети и HTTP пробрасываем - задача будет повторена с задержкой
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.load(response)
+        return data["choices"][0]["message"]["content"]
+
+
+def get_assistant():
+    backend = getattr(settings, "ASSISTANT_BACKEND", "")
+    api_key = getattr(settings, "MISTRAL_API_KEY", None)
+    if backend == "stub" or not api_key:
+        return StubAssistant()
+    return MistralAssistant(api_key, getattr(settings, "MISTRAL_MODEL", "mistral-small-latest"))
@@ -0,0 +1,181 @@
+# core/async_views.py
+"""
+Асинхронные версии основных view для запуска под ASGI-сервером
+(uvicorn barbershop.asgi:application). Включаются настройкой ASYNC_VIEWS=1.
+
+Данные читаются асинхронным ORM (aget, afirst, aiterator) и полностью
+загружаются до рендеринга, кэш - асинхронными методами (aget, aget_many). Сам рендеринг и сохранение заявки идут в потоке
+через sync_to_async: контекстные процессоры читают сессию и пользователя,
+а проверка свободного времени и вставка заявки должны выполняться в одной
+транзакции, которой у асинхронного ORM нет.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count
+from django.shortcuts import HttpResponse, redirect, render
+from django.views.decorators.http import condition
+
+from .cache import (
+    LANDING_MODELS,
+    aload_versions,
+    aorder_updated,
+    cache_timeout,
+    landing_etag,
+    landing_page_key,
+    landing_versions,
+    order_detail_etag,
+    services_list_etag,
+)
+from .forms import OrderForm
+from .models import Master, Order, Review, Service
+from .pagination import apaginate_orders
+from .search import get_search_backend
+from .streaming import astreaming_render
+from .views import (
+    check_order_submission,
+    orders_filter,
+    orders_page_context,
+    rate_limited_form,
+    selected_statuses,
+    stream_ordering,
+    submit_order_form,
+)
+
+arender = sync_to_async(render)
+
+
+def _load_versions(*names):
+    """
+    Валидаторы @condition синхронные - версии моделей загружаем
+    заранее асинхронно, они возьмут их из request.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            await aload_versions(request, *names)
+            return await view(request, *args, **kwargs)
+
+        return inner
+
+    return decorator
+
+
+@_load_versions(*LANDING_MODELS)
+@condition(etag_func=landing_etag)
+async def landing(request):
+    """
+    Отвечает за маршрут '/'
+    """
+    versions = landing_versions(request)
+    page_key = landing_page_key(versions)
+    user = await request.auser()
+    use_page_cache = not user.is_authenticated
+    if use_page_cache:
+        html = await cache.aget(page_key)
+        if html is not None:
+            return HttpResponse(html)
+
+    masters = [
+        master async for master in Master.objects.prefetch_related("services")
+        .annotate(num_services=Count("services"))
+        .order_by("-avg_rating", "-review_count", "id")
+    ]
+    services = [service async for service in Service.objects.all()]
+    reviews = [review async for review in Review.objects.select_related("master").filter(is_published=True)[:3]]
+
+    context = {
+        "masters": masters,
+        "services": services,
+        "reviews": reviews,
+        "versions": versions,
+        "cache_timeout": cache_timeout(),
+    }
+    response = await arender(request, "landing.html", context=context)
+    if use_page_cache:
+        await cache.aset(page_key, response.content, cache_timeout())
+    return response
+
+
+async def orders_list(request):
+    """
+    Отвечает за маршрут 'orders/'
+    """
+    orders, search_query, search_fields, order_by_date = orders_filter(request)
+    backend = get_search_backend()
+
+    if search_query and order_by_date == "relevance":
+        ranked_ids = await sync_to_async(backend.ranked_ids)(search_query, search_fields, queryset=orders)
+        position = {order_id: index for index, order_id in enumerate(ranked_ids)}
+        found = [order async for order in orders.filter(id__in=ranked_ids)]
+        found.sort(key=lambda order: position[order.id])
+        return await arender(request, "orders_list.html", context={"orders": found})
+
+    if search_query:
+        # FTS-бэкенд сам выполняет запросы к поисковым таблицам
+        orders = await sync_to_async(backend.filter)(orders, search_query, search_fields)
+
+    if request.GET.get("stream"):
+        return await astreaming_render(
+            request, "orders_list.html", {}, orders.order_by(*stream_ordering(order_by_date)),
+            "include_order_card.html", "order",
+        )
+
+    orders, next_cursor = await apaginate_orders(
+        orders,
+        cursor=request.GET.get("cursor"),
+        descending=order_by_date != "asc",
+        statuses=selected_statuses(request),
+    )
+    return await arender(request, "orders_list.html", context=orders_page_context(request, orders, next_cursor))
+
+
+def _load_order_updated(view):
+    """
+    Валидаторы @condition синхронные - дату изменения заявки загружаем
+    заранее асинхронно, они возьмут ее из request.
+    """
+
+    @wraps(view)
+    async def inner(request, order_id):
+        await aorder_updated(request, order_id)
+        return await view(request, order_id)
+
+    return inner
+
+
+@_load_versions("master", "service")
+@_load_order_updated
+@condition(etag_func=order_detail_etag)
+async def order_detail(request, order_id):
+    """
+    Отвечает за маршрут 'orders/<int:order_id>/'
+    """
+    order = await Order.objects.prefetch_related("services").select_related("master").aget(id=order_id)
+    return await arender(request, "order_detail.html", context={"order": order})
+
+
+async def order_create(request):
+    if request.method == "POST":
+        verdict = await sync_to_async(check_order_submission)(request)
+        if verdict == "duplicate":
+            return redirect("thanks")
+        if verdict == "limited":
+            context = {"form": rate_limited_form(request), "rate_limited": True}
+            return await arender(request, "order_page.html", context, status=429)
+        form = OrderForm(request.POST)
+        if await sync_to_async(submit_order_form)(request, form):
+            messages.success(request, "Заявка успешно отправлена!")
+            return redirect("thanks")
+        return await arender(request, "order_page.html", {"form": form})
+    return redirect("order-page")
+
+
+@_load_versions("service")
+@condition(etag_func=services_list_etag)
+async def services_list(request):
+    services = [service async for service in Service.objects.all()]
+    return await arender(request, "services_list.html", {"services": services})
@@ -0,0 +1,245 @@
+# core/availability.py
+"""
+Расчет свободного времени мастеров.
+
+Для каждой пары (мастер, день) держим в памяти отсортированный по началу
+список занятых интервалов. Список загружается из базы при первом обращении
+одним запросом на весь день и дальше обновляется точечно: сигналы заявок
+вызывают update_order()/remove_order(), бронирование просто вставляет
+интервал через bisect.
+
+Кэш одного процесса может отставать от других воркеров, поэтому для показа
+слотов у записей есть TTL, а проверка при бронировании всегда читает базу
+заново внутри транзакции (find_free_master(..., lock=True)).
+"""
+import bisect
+import threading
+import time as monotonic_time
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Master, Order
+
+# Длительность заявки без услуг (как Service.duration по умолчанию)
+DEFAULT_DURATION = 30
+
+
+def working_hours(day):
+    """
+    Начало и конец рабочего дня в текущем часовом поясе.
+    """
+    opening = timezone.make_aware(datetime.combine(day, time(settings.BARBERSHOP_OPENING_HOUR)))
+    closing = timezone.make_aware(datetime.combine(day, time(settings.BARBERSHOP_CLOSING_HOUR)))
+    return opening, closing
+
+
+def services_duration(services):
+    return timedelta(minutes=sum(service.duration for service in services) or DEFAULT_DURATION)
+
+
+def masters_for_services(services):
+    """
+    Активные мастера, которые умеют делать все перечисленные услуги.
+    """
+    masters = Master.objects.filter(is_active=True)
+    service_ids = {service.pk for service in services}
+    if service_ids:
+        masters = (
+            masters.filter(services__in=service_ids)
+            .annotate(matched_services=Count("services", distinct=True))
+            .filter(matched_services=len(service_ids))
+        )
+    return masters.order_by("id")
+
+
+def _is_free(intervals, start, end):
+    """
+    Свободен ли промежуток [start, end) при отсортированных по началу интервалах.
+    """
+    # Первый интервал, начинающийся не раньше конца промежутка, уже не мешает -
+    # достаточно проверить предшествующие ему
+    position = bisect.bisect_left(intervals, (end,))
+    return all(interval_end <= start for _, interval_end, _ in intervals[:position])
+
+
+def _free_starts(intervals, opening, closing, duration, step):
+    """
+    Все начала слотов с шагом step, в которые помещается duration.
+    Один проход по интервалам: они отсортированы, кандидаты тоже.
+    """
+    starts = []
+    # Конец самой поздней занятости среди уже пройденных интервалов
+    busy_until = opening
+    index = 0
+    candidate = opening
+    while candidate + duration <= closing:
+        candidate_end = candidate + duration
+        while index < len(intervals) and intervals[index][0] < candidate_end:
+            busy_until = max(busy_until, intervals[index][1])
+            index += 1
+        if busy_until <= candidate:
+            starts.append(candidate)
+            candidate += step
+        else:
+            # Перепрыгиваем сразу к ближайшему моменту, выровненному по сетке
+            skipped = (busy_until - candidate + step - timedelta(microseconds=1)) // step
+            candidate += step * max(skipped, 1)
+    return starts
+
+
+class AvailabilityEngine:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (master_id, day) -> (время загрузки, [(start, end, order_id), ...])
+        self._schedules = {}
+        # order_id -> (master_id, day) - где лежит интервал заявки
+        self._order_keys = {}
+
+    # --- Кэш интервалов ---
+
+    def _load(self, master_ids, day):
+        """
+        Загружает занятость мастеров на день одним запросом.
+        """
+        opening = timezone.make_aware(datetime.combine(day, time.min))
+        rows = (
+            Order.objects.filter(
+                master_id__in=master_ids,
+                appointment_date__gte=opening,
+                appointment_date__lt=opening + timedelta(days=1),
+            )
+            .exclude(status="canceled")
+            .annotate(duration=Sum("services__duration"))
+            .values_list("id", "master_id", "appointment_date", "duration")
+        )
+        schedules = {master_id: [] for master_id in master_ids}
+        for order_id, master_id, start, duration in rows:
+            end = start + timedelta(minutes=duration or DEFAULT_DURATION)
+            schedules[master_id].append((start, end, order_id))
+
+        loaded_at = monotonic_time.monotonic()
+        with self._lock:
+            for master_id, intervals in schedules.items():
+                intervals.sort()
+                self._schedules[(master_id, day)] = (loaded_at, intervals)
+                for _, _, order_id in intervals:
+                    self._order_keys[order_id] = (master_id, day)
+        return schedules
+
+    def intervals(self, master_ids, day, fresh=False):
+        """
+        Занятые интервалы мастеров на день: {master_id: [(start, end, order_id), ...]}.
+        """
+        result, missing = {}, []
+        now = monotonic_time.monotonic()
+        with self._lock:
+            for master_id in master_ids:
+                cached = self._schedules.get((master_id, day))
+                if cached is None or fresh or now - cached[0] > self.ttl:
+                    missing.append(master_id)
+                else:
+                    result[master_id] = cached[1]
+        if missing:
+            result.update(self._load(missing, day))
+        return result
+
+    def remove_order(self, order_id):
+        with self._lock:
+            key = self._order_keys.pop(order_id, None)
+            cached = self._schedules.get(key) if key else None
+            if cached is not None:
+                cached[1][:] = [interval for interval in cached[1] if interval[2] != order_id]
+
+    def update_order(self, order, duration=None):
+        """
+        Переносит интервал заявки после изменения мастера, времени, статуса или услуг.
+        Если день мастера еще не загружен, он прочитается из базы при первом обращении.
+        """
+        self.remove_order(order.pk)
+        if not order.master_id or not order.appointment_date or order.status == "canceled":
+            return
+        day = timezone.localtime(order.appointment_date).date()
+        key = (order.master_id, day)
+        with self._lock:
+            cached = self._schedules.get(key)
+        if cached is None:
+            return
+        if duration is None:
+            duration = services_duration(order.services.all())
+        with self._lock:
+            bisect.insort(cached[1], (order.appointment_date, order.appointment_date + duration, order.pk))
+            self._order_keys[order.pk] = key
+
+    def forget(self, keys):
+        """
+        Сбрасывает расписания пар (мастер, день) после изменений мимо сигналов
+        (массовые действия админки) - они загрузятся из базы при следующем обращении.
+        """
+        with self._lock:
+            for key in keys:
+                cached = self._schedules.pop(key, None)
+                for _, _, order_id in cached[1] if cached else ():
+                    self._order_keys.pop(order_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._schedules.clear()
+            self._order_keys.clear()
+
+    # --- Запросы ---
+
+    def free_slots(self, day, services, master_id=None):
+        """
+        Свободные начала записи на день: {master_id: [datetime, ...]}.
+        Без master_id - по всем мастерам, которые умеют все услуги.
+        """
+        opening, closing = working_hours(day)
+        step = timedelta(minutes=settings.BOOKING_SLOT_MINUTES)
+        now = timezone.now()
+        if now > opening:
+            # Прошедшее время не предлагаем; начало выравниваем по сетке слотов вверх
+            opening += step * -(-(now - opening) // step)
+
+        masters = masters_for_services(services)
+        if master_id is not None:
+            masters = masters.filter(pk=master_id)
+        master_ids = list(masters.values_list("id", flat=True))
+        duration = services_duration(services)
+        schedules = self.intervals(master_ids, day)
+        return {
+            master_id: _free_starts(schedules[master_id], opening, closing, duration, step)
+            for master_id in master_ids
+        }
+
+    def find_free_master(self, start, services, lock=False, master_id=None):
+        """
+        Первый мастер (или мастер master_id), который умеет все услуги и свободен
+        с start на их длительность. С lock=True занятость читается из базы заново,
+        а строки мастеров блокируются SELECT ... FOR UPDATE - вызывать внутри
+        transaction.atomic(). На SQLite FOR UPDATE нет: одновременные записи там
+        разводит транзакция BEGIN IMMEDIATE (core.writes.immediate_atomic).
+        """
+        end = start + services_duration(services)
+        day = timezone.localtime(start).date()
+        opening, closing = working_hours(day)
+        if start < opening or end > closing:
+            return None
+
+        masters = masters_for_services(services)
+        if master_id is not None:
+            masters = masters.filter(pk=master_id)
+        if lock:
+            masters = Master.objects.select_for_update().filter(pk__in=list(masters.values_list("id", flat=True)))
+        masters = list(masters.order_by("id"))
+        schedules = self.intervals([master.pk for master in masters], day, fresh=lock)
+        for master in masters:
+            if _is_free(schedules[master.pk], start, end):
+                return master
+        return None
+
+
+engine = AvailabilityEngine()
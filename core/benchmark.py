@@ -0,0 +1,91 @@
+# core/benchmark.py
+"""
+Общие инструменты для бенчмарков: замер сценария, перцентили,
+сохранение и сравнение с базовой линией (JSON).
+"""
+import json
+import statistics
+import time
+import timeit
+from pathlib import Path
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, fraction):
+    """
+    Перцентиль по методу ближайшего ранга (values не обязаны быть отсортированы).
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(func, iterations, using="default"):
+    """
+    Выполняет func iterations раз и возвращает сводку:
+    p50/p95/среднее в миллисекундах и число SQL-запросов за один вызов.
+    """
+    timings, queries = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connections[using]) as captured:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+    return {
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries": max(queries),
+        "iterations": iterations,
+    }
+
+
+def measure_calls(func, number=1000, repeat=7):
+    """
+    Микробенчмарк для быстрых функций: repeat серий по number вызовов.
+    Возвращает время одного вызова в микросекундах - лучшее и медиану по сериям.
+    """
+    series = [total / number * 1_000_000 for total in timeit.repeat(func, number=number, repeat=repeat)]
+    return {
+        "best_us": round(min(series), 3),
+        "median_us": round(statistics.median(series), 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def save_results(results, path):
+    Path(path).write_text(json.dumps(results, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def load_results(path):
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(results, baseline, threshold=1.2):
+    """
+    Сравнивает результаты с базовой линией. Регрессия - p95 вырос больше чем
+    в threshold раз или выросло число запросов. Возвращает список строк-отчетов
+    и признак, что регрессии есть.
+    """
+    lines, regressed = [], False
+    for name, current in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            lines.append(f"{name}: новый сценарий, p95={current['p95_ms']} мс, запросов={current['queries']}")
+            continue
+        ratio = current["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        is_slower = ratio > threshold
+        more_queries = current["queries"] > before["queries"]
+        mark = "РЕГРЕССИЯ" if is_slower or more_queries else "ok"
+        regressed = regressed or is_slower or more_queries
+        lines.append(
+            f"{name}: {mark} p95 {before['p95_ms']} -> {current['p95_ms']} мс (x{ratio:.2f}), "
+            f"запросов {before['queries']} -> {current['queries']}"
+        )
+    return lines, regressed
@@ -0,0 +1,232 @@
+# core/bulk.py
+"""
+Массовый импорт и экспорт заявок (CSV и JSONL).
+
+Импорт читает файл потоково, проверяет каждую строку через OrderImportForm
+и вставляет заявки пачками: bulk_create для заявок и один bulk_create
+для строк связи с услугами на пачку. Экспорт идет по первичному ключу
+пачками (keyset), поэтому память не растет с размером таблицы, а последний
+выгруженный id служит точкой возобновления.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .availability import engine as availability
+from .forms import OrderImportForm
+from .models import Master, Order, Service
+from .phone import normalize_phone
+from .search import get_search_backend
+from . import rollups
+from .stats import refresh_customer_stats
+
+EXPORT_FIELDS = (
+    "id", "name", "phone", "comment", "status", "master",
+    "appointment_date", "date_created", "total_price", "services",
+)
+# Разделитель id услуг в CSV
+SERVICES_SEPARATOR = ";"
+# Заявок в одном UPDATE дат после вставки (CASE по id - два параметра на заявку)
+DATES_UPDATE_BATCH = 500
+
+
+def bulk_create_with_dates(model, objs, using="default"):
+    """
+    bulk_create, сохраняющий заданные в объектах даты auto_now/auto_now_add.
+    bulk_create проставляет их текущим временем, поэтому даты запоминаются
+    и возвращаются следующим UPDATE. Метаданные полей не меняем - они общие
+    для всех потоков процесса. Вызывать в транзакции.
+    """
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    dates = [[getattr(obj, name) for name in names] for obj in objs]
+    created = model.objects.using(using).bulk_create(objs)
+    for obj, values in zip(created, dates):
+        for name, value in zip(names, values):
+            # Даты не было - остается проставленное bulk_create текущее время
+            if value is not None:
+                setattr(obj, name, value)
+    model.objects.using(using).bulk_update(created, names, batch_size=DATES_UPDATE_BATCH)
+    return created
+
+
+def detect_format(path):
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+# --- Импорт ---
+
+
+def read_rows(stream, file_format):
+    """
+    Построчно читает словари из CSV или JSONL. Номер строки нужен для отчета
+    об ошибках и для возобновления импорта.
+    """
+    if file_format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield line_number, json.loads(line)
+        return
+    for line_number, row in enumerate(csv.DictReader(stream), start=2):
+        row["services"] = [pk for pk in (row.get("services") or "").split(SERVICES_SEPARATOR) if pk]
+        yield line_number, row
+
+
+class OrderImporter:
+    """
+    Проверяет и вставляет заявки пачками. Использование:
+
+        importer = OrderImporter(batch_size=1000)
+        for line_number, row in read_rows(stream, "csv"):
+            importer.add(line_number, row)
+        importer.flush()
+    """
+
+    def __init__(self, batch_size=1000, using="default", on_flush=None):
+        self.batch_size = batch_size
+        self.using = using
+        # Вызывается после записи каждой пачки с номером последней обработанной строки
+        self.on_flush = on_flush
+        # Справочники загружаем один раз - проверка строк не ходит в базу
+        self.services_by_pk = {str(service.pk): service for service in Service.objects.using(using)}
+        self.master_ids = set(Master.objects.using(using).values_list("pk", flat=True))
+        self.pending = []
+        self.imported = 0
+        self.errors = []
+        self.last_line = 0
+
+    def validate(self, line_number, row):
+        """
+        Возвращает (заявка, услуги) или None, записав ошибки строки в self.errors.
+        """
+        form = OrderImportForm(data=row, services_by_pk=self.services_by_pk)
+        if not form.is_valid():
+            self.errors.append((line_number, form.errors.get_json_data()))
+            return None
+        order = form.instance
+
+        master = row.get("master")
+        if master not in (None, ""):
+            if not str(master).isdigit() or int(master) not in self.master_ids:
+                self.errors.append((line_number, {"master": [{"message": f"Нет мастера с id {master}"}]}))
+                return None
+            order.master_id = int(master)
+
+        date_created = parse_datetime(row.get("date_created") or "")
+        order.date_created = date_created
+        order.date_updated = date_created
+        services = form.cleaned_data["services"]
+        order.phone_normalized = normalize_phone(order.phone)
+        order.total_price = sum(service.price for service in services)
+        return order, services
+
+    def add(self, line_number, row):
+        validated = self.validate(line_number, row)
+        self.last_line = line_number
+        if validated is not None:
+            self.pending.append(validated)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            if self.on_flush is not None:
+                self.on_flush(self.last_line)
+            return
+        now = timezone.now()
+        for order, _ in self.pending:
+            order.date_created = order.date_created or now
+            order.date_updated = order.date_updated or now
+
+        Through = Order.services.through
+        with transaction.atomic(using=self.using):
+            orders = bulk_create_with_dates(Order, [order for order, _ in self.pending], using=self.using)
+            Through.objects.using(self.using).bulk_create(
+                [
+                    Through(order_id=order.pk, service_id=service.pk)
+                    for order, (_, services) in zip(orders, self.pending)
+                    for service in services
+                ]
+            )
+            # bulk_create не отправляет сигналы - обновляем производные данные для пачки
+            get_search_backend(self.using).index_many(orders)
+            refresh_customer_stats(
+                {order.phone_normalized for order in orders if order.status == "completed"}, using=self.using
+            )
+            rollups.schedule_days({rollups.local_day(order.appointment_date) for order in orders}, using=self.using)
+        availability.clear()
+        self.imported += len(orders)
+        self.pending = []
+        if self.on_flush is not None:
+            self.on_flush(self.last_line)
+
+
+# --- Экспорт ---
+
+
+def iter_order_batches(after_id=0, batch_size=1000, using="default"):
+    """
+    Пачки заявок по возрастанию id, начиная после after_id. К каждой заявке
+    добавлен список id услуг - одним запросом на пачку.
+    """
+    Through = Order.services.through
+    while True:
+        batch = list(
+            Order.objects.using(using)
+            .filter(pk__gt=after_id)
+            .order_by("pk")
+            .values(
+                "id", "name", "phone", "comment", "status", "master",
+                "appointment_date", "date_created", "total_price",
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        services = {}
+        links = Through.objects.using(using).filter(order_id__in=[row["id"] for row in batch])
+        for order_id, service_id in links.values_list("order_id", "service_id").order_by("order_id", "service_id"):
+            services.setdefault(order_id, []).append(service_id)
+        for row in batch:
+            row["services"] = services.get(row["id"], [])
+        yield batch
+        after_id = batch[-1]["id"]
+
+
+def _plain(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def format_row(row, file_format):
+    if file_format == "jsonl":
+        return json.dumps({field: row[field] for field in EXPORT_FIELDS}, ensure_ascii=False, default=_plain) + "\n"
+    values = dict(row, services=SERVICES_SEPARATOR.join(str(pk) for pk in row["services"]))
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([_plain(values[field]) for field in EXPORT_FIELDS])
+    return buffer.getvalue()
+
+
+def csv_header():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def export_lines(file_format="csv", after_id=0, batch_size=1000, using="default", header=True):
+    """
+    Генератор строк выгрузки. Подходит и для StreamingHttpResponse, и для записи в файл.
+    """
+    if file_format == "csv" and header:
+        yield csv_header()
+    for batch in iter_order_batches(after_id=after_id, batch_size=batch_size, using=using):
+        for row in batch:
+            yield format_row(row, file_format)
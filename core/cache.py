@@ -0,0 +1,185 @@
+# core/cache.py
+"""
+Версионное кэширование публичных страниц.
+
+Для каждой модели, от которой зависит лендинг, в кэше хранится счетчик версии.
+Сигналы увеличивают счетчик при любом изменении, а ключи страницы и фрагментов
+включают номера версий - старые записи просто перестают запрашиваться и
+вытесняются по таймауту. Чтение версий - один get_many() к кэшу, без базы.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "version:%s"
+
+# Какие версии моделей влияют на каждую секцию лендинга
+LANDING_SECTIONS = {
+    # Карточка мастера показывает названия его услуг и рейтинг по отзывам
+    "masters": ("master", "service", "review"),
+    "services": ("service",),
+    # В отзыве выводится имя мастера
+    "reviews": ("review", "master"),
+}
+
+
+def _initial_version():
+    # Счетчик мог быть вытеснен раньше страниц, собранных с его старыми номерами.
+    # Новый отсчет начинаем от времени, чтобы не совпасть ни с одним из них
+    return time.time_ns() // 1000
+
+
+def get_versions(*names):
+    """
+    Текущие версии моделей: {"master": 3, ...}. Отсутствующие в кэше
+    (после рестарта или вытеснения) заводятся заново.
+    """
+    keys = {VERSION_KEY % name: name for name in names}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, name in keys.items():
+        if key not in found:
+            initial = _initial_version()
+            cache.add(key, initial, timeout=None)
+            found[key] = cache.get(key, initial)
+        versions[name] = found[key]
+    return versions
+
+
+async def aget_versions(*names):
+    """
+    Асинхронный get_versions(): с сетевым бэкендом кэша (Redis, Memcached)
+    синхронные вызовы блокировали бы цикл событий.
+    """
+    keys = {VERSION_KEY % name: name for name in names}
+    found = await cache.aget_many(keys)
+    versions = {}
+    for key, name in keys.items():
+        if key not in found:
+            initial = _initial_version()
+            await cache.aadd(key, initial, timeout=None)
+            found[key] = await cache.aget(key, initial)
+        versions[name] = found[key]
+    return versions
+
+
+async def aload_versions(request, *names):
+    """
+    Загружает версии в request до синхронных валидаторов @condition
+    в асинхронном view - они возьмут их оттуда (см. request_versions).
+    """
+    versions = await aget_versions(*names)
+    request._cache_versions = {**getattr(request, "_cache_versions", {}), **versions}
+    return versions
+
+
+def request_versions(request, *names):
+    """
+    Версии, загруженные для этого запроса, иначе - из кэша. Запоминаем их в request:
+    валидатор ETag и сам view читают версии один раз.
+    """
+    loaded = getattr(request, "_cache_versions", None) or {}
+    if all(name in loaded for name in names):
+        return {name: loaded[name] for name in names}
+    versions = get_versions(*names)
+    if request is not None:
+        request._cache_versions = {**loaded, **versions}
+    return versions
+
+
+def bump_version(name):
+    """
+    Увеличивает версию модели - все зависящие от нее ключи становятся неактуальными.
+    """
+    key = VERSION_KEY % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключа нет (рестарт, вытеснение) - начинаем со значения, которого точно не было
+        cache.set(key, _initial_version(), timeout=None)
+
+
+# Все модели, от версий которых зависит лендинг
+LANDING_MODELS = tuple(sorted({name for names in LANDING_SECTIONS.values() for name in names}))
+
+
+def landing_versions(request=None):
+    """
+    Версии секций лендинга: {"masters": "3.7", "services": "7", "reviews": "2.3"}.
+    """
+    versions = request_versions(request, *LANDING_MODELS)
+    return {
+        section: ".".join(str(versions[name]) for name in names)
+        for section, names in LANDING_SECTIONS.items()
+    }
+
+
+def landing_page_key(versions):
+    return "landing:page:%s" % ":".join(versions[section] for section in sorted(versions))
+
+
+def cache_timeout():
+    return getattr(settings, "LANDING_CACHE_TIMEOUT", 60 * 60)
+
+
+# --- Валидаторы для условных GET-запросов (ETag / Last-Modified) ---
+
+
+def _etag(*parts):
+    return hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def landing_etag(request):
+    return _etag("landing", landing_page_key(landing_versions(request)))
+
+
+def services_list_etag(request):
+    return _etag("services", request_versions(request, "service")["service"])
+
+
+def _order_updated(request, order_id):
+    """
+    Дата изменения заявки - одним запросом на запрос (запоминаем в request).
+    """
+    from .models import Order
+
+    cache_attr = "_order_%s_updated" % order_id
+    if not hasattr(request, cache_attr):
+        setattr(
+            request,
+            cache_attr,
+            Order.objects.filter(pk=order_id).values_list("date_updated", flat=True).first(),
+        )
+    return getattr(request, cache_attr)
+
+
+async def aorder_updated(request, order_id):
+    """
+    Асинхронная загрузка даты изменения заявки. Вызывается до order_detail_etag
+    в асинхронном view: валидаторы @condition синхронные и берут значение из request.
+    """
+    from .models import Order
+
+    cache_attr = "_order_%s_updated" % order_id
+    if not hasattr(request, cache_attr):
+        setattr(
+            request,
+            cache_attr,
+            await Order.objects.filter(pk=order_id).values_list("date_updated", flat=True).afirst(),
+        )
+    return getattr(request, cache_attr)
+
+
+def order_detail_etag(request, order_id):
+    """
+    Только ETag, без Last-Modified: версии мастеров и услуг - счетчики, а не даты,
+    и по одной date_updated заявки браузер получал бы 304 после переименования услуги.
+    """
+    updated = _order_updated(request, order_id)
+    if updated is None:
+        return None
+    # В карточке заказа выводятся имя мастера и названия/цены услуг
+    versions = request_versions(request, "master", "service")
+    return _etag("order", order_id, updated.timestamp(), versions["master"], versions["service"])
@@ -1,50 +1,67 @@
 # core/context_processors.py
-from django.urls import reverse
+"""
+Меню сайта для шаблонов.
+
+Процессор вызывается при каждом рендеринге с RequestContext, в том числе
+в админке, где меню не выводится. Поэтому пункты строятся один раз на
+URLconf (и префикс скрипта, который reverse() подставляет в адреса) и дальше
+отдаются готовыми неизменяемыми кортежами - вызов процессора стоит два
+обращения к lru_cache.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+MenuItem = namedtuple("MenuItem", ["name", "url", "icon_class"])
+
+# (название, имя маршрута, якорь, иконка)
+MENU = (
+    ("Главная", "landing", "#top", "bi-house"),
+    ("Мастера", "landing", "#masters", "bi-person-badge"),
+    ("Услуги", "landing", "#services", "bi-scissors"),
+    ("Отзывы", "landing", "#reviews", "bi-chat-dots"),
+    ("Записаться", "landing", "#get-order", "bi-calendar-check"),
+)
+STAFF_MENU = (
+    ("Заявки", "orders", "", "bi-clipboard-data"),
+    ("Список услуг", "services-list", "", "bi-list-check"),
+)
+
+
+def _build(entries, urlconf):
+    return tuple(
+        MenuItem(name, reverse(url_name, urlconf=urlconf) + anchor, icon_class)
+        for name, url_name, anchor, icon_class in entries
+    )
+
+
+@lru_cache(maxsize=None)
+def build_menu(urlconf, script_prefix):
+    return _build(MENU, urlconf)
+
+
+@lru_cache(maxsize=None)
+def build_staff_menu(urlconf, script_prefix):
+    return _build(STAFF_MENU, urlconf)
+
+
+@receiver(setting_changed)
+def clear_menu_cache(setting, **kwargs):
+    # Тесты с override_settings(ROOT_URLCONF=...) должны получить меню новой схемы
+    if setting in ("ROOT_URLCONF", "FORCE_SCRIPT_NAME"):
+        build_menu.cache_clear()
+        build_staff_menu.cache_clear()
 
 
 def menu_items(request):
     """
     Контекстный процессор для добавления меню в контекст шаблонов.
     """
-    menu = [
-        {
-            "name": "Главная",
-            "url": reverse("landing") + "#top",
-            "icon_class": "bi-house",
-        },
-        {
-            "name": "Мастера",
-            "url": reverse("landing") + "#masters",
-            "icon_class": "bi-person-badge",
-        },
-        {
-            "name": "Услуги",
-            "url": reverse("landing") + "#services",
-            "icon_class": "bi-scissors",
-        },
-        {
-            "name": "Отзывы",
-            "url": reverse("landing") + "#reviews",
-            "icon_class": "bi-chat-dots",
-        },
-        {
-            "name": "Записаться",
-            "url": reverse("landing") + "#get-order",
-            "icon_class": "bi-calendar-check",
-        },
-    ]
-
-    staff_menu = [
-        {
-            "name": "Заявки",
-            "url": reverse("orders"),
-            "icon_class": "bi-clipboard-data",
-        },
-        {
-            "name": "Список услуг",
-            "url": reverse("services-list"),
-            "icon_class": "bi-list-check",
-        },
-    ]
-
-    return {"menu_items": menu, "menu_staff_items": staff_menu}
+    urlconf, script_prefix = get_urlconf(), get_script_prefix()
+    return {
+        "menu_items": build_menu(urlconf, script_prefix),
+        "menu_staff_items": build_staff_menu(urlconf, script_prefix),
+    }
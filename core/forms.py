@@ -1,7 +1,21 @@
 from django import forms
-from .models import Order
+from django.utils import timezone
+from .availability import engine as availability
+from .idempotency import new_key
+from .models import Master, Order, Service
 
 class OrderForm(forms.ModelForm):
+    # Защита от повторной отправки (core/idempotency.py)
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=64)
+    # Мастер необязателен: без него назначается первый свободный
+    master = forms.ModelChoiceField(
+        queryset=Master.objects.filter(is_active=True).order_by('name'),
+        required=False,
+        empty_label='Любой свободный мастер',
+        label='Мастер',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
     class Meta:
         model = Order
         fields = ['name', 'phone', 'services', 'appointment_date']
@@ -9,5 +23,97 @@ class OrderForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'placeholder': 'Ваше имя', 'class': 'form-control'}),
             'phone': forms.TextInput(attrs={'placeholder': '+7 (999) 999-99-99', 'class': 'form-control'}),
             'services': forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
-            'appointment_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
-        }
\ No newline at end of file
+            'appointment_date': forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}, format='%Y-%m-%dT%H:%M'),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault('idempotency_key', new_key())
+
+    def clean(self):
+        """
+        Проверяет, что выбранный мастер (или хотя бы один, если мастер не выбран)
+        свободен на это время, и назначает его. Вызывать внутри immediate_atomic():
+        занятость читается из базы заново, а одновременную запись на SQLite
+        исключает транзакция BEGIN IMMEDIATE (см. core/writes.py).
+        """
+        cleaned_data = super().clean()
+        start = cleaned_data.get('appointment_date')
+        services = cleaned_data.get('services')
+        if start is None or services is None:
+            return cleaned_data
+
+        # Ошибки записи - общие для формы: шаблон выводит их над полями
+        if start < timezone.now():
+            self.add_error(None, 'Нельзя записаться на прошедшее время')
+            return cleaned_data
+
+        chosen = cleaned_data.get('master')
+        master = availability.find_free_master(
+            start, list(services), lock=True, master_id=chosen.pk if chosen else None
+        )
+        if master is not None:
+            self.instance.master = master
+        elif chosen is not None:
+            self.add_error(
+                None, f'Мастер {chosen.name} не может принять вас в это время. Выберите другое время или мастера.'
+            )
+        else:
+            self.add_error(None, 'На это время нет свободных мастеров. Выберите другое время.')
+        return cleaned_data
+
+
+class PreloadedServicesField(forms.ModelMultipleChoiceField):
+    """
+    Поле услуг для массового импорта: услуги загружены заранее одним запросом,
+    поэтому проверка строки не ходит в базу.
+    """
+
+    def __init__(self, services_by_pk, **kwargs):
+        super().__init__(queryset=Service.objects.none(), **kwargs)
+        self.services_by_pk = services_by_pk
+
+    def clean(self, value):
+        value = self.prepare_value(value)
+        if not value:
+            if self.required:
+                raise forms.ValidationError(self.error_messages['required'], code='required')
+            return []
+        services = {}
+        for pk in value:
+            service = self.services_by_pk.get(str(pk).strip())
+            if service is None:
+                raise forms.ValidationError(
+                    self.error_messages['invalid_choice'], code='invalid_choice', params={'value': pk}
+                )
+            services[service.pk] = service
+        return list(services.values())
+
+
+class OrderImportForm(OrderForm):
+    """
+    Проверка строки импорта теми же правилами полей, что и у OrderForm.
+    Импортируются уже состоявшиеся записи, поэтому свободное время мастера
+    и "прошедшую дату" не проверяем.
+    """
+
+    # Мастера строки проверяет OrderImporter по заранее загруженным id
+    master = None
+
+    class Meta(OrderForm.Meta):
+        fields = OrderForm.Meta.fields + ['comment', 'status']
+
+    def __init__(self, *args, services_by_pk, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['services'] = PreloadedServicesField(
+            services_by_pk, required=self.fields['services'].required
+        )
+        # Статус в файле необязателен - по умолчанию заявка новая
+        self.fields['status'].required = False
+
+    def clean_status(self):
+        return self.cleaned_data['status'] or Order._meta.get_field('status').default
+
+    def clean(self):
+        return forms.ModelForm.clean(self)
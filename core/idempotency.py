@@ -0,0 +1,45 @@
+# core/idempotency.py
+"""
+Ключи идемпотентности формы записи.
+
+Форма получает скрытое поле idempotency_key со случайным значением. Ключ
+сохраняется в той же транзакции, что и заявка; повторная отправка с тем же
+ключом (двойной клик, повтор после обрыва связи) не создает вторую заявку,
+а получает тот же ответ, что и первая. Ключи живут IDEMPOTENCY_KEY_TTL секунд.
+"""
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+# Доля сохранений, после которых удаляются просроченные ключи
+PURGE_PROBABILITY = 0.01
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+
+def is_used(key, using="default"):
+    return bool(key) and IdempotencyKey.objects.using(using).filter(key=key, date_created__gte=_cutoff()).exists()
+
+
+def remember(key, order, using="default"):
+    """
+    Сохраняет ключ заявки. Вызывать в транзакции сохранения заявки: при гонке
+    двух одинаковых отправок вторая получит IntegrityError и откатится целиком.
+    """
+    keys = IdempotencyKey.objects.using(using)
+    # Просроченный ключ с тем же значением не должен мешать новой заявке
+    keys.filter(key=key, date_created__lt=_cutoff()).delete()
+    keys.create(key=key, order=order)
+    if random.random() < PURGE_PROBABILITY:
+        keys.filter(date_created__lt=_cutoff()).delete()
@@ -0,0 +1,191 @@
+# core/jobs.py
+"""
+Очередь фоновых задач в базе данных.
+
+Задача - функция, зарегистрированная декоратором @task("имя"). Поставить ее
+в очередь: enqueue("имя", {...}). Строка задачи пишется в текущей транзакции,
+поэтому задача появится, только если закоммитится и то, ради чего ее ставили.
+
+Выполняет задачи команда run_jobs. Задача берется в работу атомарным UPDATE
+(работает и на SQLite без SELECT ... FOR UPDATE). Упавшая задача повторяется
+с экспоненциальной задержкой, после max_attempts попыток уходит в статус
+"dead" - раздел "Невыполненные задачи" в админке.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("core.jobs")
+
+_registry = {}
+
+
+def task(name, max_attempts=None):
+    """Регистрирует функцию func(payload) как задачу name."""
+
+    def decorator(func):
+        _registry[name] = (func, max_attempts)
+        return func
+
+    return decorator
+
+
+def registered_tasks():
+    return dict(_registry)
+
+
+def enqueue(name, payload=None, delay=None, max_attempts=None, using="default"):
+    if name not in _registry:
+        raise KeyError(f"Неизвестная задача: {name}")
+    default_attempts = _registry[name][1] or getattr(settings, "JOB_MAX_ATTEMPTS", 5)
+    return Job.objects.using(using).create(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts or default_attempts,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+
+
+def backoff(attempts):
+    """Задержка перед повтором: base * 2^(n-1), не больше max, плюс случайные до 10%."""
+    base = getattr(settings, "JOB_BACKOFF_SECONDS", 10)
+    limit = getattr(settings, "JOB_BACKOFF_MAX_SECONDS", 3600)
+    seconds = min(limit, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=seconds * (1 + random.random() * 0.1))
+
+
+def concurrency_limits():
+    """Сколько задач с данным именем может выполняться одновременно (по всем воркерам)."""
+    return getattr(settings, "JOB_CONCURRENCY", {})
+
+
+def release_stale(using="default"):
+    """
+    Возвращает в очередь задачи, зависшие в running дольше JOB_LOCK_TIMEOUT
+    (воркер упал посреди задачи).
+    """
+    timeout = timedelta(seconds=getattr(settings, "JOB_LOCK_TIMEOUT", 15 * 60))
+    return (
+        Job.objects.using(using)
+        .filter(status="running", locked_at__lt=timezone.now() - timeout)
+        .update(status="queued", locked_by="", locked_at=None, date_updated=timezone.now())
+    )
+
+
+def _running_counts(names, using):
+    return dict(
+        Job.objects.using(using)
+        .filter(status="running", name__in=names)
+        .values_list("name")
+        .annotate(count=Count("id"))
+    )
+
+
+def _has_free_slot(name, limit, using):
+    """
+    Условие для UPDATE: выполняющихся задач name меньше limit. Считается
+    в том же запросе, что и захват, - два воркера не превысят предел,
+    даже если оба прочитали одно и то же число выполняющихся задач.
+    """
+    running = (
+        Job.objects.using(using)
+        .filter(status="running", name=name)
+        .order_by()
+        .values("name")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return LessThan(Coalesce(Subquery(running), 0), limit)
+
+
+def claim(worker_id, limit, names=None, using="default"):
+    """
+    Берет в работу до limit готовых задач с учетом ограничений JOB_CONCURRENCY.
+    Возвращает список взятых задач.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    limits = concurrency_limits()
+    # Предварительный подсчет только отсекает заведомо занятые имена;
+    # сам предел проверяет условный UPDATE ниже
+    running = _running_counts(list(limits), using)
+    free = {name: limit_ - running.get(name, 0) for name, limit_ in limits.items()}
+    blocked = [name for name, slots in free.items() if slots <= 0]
+
+    candidates = Job.objects.using(using).filter(status="queued", run_at__lte=now).exclude(name__in=blocked)
+    if names:
+        candidates = candidates.filter(name__in=names)
+    claimed = []
+    # Кандидатов берем с запасом: часть может перехватить другой воркер
+    for job in candidates.order_by("run_at", "id")[: limit * 2]:
+        if len(claimed) >= limit:
+            break
+        if job.name in free and free[job.name] <= 0:
+            continue
+        target = Job.objects.using(using).filter(pk=job.pk, status="queued")
+        if job.name in limits:
+            target = target.filter(_has_free_slot(job.name, limits[job.name], using))
+        won = target.update(
+            status="running", locked_by=worker_id, locked_at=now, attempts=F("attempts") + 1, date_updated=now
+        )
+        if won:
+            if job.name in free:
+                free[job.name] -= 1
+            job.refresh_from_db(using=using)
+            claimed.append(job)
+        elif job.name in free:
+            # Задачу или последний слот перехватил другой воркер - задачи
+            # с этим именем возьмем при следующем опросе
+            free[job.name] = 0
+    return claimed
+
+
+def _finish(job, using, **fields):
+    fields["date_updated"] = timezone.now()
+    # Задачу могли вернуть в очередь как зависшую - пишем, только если она все еще наша
+    Job.objects.using(using).filter(pk=job.pk, status="running", locked_by=job.locked_by).update(**fields)
+
+
+def run(job, using="default"):
+    """Выполняет взятую задачу и записывает результат, повтор или перевод в dead."""
+    entry = _registry.get(job.name)
+    try:
+        if entry is None:
+            raise KeyError(f"Неизвестная задача: {job.name}")
+        result = entry[0](job.payload)
+    except Exception as error:
+        message = "".join(traceback.format_exception(error))[-4000:]
+        if job.attempts >= job.max_attempts:
+            logger.error("Задача %s #%s не выполнена после %s попыток: %s", job.name, job.pk, job.attempts, error)
+            _finish(job, using, status="dead", last_error=message, locked_by="", locked_at=None)
+        else:
+            delay = backoff(job.attempts)
+            logger.warning("Задача %s #%s упала, повтор через %s: %s", job.name, job.pk, delay, error)
+            _finish(
+                job, using,
+                status="queued", last_error=message, locked_by="", locked_at=None, run_at=timezone.now() + delay,
+            )
+        return False
+    _finish(job, using, status="done", result=result, locked_by="", locked_at=None)
+    return True
+
+
+def retry(queryset):
+    """
+    Возвращает задачи в очередь с новым набором попыток (действие админки).
+    Выполняющиеся задачи не трогаем: иначе их взял бы второй воркер, пока первый
+    еще работает, а результат первого был бы потерян (см. _finish).
+    """
+    return queryset.exclude(status="running").update(
+        status="queued", attempts=0, run_at=timezone.now(), locked_by="", locked_at=None, date_updated=timezone.now()
+    )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Order
+from core.phone import normalize_phone
+from core.stats import refresh_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Заполняет телефон в формате E.164 у существующих заявок"
+
+    # bulk_update не отправляет сигналы, поэтому CustomerStats (ключ - phone_normalized)
+    # пересчитываем сами, в транзакции пачки. Поисковому индексу пересчет не нужен:
+    # в FTS лежит исходный phone, а точный поиск по номеру идет по колонке phone_normalized.
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Размер пачки обновления")
+        parser.add_argument("--all", action="store_true", help="Пересчитать все заявки, а не только пустые")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        queryset = Order.objects.all() if options["all"] else Order.objects.filter(phone_normalized="")
+
+        updated = 0
+        last_id = 0
+        while True:
+            # Идем по первичному ключу пачками, чтобы не держать в памяти всю таблицу
+            batch = list(
+                queryset.filter(id__gt=last_id).order_by("id").only("id", "phone", "phone_normalized", "status")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = []
+            # Выручку дают только завершенные заявки - пересчитываем старый и новый номер
+            phones = set()
+            for order in batch:
+                normalized = normalize_phone(order.phone)
+                if normalized != order.phone_normalized:
+                    if order.status == "completed":
+                        phones |= {order.phone_normalized, normalized}
+                    order.phone_normalized = normalized
+                    changed.append(order)
+            with transaction.atomic():
+                Order.objects.bulk_update(changed, ["phone_normalized"])
+                refresh_customer_stats(phones)
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено заявок: {updated}"))
@@ -0,0 +1,180 @@
+import itertools
+import logging
+import random
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.benchmark import compare, load_results, measure, save_results
+from core.availability import engine as availability
+from core.cache import bump_version
+from core.models import Order, Service
+
+# Варианты поиска на странице заявок: подпись -> чекбоксы search_by_*
+SEARCH_MODES = {
+    "no_search": (),
+    "phone": ("search_by_phone",),
+    "name": ("search_by_name",),
+    "comment": ("search_by_comment",),
+    "all_fields": ("search_by_phone", "search_by_name", "search_by_comment"),
+}
+STATUS_MODES = {
+    "new": ("status_new",),
+    "all_statuses": ("status_new", "status_confirmed", "status_completed", "status_canceled"),
+}
+SORT_MODES = ("desc", "asc")
+PRICE_FILTERS = ("", "five_hundreds", "one_thousends", "two_thousends", "up_two_thousends")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет p50/p95 и число SQL-запросов основных страниц на текущей базе. "
+        "Все изменения откатываются. Данные можно подготовить командой generate_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--only", default="", help="Запускать только сценарии, содержащие подстроку")
+        parser.add_argument("--save-baseline", metavar="PATH", help="Сохранить результаты как базовую линию")
+        parser.add_argument("--compare", metavar="PATH", help="Сравнить с сохраненной базовой линией")
+        parser.add_argument("--threshold", type=float, default=1.2, help="Допустимый рост p95 (во сколько раз)")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Завершиться с ошибкой при регрессии")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not Order.objects.exists():
+            raise CommandError("В базе нет заявок - сначала запустите generate_data")
+        self.random = random.Random(options["seed"])
+        # Строки метрик по каждому запросу только мешают выводу
+        logging.getLogger("core.metrics").setLevel(logging.ERROR)
+
+        # Сервер разработки не нужен: ходим через тестовый клиент, отключив debug toolbar
+        with override_settings(
+            ALLOWED_HOSTS=["*"],
+            DEBUG_TOOLBAR_CONFIG={"SHOW_TOOLBAR_CALLBACK": lambda request: False},
+            # Все заявки идут с одного адреса и телефона - лимиты не должны срабатывать
+            # (иначе замерялся бы ответ 429), но корзины токенов проверяются как обычно
+            ORDER_RATE_LIMITS={"ip": (10**9, 0), "phone": (10**9, 0)},
+        ):
+            with transaction.atomic():
+                results = self.run_scenarios(options)
+                # Заявки, сессии и пользователь бенчмарка не должны остаться в базе
+                transaction.set_rollback(True)
+
+        for name, result in sorted(results.items()):
+            self.stdout.write(
+                f"{name:<60} p50={result['p50_ms']:>9.2f} мс  p95={result['p95_ms']:>9.2f} мс  "
+                f"запросов={result['queries']}"
+            )
+
+        if options["save_baseline"]:
+            save_results(results, options["save_baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Базовая линия сохранена: {options['save_baseline']}"))
+
+        if options["compare"]:
+            lines, regressed = compare(results, load_results(options["compare"]), options["threshold"])
+            for line in lines:
+                self.stdout.write(line)
+            if regressed and options["fail_on_regression"]:
+                raise CommandError("Обнаружены регрессии производительности")
+
+    def scenarios(self):
+        client = Client()
+        staff = Client()
+        user = get_user_model().objects.create_superuser("benchmark", "benchmark@example.com", "benchmark")
+        staff.force_login(user)
+
+        sample = Order.objects.order_by("?").first()
+        search_terms = {
+            "phone": sample.phone[-5:],
+            "name": sample.name.split()[-1],
+            "comment": "стрижка",
+            "all_fields": sample.name.split()[0],
+        }
+        order_ids = list(Order.objects.order_by("?").values_list("id", flat=True)[:100])
+        service_ids = list(Service.objects.values_list("id", flat=True)[:3])
+
+        def landing_cold():
+            for name in ("master", "service", "review"):
+                bump_version(name)
+            return client.get("/")
+
+        yield "landing (warm cache)", lambda: client.get("/"), 200
+        yield "landing (cold cache)", landing_cold, 200
+
+        combinations = itertools.product(SEARCH_MODES.items(), STATUS_MODES.items(), SORT_MODES)
+        for (search_name, checkboxes), (status_name, statuses), sort in combinations:
+            params = {"order_by_date": sort}
+            if checkboxes:
+                params["q"] = search_terms[search_name]
+            params.update({checkbox: "on" for checkbox in checkboxes + statuses})
+            url = "/orders/?" + urlencode(params)
+            yield f"orders_list {search_name}/{status_name}/{sort}", lambda url=url: staff.get(url), 200
+
+        def orders_stream():
+            response = staff.get("/orders/?stream=on")
+            b"".join(response.streaming_content)
+            return response
+
+        yield "orders_list stream/all_statuses", orders_stream, 200
+
+        yield "order_detail", lambda: client.get(f"/orders/{self.random.choice(order_ids)}/"), 200
+
+        services = list(Service.objects.filter(pk__in=service_ids[:1]))
+
+        def order_create():
+            # Время берем из свободных слотов: занятое дало бы форму с ошибкой вместо записи
+            for _ in range(100):
+                day = timezone.localdate() + timedelta(days=self.random.randint(1, 60))
+                starts = [start for slots in availability.free_slots(day, services).values() for start in slots]
+                if starts:
+                    break
+            else:
+                raise CommandError("Не нашлось свободного времени для записи - добавьте мастеров (generate_data)")
+            start = timezone.localtime(self.random.choice(starts))
+            return client.post(
+                "/order/create/",
+                {
+                    "name": "Бенчмарк",
+                    "phone": "+7 (999) 000-00-00",
+                    "services": service_ids[:1],
+                    "appointment_date": start.strftime("%Y-%m-%dT%H:%M"),
+                },
+            )
+
+        yield "order_create", order_create, 302
+
+        for price_filter in PRICE_FILTERS:
+            url = "/admin/core/order/" + (f"?total_order_price={price_filter}" if price_filter else "")
+            yield f"admin order changelist {price_filter or 'no_filter'}", lambda url=url: staff.get(url), 200
+
+        def admin_scale_mode():
+            with override_settings(ORDER_ADMIN_SCALE_MODE=True):
+                return staff.get("/admin/core/order/")
+
+        yield "admin order changelist scale_mode", admin_scale_mode, 200
+
+    def run_scenarios(self, options):
+        results = {}
+        for name, func, expected in self.scenarios():
+            if options["only"] and options["only"] not in name:
+                continue
+
+            # Ошибка, редирект на логин или 429 быстрее настоящей страницы - такой замер ничего не значит
+            def checked(name=name, func=func, expected=expected):
+                response = func()
+                if response.status_code != expected:
+                    raise CommandError(f"{name}: ответ {response.status_code}, ожидался {expected}")
+                return response
+
+            # Прогрев: первый вызов заполняет кэши и не попадает в замер
+            checked()
+            results[name] = measure(checked, options["iterations"])
+        return results
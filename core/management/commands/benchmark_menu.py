@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.urls import get_script_prefix, get_urlconf
+
+from core import context_processors
+from core.benchmark import measure_calls, save_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Микробенчмарк контекстного процессора меню: сборка пунктов на каждый вызов "
+        "(как было) против готового меню, общего для всех запросов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=2000, help="Вызовов в серии")
+        parser.add_argument("--repeat", type=int, default=7, help="Серий")
+        parser.add_argument("--save", metavar="PATH", help="Сохранить результаты в JSON")
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        urlconf, script_prefix = get_urlconf(), get_script_prefix()
+        build_menu = context_processors.build_menu.__wrapped__
+        build_staff_menu = context_processors.build_staff_menu.__wrapped__
+
+        def uncached():
+            # Прежнее поведение: семь reverse() и новые списки на каждый рендеринг
+            return {
+                "menu_items": build_menu(urlconf, script_prefix),
+                "menu_staff_items": build_staff_menu(urlconf, script_prefix),
+            }
+
+        def cached_with_staff():
+            return list(context_processors.menu_items(request)["menu_staff_items"])
+
+        nav = get_template("include_nav_menu.html")
+
+        scenarios = {
+            "menu_items: сборка на каждый вызов": uncached,
+            "menu_items: готовое меню (шаблон без меню, как в админке)": lambda: context_processors.menu_items(request),
+            "menu_items: готовое меню + меню персонала": cached_with_staff,
+            "include_nav_menu.html: рендеринг со сборкой": lambda: nav.render(uncached()),
+            "include_nav_menu.html: рендеринг с готовым меню": lambda: nav.render(
+                context_processors.menu_items(request)
+            ),
+        }
+        results = {}
+        for name, func in scenarios.items():
+            func()
+            results[name] = measure_calls(func, number=options["number"], repeat=options["repeat"])
+            self.stdout.write(
+                f"{name:<60} лучшее={results[name]['best_us']:>9.2f} мкс  медиана={results[name]['median_us']:>9.2f} мкс"
+            )
+
+        before = results["menu_items: сборка на каждый вызов"]["median_us"]
+        after = results["menu_items: готовое меню (шаблон без меню, как в админке)"]["median_us"]
+        self.stdout.write(self.style.SUCCESS(f"Экономия на запрос: {before - after:.2f} мкс (x{before / after:.1f})"))
+        if options["save"]:
+            save_results(results, options["save"])
@@ -0,0 +1,91 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile, save_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность запущенных серверов при множестве одновременных клиентов. "
+        "Например, WSGI: gunicorn barbershop.wsgi -w 2 -b 127.0.0.1:8001, "
+        "ASGI: ASYNC_VIEWS=1 uvicorn barbershop.asgi:application --workers 2 --port 8002, затем "
+        "manage.py benchmark_servers http://127.0.0.1:8001 http://127.0.0.1:8002 --slow-client-ms 200"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Адреса серверов (схема, хост и порт)")
+        parser.add_argument("--path", action="append", help="Страница для запросов, можно несколько (по умолчанию /services/)")
+        parser.add_argument("--concurrency", type=int, default=50, help="Одновременных клиентов")
+        parser.add_argument("--requests", type=int, default=500, help="Всего запросов на сервер")
+        parser.add_argument(
+            "--slow-client-ms",
+            type=int,
+            default=0,
+            help="Медленный клиент: пауза перед концом заголовков запроса (держит соединение)",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--save", metavar="PATH", help="Сохранить результаты в JSON")
+
+    def handle(self, *args, **options):
+        paths = options["path"] or ["/services/"]
+        results = {}
+        for url in options["urls"]:
+            parts = urlsplit(url)
+            if parts.scheme != "http" or not parts.hostname:
+                raise CommandError(f"Ожидается адрес вида http://host:port, получено: {url}")
+            for path in paths:
+                name = f"{parts.netloc}{path}"
+                results[name] = self.run(parts.hostname, parts.port or 80, path, options)
+                result = results[name]
+                self.stdout.write(
+                    f"{name:<40} {result['rps']:>8.1f} запр/с  p50={result['p50_ms']:>8.2f} мс  "
+                    f"p95={result['p95_ms']:>8.2f} мс  ошибок={result['errors']}"
+                )
+        if options["save"]:
+            save_results(results, options["save"])
+
+    def run(self, host, port, path, options):
+        timings, errors = [], 0
+        lock = threading.Lock()
+        head = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n".encode()
+        pause = options["slow_client_ms"] / 1000
+
+        def one_request(_):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                with socket.create_connection((host, port), timeout=options["timeout"]) as sock:
+                    sock.sendall(head)
+                    if pause:
+                        time.sleep(pause)
+                    sock.sendall(b"\r\n")
+                    response = b""
+                    while chunk := sock.recv(65536):
+                        response += chunk
+                ok = response.startswith((b"HTTP/1.1 200", b"HTTP/1.0 200"))
+            except OSError:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    timings.append(elapsed)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(one_request, range(options["requests"])))
+        total = time.perf_counter() - started
+        return {
+            "rps": round(len(timings) / total, 2) if total else 0.0,
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "errors": errors,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+        }
@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import save_results
+
+# Выполняется в новом процессе: импорт WSGI-приложения (django.setup, URLconf,
+# предкомпиляция шаблонов) и первый запрос - то, что ждет балансировщик при
+# запуске нового воркера
+PROBE = """
+import importlib, json, sys, time
+from wsgiref.util import setup_testing_defaults
+start = time.perf_counter()
+module_name, attribute = sys.argv[1].rsplit(".", 1)
+application = getattr(importlib.import_module(module_name), attribute)
+loaded = time.perf_counter()
+environ = {"PATH_INFO": sys.argv[2], "HTTP_HOST": sys.argv[3]}
+setup_testing_defaults(environ)
+statuses = []
+b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (loaded - start) * 1000,
+    "first_response_ms": (done - loaded) * 1000,
+    "status": statuses[0] if statuses else "",
+}))
+"""
+
+PROJECT_PACKAGES = ("core", "barbershop")
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)$")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет холодный старт воркера в отдельных процессах: импорт WSGI-приложения, "
+        "время до первого ответа и время импорта по пакетам (python -X importtime). "
+        "--budget-ms задает бюджет, превышение - ошибка"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", help="Профиль настроек DJANGO_PROFILE (по умолчанию - текущий)")
+        parser.add_argument("--path", default="/", help="Адрес первого запроса")
+        parser.add_argument("--runs", type=int, default=5, help="Запусков для медианы")
+        parser.add_argument("--top", type=int, default=15, help="Сколько пакетов показать")
+        parser.add_argument("--budget-ms", type=float, help="Бюджет на импорт и первый ответ (медиана), мс")
+        parser.add_argument("--save", metavar="PATH", help="Сохранить результаты в JSON")
+
+    def environment(self, options):
+        env = dict(os.environ)
+        env["DJANGO_SETTINGS_MODULE"] = settings.SETTINGS_MODULE
+        env["DJANGO_PROFILE"] = options["profile"] or getattr(settings, "SETTINGS_PROFILE", "development")
+        env.setdefault("ALLOWED_HOSTS", "localhost")
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH", "")]))
+        return env
+
+    def run_probe(self, env, options, importtime=False):
+        host = env["ALLOWED_HOSTS"].split(",")[0].strip() or "localhost"
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        command += ["-c", PROBE, settings.WSGI_APPLICATION, options["path"], host]
+        completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f"Процесс завершился с ошибкой:\n{completed.stderr[-2000:]}")
+        return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+    @staticmethod
+    def slowest_packages(stderr, top):
+        """
+        Собственное время импорта модулей, сложенное по пакетам верхнего уровня
+        (django, debug_toolbar, core, ...): каждый модуль учтен один раз.
+        """
+        packages = {}
+        for line in stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                package = match.group(2).split(".")[0]
+                packages[package] = packages.get(package, 0) + int(match.group(1)) / 1000
+        return sorted(((ms, name) for name, ms in packages.items()), reverse=True)[:top]
+
+    @staticmethod
+    def project_modules(stderr, top):
+        """Собственное время импорта модулей проекта (core, barbershop)."""
+        modules = []
+        for line in stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match and match.group(2).split(".")[0] in PROJECT_PACKAGES:
+                modules.append((int(match.group(1)) / 1000, match.group(2)))
+        return sorted(modules, reverse=True)[:top]
+
+    def handle(self, *args, **options):
+        env = self.environment(options)
+        self.stdout.write(f"Профиль: {env['DJANGO_PROFILE']}, первый запрос: {options['path']}")
+
+        runs = [self.run_probe(env, options)[0] for _ in range(max(1, options["runs"]))]
+        statuses = {run["status"] for run in runs}
+        result = {
+            "profile": env["DJANGO_PROFILE"],
+            "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+            "first_response_ms": round(statistics.median(run["first_response_ms"] for run in runs), 1),
+            "total_ms": round(statistics.median(run["import_ms"] + run["first_response_ms"] for run in runs), 1),
+            "status": sorted(statuses),
+        }
+        # Отдельный запуск с -X importtime: сам замер замедляет импорт, в медиану он не входит
+        _, stderr = self.run_probe(env, options, importtime=True)
+        result["packages"] = {name: round(ms, 1) for ms, name in self.slowest_packages(stderr, options["top"])}
+
+        result["project_modules"] = {
+            name: round(ms, 1) for ms, name in self.project_modules(stderr, options["top"])
+        }
+
+        # Время с накладными расходами -X importtime - для сравнения между собой, не с итогом
+        for title, timings in (("Импорт по пакетам", result["packages"]), ("Модули проекта", result["project_modules"])):
+            self.stdout.write(f"{title} (мс):")
+            for name, ms in timings.items():
+                self.stdout.write(f"  {name:<50} {ms:>8.1f}")
+        self.stdout.write(
+            f"Импорт приложения: {result['import_ms']} мс, первый ответ: {result['first_response_ms']} мс, "
+            f"всего: {result['total_ms']} мс (медиана из {len(runs)})"
+        )
+        if not all(status[:1] in ("2", "3") for status in statuses):
+            self.stderr.write(f"Первый запрос вернул {', '.join(sorted(statuses))} - замер может быть неточным")
+
+        if options["save"]:
+            save_results(result, options["save"])
+        budget = options["budget_ms"]
+        if budget is not None:
+            if result["total_ms"] > budget:
+                raise CommandError(f"Бюджет холодного старта превышен: {result['total_ms']} мс > {budget} мс")
+            self.stdout.write(self.style.SUCCESS(f"В пределах бюджета {budget} мс"))
@@ -0,0 +1,129 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.benchmark import measure, save_results
+from core.models import Master, Order, Review, Service
+from core.templating import compile_engine
+
+FILESYSTEM_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет рендеринг landing.html и orders_list.html на больших наборах данных "
+        "в трех режимах: без кэша шаблонов, с кэширующим загрузчиком и с предкомпиляцией "
+        "(include/extends связаны заранее). Данные строятся в памяти, база не нужна"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--masters", type=int, default=200, help="Мастеров на лендинге")
+        parser.add_argument("--services", type=int, default=100, help="Услуг на лендинге")
+        parser.add_argument("--orders", type=int, default=1000, help="Карточек в списке заявок")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--save", metavar="PATH", help="Сохранить результаты в JSON")
+
+    def build_data(self, options):
+        """
+        Несохраненные объекты с проставленными pk и заранее "загруженными" услугами -
+        рендеринг идет без единого запроса, как во view после prefetch_related.
+        """
+        rng = random.Random(options["seed"])
+        services = [
+            Service(
+                pk=index, name=f"Услуга {index}", description="Описание услуги " * 10,
+                price=Decimal(rng.randrange(300, 5000)), duration=30, is_popular=index % 5 == 0, thumbnails={},
+            )
+            for index in range(1, options["services"] + 1)
+        ]
+        masters = []
+        for index in range(1, options["masters"] + 1):
+            master = Master(
+                pk=index, name=f"Мастер {index}", phone="+79990000000", experience=rng.randrange(1, 20),
+                avg_rating=Decimal("4.50"), review_count=rng.randrange(0, 50), thumbnails={},
+            )
+            master_services = rng.sample(services, min(5, len(services)))
+            master._prefetched_objects_cache = {"services": master_services}
+            master.num_services = len(master_services)
+            masters.append(master)
+        reviews = []
+        for index in range(1, 4):
+            review = Review(pk=index, name=f"Клиент {index}", text="Отличная стрижка", rating=5)
+            review.master = masters[0] if masters else None
+            reviews.append(review)
+        now = timezone.now()
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        orders = []
+        for index in range(1, options["orders"] + 1):
+            order = Order(
+                pk=index, name=f"Клиент {index}", phone="+79991234567", status=rng.choice(statuses),
+                appointment_date=now + timedelta(hours=index),
+            )
+            order.master = rng.choice(masters) if masters else None
+            order._prefetched_objects_cache = {"services": rng.sample(services, min(3, len(services)))}
+            orders.append(order)
+        landing = {
+            "masters": masters,
+            "services": services,
+            "reviews": reviews,
+            "versions": {"masters": 1, "services": 1, "reviews": 1},
+            "cache_timeout": 0,
+        }
+        orders_list = {"orders": orders, "next_query": None, "first_query": None}
+        return {"landing.html": landing, "orders_list.html": orders_list}
+
+    def engines(self):
+        """Движки с настройками проекта и разными загрузчиками."""
+        base = engines["django"].engine
+        options = {
+            "dirs": base.dirs,
+            "context_processors": base.context_processors,
+            "string_if_invalid": base.string_if_invalid,
+            "file_charset": base.file_charset,
+            "libraries": base.libraries,
+            "builtins": base.builtins,
+            "autoescape": base.autoescape,
+        }
+        plain = Engine(loaders=FILESYSTEM_LOADERS, **options)
+        cached = Engine(loaders=[("django.template.loaders.cached.Loader", FILESYSTEM_LOADERS)], **options)
+        precompiled = Engine(loaders=[("django.template.loaders.cached.Loader", FILESYSTEM_LOADERS)], **options)
+        compiled, linked, _ = compile_engine(precompiled)
+        self.stdout.write(f"Предкомпиляция: шаблонов {compiled}, связано include/extends {linked}")
+        return {"no_cache": plain, "cached_loader": cached, "precompiled": precompiled}
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        data = self.build_data(options)
+
+        results = {}
+        # {% cache %} на лендинге отдал бы готовые фрагменты - замеряем сам рендеринг
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            for mode, engine in self.engines().items():
+                for name, context in data.items():
+
+                    def render(engine=engine, name=name, context=context):
+                        return engine.get_template(name).render(RequestContext(request, context))
+
+                    render()
+                    result = measure(render, options["iterations"])
+                    results[f"{name} {mode}"] = result
+                    self.stdout.write(
+                        f"{name:<18} {mode:<14} p50={result['p50_ms']:>9.2f} мс  p95={result['p95_ms']:>9.2f} мс  "
+                        f"запросов={result['queries']}"
+                    )
+
+        if options["save"]:
+            save_results(results, options["save"])
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены: {options['save']}"))
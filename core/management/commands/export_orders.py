@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.bulk import csv_header, detect_format, format_row, iter_order_batches
+
+
+class Command(BaseCommand):
+    help = "Выгружает заявки в CSV или JSONL потоково, с возобновлением по контрольной точке"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", metavar="PATH", help="Файл выгрузки (по умолчанию - stdout)")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="По умолчанию - по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            metavar="PATH",
+            help="Файл с id последней выгруженной заявки; при повторном запуске выгрузка дописывается с него",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"]) if options["output"] else None
+        file_format = options["format"] or (detect_format(output) if output else "csv")
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        after_id = int(checkpoint.read_text()) if checkpoint and checkpoint.exists() else 0
+
+        # При возобновлении дописываем в конец файла, заголовок CSV уже есть
+        resuming = after_id > 0 and output is not None and output.exists()
+        stream = output.open("a" if resuming else "w", encoding="utf-8", newline="") if output else sys.stdout
+        exported = 0
+        try:
+            if file_format == "csv" and not resuming:
+                stream.write(csv_header())
+            for batch in iter_order_batches(after_id=after_id, batch_size=options["batch_size"]):
+                stream.writelines(format_row(row, file_format) for row in batch)
+                stream.flush()
+                exported += len(batch)
+                if checkpoint is not None:
+                    checkpoint.write_text(str(batch[-1]["id"]))
+        finally:
+            if output is not None:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(f"Выгружено заявок: {exported}"))
@@ -0,0 +1,154 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.bulk import bulk_create_with_dates
+from core.models import Master, Order, Review, Service
+from core.phone import normalize_phone
+
+FIRST_NAMES = ("Иван", "Пётр", "Сергей", "Алексей", "Дмитрий", "Андрей", "Михаил", "Николай", "Егор", "Павел")
+LAST_NAMES = ("Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Волков", "Козлов", "Лебедев", "Орлов")
+SERVICE_NAMES = (
+    "Стрижка", "Бритье", "Укладка", "Окрашивание", "Стрижка бороды",
+    "Массаж головы", "Мытье головы", "Камуфляж седины", "Детская стрижка", "Королевское бритье",
+)
+COMMENTS = (
+    "", "", "", "Перезвоните, пожалуйста", "Хочу к тому же мастеру", "Буду с сыном",
+    "Опоздаю на 10 минут", "Стрижка как в прошлый раз", "Нужна консультация по окрашиванию",
+)
+REVIEW_TEXTS = ("Отлично!", "Все понравилось", "Приду еще", "Неплохо", "Долго ждал", "Лучший барбершоп")
+
+
+class Command(BaseCommand):
+    help = "Генерирует синтетические данные для нагрузочного тестирования (быстрые пакетные вставки)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--masters", type=int, default=20)
+        parser.add_argument("--services", type=int, default=30)
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--reviews", type=int, default=5_000)
+        parser.add_argument("--customers", type=int, default=20_000, help="Сколько разных телефонов")
+        parser.add_argument("--days", type=int, default=730, help="Глубина истории в днях")
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Не пересчитывать поисковый индекс, статистику клиентов и рейтинги",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.days = options["days"]
+
+        services = self.create_services(options["services"])
+        masters = self.create_masters(options["masters"], services)
+        self.create_orders(options["orders"], options["customers"], masters, services)
+        self.create_reviews(options["reviews"], masters)
+
+        # bulk_create не отправляет сигналы - производные данные считаем целиком
+        if not options["skip_derived"]:
+            call_command("rebuild_search_index", batch_size=self.batch_size, stdout=self.stdout)
+            call_command("rebuild_customer_stats", stdout=self.stdout)
+            call_command("reconcile_master_ratings", stdout=self.stdout)
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.random.randrange(self.days * 24 * 60 * 60))
+
+    def create_services(self, count):
+        services = Service.objects.bulk_create(
+            Service(
+                name=f"{SERVICE_NAMES[i % len(SERVICE_NAMES)]} {i + 1}",
+                description="Синтетическая услуга для нагрузочного теста",
+                price=Decimal(self.random.randrange(300, 5000, 50)),
+                duration=self.random.choice((15, 30, 45, 60, 90)),
+                is_popular=self.random.random() < 0.2,
+            )
+            for i in range(count)
+        )
+        self.stdout.write(f"Услуг: {len(services)}")
+        return services
+
+    def create_masters(self, count, services):
+        masters = Master.objects.bulk_create(
+            Master(
+                name=f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)} #{i + 1}",
+                phone=f"+7 900 {i:03d}-00-00",
+                experience=self.random.randrange(0, 25),
+            )
+            for i in range(count)
+        )
+        Through = Master.services.through
+        Through.objects.bulk_create(
+            Through(master_id=master.pk, service_id=service.pk)
+            for master in masters
+            for service in self.random.sample(services, k=max(1, len(services) // 2))
+        )
+        self.stdout.write(f"Мастеров: {len(masters)}")
+        return masters
+
+    def create_orders(self, count, customers, masters, services):
+        Through = Order.services.through
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        phones = [f"+7 (9{i // 10_000_000 % 100:02d}) {i // 10_000 % 1000:03d}-{i // 100 % 100:02d}-{i % 100:02d}" for i in range(customers)]
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            orders, chosen = [], []
+            for _ in range(size):
+                order_services = self.random.sample(services, k=self.random.randint(1, 3))
+                date_created = self.random_date()
+                phone = self.random.choice(phones)
+                orders.append(
+                    Order(
+                            name=f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+                        phone=phone,
+                        phone_normalized=normalize_phone(phone),
+                        comment=self.random.choice(COMMENTS) or None,
+                        status=self.random.choices(statuses, weights=(1, 2, 6, 1))[0],
+                        date_created=date_created,
+                        date_updated=date_created,
+                        master=self.random.choice(masters) if masters else None,
+                        appointment_date=date_created + timedelta(days=self.random.randint(0, 14)),
+                        total_price=sum(service.price for service in order_services),
+                    )
+                )
+                chosen.append(order_services)
+            with transaction.atomic():
+                orders = bulk_create_with_dates(Order, orders)
+                Through.objects.bulk_create(
+                    Through(order_id=order.pk, service_id=service.pk)
+                    for order, order_services in zip(orders, chosen)
+                    for service in order_services
+                )
+            created += size
+            self.stdout.write(f"Заявок: {created}/{count}")
+
+    def create_reviews(self, count, masters):
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            with transaction.atomic():
+                bulk_create_with_dates(
+                    Review,
+                    [
+                        Review(
+                            name=f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+                            text=self.random.choice(REVIEW_TEXTS),
+                            rating=self.random.choices((1, 2, 3, 4, 5), weights=(1, 1, 2, 5, 10))[0],
+                            date_created=self.random_date(),
+                            is_published=self.random.random() < 0.9,
+                            master=self.random.choice(masters) if masters else None,
+                        )
+                        for _ in range(size)
+                    ],
+                )
+            created += size
+        self.stdout.write(f"Отзывов: {created}")
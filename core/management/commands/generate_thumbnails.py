@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core.models import Master, Service
+from core.thumbnails import IMAGE_FIELDS, refresh_thumbnails
+
+MODELS = {"master": Master, "service": Service}
+
+
+def _refresh(model_name, pk, force):
+    # Выполняется в процессе пула: файл читается и пережимается там же,
+    # между процессами передаются только id
+    return refresh_thumbnails(apps.get_model("core", model_name), pk, force=force)
+
+
+class Command(BaseCommand):
+    help = "Строит миниатюры AVIF/WebP для уже загруженных фото мастеров и изображений услуг (параллельно)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=sorted(MODELS), action="append", help="Только эти модели")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Процессов для кодирования (1 - в этом процессе)"
+        )
+        parser.add_argument("--force", action="store_true", help="Пережать варианты, даже если они уже есть")
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="Сколько id читать из базы и держать в работе за раз"
+        )
+
+    def handle(self, *args, **options):
+        self.force = options["force"]
+        self.done = self.total = 0
+        batch_size = max(1, options["batch_size"])
+        workers = max(1, options["workers"])
+        tasks = self._tasks(options["model"] or sorted(MODELS), batch_size)
+
+        if workers == 1:
+            for model_name, pk in tasks:
+                self._finish(model_name, pk, lambda: _refresh(model_name, pk, self.force))
+        else:
+            # spawn: дочерние процессы не наследуют открытые соединения с базой
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+                pending = {}
+                for model_name, pk in tasks:
+                    pending[pool.submit(_refresh, model_name, pk, self.force)] = (model_name, pk)
+                    # В работе не больше batch_size изображений - память не растет с каталогом
+                    if len(pending) >= batch_size:
+                        self._collect(pending, FIRST_COMPLETED)
+                self._collect(pending)
+        self.stdout.write(self.style.SUCCESS(f"Миниатюры готовы: {self.done} из {self.total}"))
+
+    def _tasks(self, model_names, batch_size):
+        """
+        (модель, id) всех изображений пачками по id: между пачками курсор
+        не держится открытым, пока процессы пула пишут в базу.
+        """
+        for name in model_names:
+            model = MODELS[name]
+            field = IMAGE_FIELDS[model.__name__][0]
+            queryset = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).order_by("pk")
+            last_pk = 0
+            while True:
+                pks = list(queryset.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+                if not pks:
+                    break
+                for pk in pks:
+                    self.total += 1
+                    yield model.__name__, pk
+                last_pk = pks[-1]
+
+    def _collect(self, pending, return_when="ALL_COMPLETED"):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            model_name, pk = pending.pop(future)
+            self._finish(model_name, pk, future.result)
+
+    def _finish(self, model_name, pk, result):
+        try:
+            result()
+        except Exception as error:
+            self.stderr.write(f"{model_name} #{pk}: {error}")
+            return
+        self.done += 1
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import OrderImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Импортирует заявки из CSV или JSONL пачками (bulk_create) с проверкой по правилам OrderForm"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл .csv или .jsonl")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="По умолчанию - по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            metavar="PATH",
+            help="Файл с номером последней записанной строки; при повторном запуске импорт продолжится с нее",
+        )
+        parser.add_argument("--errors", metavar="PATH", help="Куда записать ошибки строк (JSONL)")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+        file_format = options["format"] or detect_format(path)
+
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        start_after = int(checkpoint.read_text()) if checkpoint and checkpoint.exists() else 0
+
+        def save_checkpoint(line_number):
+            if checkpoint is not None:
+                checkpoint.write_text(str(line_number))
+            self.stdout.write(f"Записано заявок: {importer.imported} (строка {line_number})")
+
+        importer = OrderImporter(batch_size=options["batch_size"], on_flush=save_checkpoint)
+        with path.open(encoding="utf-8", newline="") as stream:
+            for line_number, row in read_rows(stream, file_format):
+                if line_number <= start_after:
+                    continue
+                importer.add(line_number, row)
+            importer.flush()
+
+        if importer.errors:
+            if options["errors"]:
+                with open(options["errors"], "w", encoding="utf-8") as report:
+                    for line_number, errors in importer.errors:
+                        report.write(json.dumps({"line": line_number, "errors": errors}, ensure_ascii=False) + "\n")
+            else:
+                for line_number, errors in importer.errors[:20]:
+                    self.stderr.write(f"Строка {line_number}: {errors}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Импортировано: {importer.imported}, отклонено строк: {len(importer.errors)}")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитывает статистику выручки по клиентам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Сколько клиентов пересчитывать за раз")
+
+    def handle(self, *args, **options):
+        rebuild_customer_stats(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Статистика клиентов пересчитана"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Order
+from core.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс заявок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Алиас базы данных")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Размер пачки вставки")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        backend = get_search_backend(using)
+        orders = (
+            Order.objects.using(using)
+            .only("id", "name", "phone", "comment")
+            .iterator(chunk_size=options["batch_size"])
+        )
+        backend.rebuild(orders, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import reconcile_master_ratings
+
+
+class Command(BaseCommand):
+    help = "Сверяет рейтинг мастеров с отзывами и исправляет расхождения (запускать по расписанию)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Размер пачки")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_master_ratings(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Исправлено мастеров: {fixed}"))
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Догоняет сводки выручки и загрузки: пересчитывает дни, где заявки менялись "
+        "после последнего пересчета (запускать по расписанию)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since-days", type=int,
+            help="Проверять заявки, измененные за последние N дней (по умолчанию ROLLUP_CATCH_UP_DAYS)",
+        )
+        parser.add_argument("--all", action="store_true", help="Проверить всю историю заявок")
+        parser.add_argument("--day", action="append", default=[], help="Пересчитать этот день (ГГГГ-ММ-ДД)")
+        parser.add_argument("--rebuild", action="store_true", help="Пересчитать все дни заново")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            days = rollups.rebuild(on_range=lambda first, last: self.stdout.write(f"{first} - {last}"))
+            self.stdout.write(self.style.SUCCESS(f"Сводки перестроены, дней: {days}"))
+            return
+
+        if options["day"]:
+            days = [parse_date(value) for value in options["day"]]
+            if None in days:
+                raise CommandError("Дата должна быть в формате ГГГГ-ММ-ДД")
+            rollups.refresh_days(days)
+            self.stdout.write(self.style.SUCCESS(f"Пересчитано дней: {len(set(days))}"))
+            return
+
+        since = None
+        if not options["all"]:
+            since_days = options["since_days"] if options["since_days"] is not None else rollups.catch_up_days()
+            since = timezone.now() - timedelta(days=since_days)
+        days = rollups.catch_up(since)
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано устаревших дней: {days}"))
@@ -0,0 +1,79 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых задач: берет задачи из базы и выполняет их в нескольких потоках"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Задач одновременно в этом воркере")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Пауза, когда задач нет (секунды)")
+        parser.add_argument("--task", action="append", dest="names", help="Выполнять только задачи с этим именем")
+        parser.add_argument("--once", action="store_true", help="Выполнить готовые задачи и завершиться")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = max(1, options["concurrency"])
+        stop = threading.Event()
+        in_flight = set()
+        lock = threading.Lock()
+        done = failed = 0
+
+        def shutdown(signum, frame):
+            self.stdout.write("Остановка: дожидаемся текущих задач")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        def execute(job):
+            nonlocal done, failed
+            close_old_connections()
+            ok = False
+            try:
+                ok = jobs.run(job)
+            except Exception as error:
+                # Ошибки самой задачи jobs.run записывает сам; сюда доходят сбои базы.
+                # Задача останется в running и вернется в очередь через release_stale
+                self.stderr.write(f"Задача {job.name} #{job.pk}: {error!r}")
+            finally:
+                close_old_connections()
+                with lock:
+                    in_flight.discard(job.pk)
+                    done += ok
+                    failed += not ok
+
+        self.stdout.write(f"Воркер {worker_id}, потоков: {concurrency}")
+        last_release = 0.0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job") as pool:
+            while not stop.is_set():
+                if time.monotonic() - last_release > 60:
+                    released = jobs.release_stale()
+                    if released:
+                        self.stdout.write(f"Возвращено в очередь зависших задач: {released}")
+                    last_release = time.monotonic()
+
+                with lock:
+                    free = concurrency - len(in_flight)
+                claimed = jobs.claim(worker_id, free, names=options["names"])
+                for job in claimed:
+                    with lock:
+                        in_flight.add(job.pk)
+                    pool.submit(execute, job)
+
+                if not claimed:
+                    with lock:
+                        idle = not in_flight
+                    if options["once"] and idle:
+                        break
+                    stop.wait(options["poll_interval"] if idle or not free else 0.05)
+        self.stdout.write(self.style.SUCCESS(f"Выполнено: {done}, с ошибкой: {failed}"))
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную SQLite-базу в файлы реплик (DATABASE_REPLICAS) через backup API. "
+        "С --interval работает постоянно и имитирует задержку репликации"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Повторять каждые N секунд")
+
+    def handle(self, *args, **options):
+        primary = connections["default"].settings_dict
+        if connections["default"].vendor != "sqlite":
+            raise CommandError("Команда нужна только для локальных реплик на SQLite")
+        targets = []
+        for alias in settings.DATABASE_REPLICAS:
+            # NAME реплики - file:<путь>?mode=ro
+            path = urlsplit(str(connections[alias].settings_dict["NAME"])).path
+            if path != str(primary["NAME"]):
+                targets.append(path)
+        if not targets:
+            raise CommandError("Нет реплик в отдельных файлах - задайте DATABASE_REPLICAS")
+
+        while True:
+            source = sqlite3.connect(primary["NAME"])
+            try:
+                for path in targets:
+                    target = sqlite3.connect(path)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(f"Реплики обновлены: {', '.join(targets)}")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
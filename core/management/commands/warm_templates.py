@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.templating import precompile
+
+
+class Command(BaseCommand):
+    help = (
+        "Компилирует все шаблоны и связывает include/extends, как при старте воркера "
+        "с TEMPLATE_PRECOMPILE. Проверка шаблонов перед выкладкой"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Только эти шаблоны (по умолчанию - все)")
+        parser.add_argument(
+            "--strict", action="store_true", help="Завершиться с ошибкой, если не компилируется шаблон проекта"
+        )
+
+    def handle(self, *args, **options):
+        summary = precompile(options["names"] or None)
+        for name, error in sorted(summary["errors"].items()):
+            # Текст ошибки бывает многострочным (список доступных библиотек тегов)
+            self.stderr.write(f"{name}: {error.splitlines()[0] if error else ''}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Шаблонов: {summary['templates']}, связано include/extends: {summary['linked_includes']}, "
+                f"ошибок: {len(summary['errors'])}, {summary['ms']} мс"
+            )
+        )
+        # Шаблоны сторонних приложений для неустановленных пакетов (jazzmin и т.п.) не в счет
+        project_dirs = [Path(directory) for config in settings.TEMPLATES for directory in config.get("DIRS", [])]
+        broken = [name for name in summary["errors"] if any((directory / name).exists() for directory in project_dirs)]
+        if options["strict"] and broken:
+            raise CommandError(f"Шаблоны проекта с ошибками: {', '.join(sorted(broken))}")
@@ -0,0 +1,244 @@
+# core/metrics.py
+"""
+Метрики запросов для продакшена: число SQL-запросов, время в базе,
+время рендеринга шаблонов и общее время ответа по каждому view.
+
+Middleware пишет одну структурированную строку в лог на запрос (логгер
+core.metrics) и копит гистограммы в памяти процесса. Посмотреть их можно
+по адресу metrics/ (только для персонала).
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger("core.metrics")
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Числа и строки в SQL заменяем на ?, чтобы одинаковые запросы с разными
+# параметрами считались одним шаблоном
+_SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# Метрики текущего запроса (ContextVar работает и в потоках, и в async)
+_current = ContextVar("request_metrics", default=None)
+
+
+def _bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return str(bound)
+    return "inf"
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка для connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.sql[_SQL_LITERAL_RE.sub("?", sql)] += 1
+
+    def duplicates(self, threshold):
+        """Шаблоны SQL, повторившиеся не меньше threshold раз - похоже на N+1."""
+        return {sql: count for sql, count in self.sql.items() if count >= threshold}
+
+
+class MetricsRegistry:
+    """
+    Накопленные метрики по view в памяти процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._counters = Counter()
+
+    def increment(self, name, value=1):
+        """Счетчик событий (например, отказов ограничителя частоты)."""
+        with self._lock:
+            self._counters[name] += value
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def record(self, view, latency_ms, metrics, n_plus_one):
+        with self._lock:
+            stats = self._views.setdefault(
+                view,
+                {
+                    "requests": 0,
+                    "n_plus_one": 0,
+                    "total_ms": 0.0,
+                    "db_ms": 0.0,
+                    "template_ms": 0.0,
+                    "queries": 0,
+                    "latency_ms": Counter(),
+                    "queries_hist": Counter(),
+                },
+            )
+            stats["requests"] += 1
+            stats["n_plus_one"] += int(n_plus_one)
+            stats["total_ms"] += latency_ms
+            stats["db_ms"] += metrics.db_time * 1000
+            stats["template_ms"] += metrics.template_time * 1000
+            stats["queries"] += metrics.queries
+            stats["latency_ms"][_bucket(latency_ms, LATENCY_BUCKETS_MS)] += 1
+            stats["queries_hist"][_bucket(metrics.queries, QUERY_BUCKETS)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for view, stats in self._views.items():
+                requests = stats["requests"]
+                result[view] = {
+                    "requests": requests,
+                    "n_plus_one": stats["n_plus_one"],
+                    "avg_ms": round(stats["total_ms"] / requests, 2),
+                    "avg_db_ms": round(stats["db_ms"] / requests, 2),
+                    "avg_template_ms": round(stats["template_ms"] / requests, 2),
+                    "avg_queries": round(stats["queries"] / requests, 2),
+                    "latency_ms": dict(stats["latency_ms"]),
+                    "queries": dict(stats["queries_hist"]),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._counters.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@receiver(connection_created, dispatch_uid="core.metrics")
+def _install_query_recorder(connection, **kwargs):
+    """
+    Постоянная обертка запросов на соединении. Соединения с базой привязаны
+    к потоку, а async-view ходят в базу из потока sync_to_async - поэтому
+    метрики ищем не в соединении, а в ContextVar текущего запроса.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install_template_timer():
+    """
+    Оборачивает рендеринг шаблона бэкенда Django один раз на процесс.
+    include внутри шаблона идут мимо этой обертки - считается только
+    верхнеуровневый render(), без двойного учета.
+    """
+    if getattr(DjangoTemplate.render, "_metrics_wrapped", False):
+        return
+    original_render = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original_render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+    render._metrics_wrapped = True
+    DjangoTemplate.render = render
+
+
+class QueryMetricsMiddleware:
+    """
+    Подключается первым в MIDDLEWARE, чтобы общее время включало остальные middleware.
+    Работает и под WSGI, и под ASGI без переключения в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, "METRICS_DUPLICATE_QUERY_THRESHOLD", 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        _install_template_timer()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Соединения, открытые до подключения сигнала
+        for alias in settings.DATABASES:
+            _install_query_recorder(connections[alias])
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics, (time.perf_counter() - start) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, metrics, (time.perf_counter() - start) * 1000)
+        return response
+
+    def _finish(self, request, response, metrics, latency_ms):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        duplicates = metrics.duplicates(self.duplicate_threshold)
+        registry.record(view, latency_ms, metrics, bool(duplicates))
+
+        line = {
+            "view": view,
+            "path": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "ms": round(latency_ms, 2),
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_time * 1000, 2),
+            "template_ms": round(metrics.template_time * 1000, 2),
+        }
+        if duplicates:
+            line["n_plus_one"] = duplicates
+            logger.warning(json.dumps(line, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(line, ensure_ascii=False))
+
@@ -0,0 +1,54 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, migrations
+
+# DDL зафиксирован здесь, а не берется из core.search: миграция не должна
+# меняться вместе с кодом приложения. Индекс по уже существующим заявкам
+# заполняет команда rebuild_search_index.
+TABLES = {
+    "core_order_search": "tokenize='unicode61 remove_diacritics 2'",
+    "core_order_search_trigram": "tokenize='trigram'",
+}
+
+
+def check_trigram_tokenizer(schema_editor):
+    """
+    Токенизатор trigram есть только в SQLite 3.34+, собранном с FTS5. Без проверки
+    миграция падала бы с малопонятным "no such module" / "no such tokenizer".
+    """
+    try:
+        schema_editor.execute("CREATE VIRTUAL TABLE temp.core_trigram_check USING fts5(value, tokenize='trigram')")
+        schema_editor.execute("DROP TABLE temp.core_trigram_check")
+    except OperationalError as error:
+        version = schema_editor.connection.Database.sqlite_version
+        raise ImproperlyConfigured(
+            f"Поиску по заявкам нужен SQLite 3.34+ с FTS5 и токенизатором trigram "
+            f"(установлен SQLite {version}: {error})"
+        ) from error
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    check_trigram_tokenizer(schema_editor)
+    for table, tokenizer in TABLES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(name, phone, comment, {tokenizer})"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in TABLES:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_order_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_order_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16, verbose_name='Телефон (E.164)'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_normalized', 'status'], name='order_phone_status_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_order_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_normalized', models.CharField(max_length=16, unique=True, verbose_name='Телефон (E.164)')),
+                ('completed_orders', models.PositiveIntegerField(default=0, verbose_name='Завершенных заявок')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика клиента',
+                'verbose_name_plural': 'Статистика клиентов',
+            },
+        ),
+    ]
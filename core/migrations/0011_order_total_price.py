@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:42
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model("core", "Order")
+    Service = apps.get_model("core", "Service")
+    using = schema_editor.connection.alias
+    services_sum = (
+        Service.objects.using(using)
+        .filter(orders=OuterRef("pk"))
+        .values("orders")
+        .annotate(total=Sum("price"))
+        .values("total")
+    )
+    Order.objects.using(using).update(
+        total_price=Coalesce(Subquery(services_sum), Value(0), output_field=DecimalField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_customer_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Общая стоимость'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['total_price'], name='order_total_price_idx'),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_order_total_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['master', 'appointment_date'], name='order_master_appointment_idx'),
+        ),
+    ]
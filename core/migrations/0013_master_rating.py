@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, DecimalField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_master_ratings(apps, schema_editor):
+    Master = apps.get_model("core", "Master")
+    Review = apps.get_model("core", "Review")
+    using = schema_editor.connection.alias
+    published = Review.objects.using(using).filter(master=OuterRef("pk"), is_published=True).values("master")
+    Master.objects.using(using).update(
+        avg_rating=Coalesce(
+            Subquery(published.annotate(value=Avg("rating")).values("value")), Value(0), output_field=DecimalField()
+        ),
+        review_count=Coalesce(
+            Subquery(published.annotate(value=Count("id")).values("value")), Value(0), output_field=IntegerField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_order_master_appointment_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество отзывов'),
+        ),
+        migrations.AddIndex(
+            model_name='master',
+            index=models.Index(fields=['-avg_rating', '-review_count'], name='master_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['master', 'is_published'], name='review_master_published_idx'),
+        ),
+        migrations.RunPython(fill_master_ratings, migrations.RunPython.noop),
+    ]
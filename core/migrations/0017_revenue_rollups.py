@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_order_submission_guards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMasterRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заявок')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Завершенных')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, verbose_name='Занято минут')),
+            ],
+            options={
+                'verbose_name': 'Выручка мастера за день',
+                'verbose_name_plural': 'Выручка мастеров по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='День')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заявок')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Завершенных')),
+                ('canceled_count', models.PositiveIntegerField(default=0, verbose_name='Отмененных')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, verbose_name='Занято минут')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Выручка за день',
+                'verbose_name_plural': 'Выручка и загрузка',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyServiceRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заявок')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Завершенных')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Выручка услуги за день',
+                'verbose_name_plural': 'Выручка услуг по дням',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['appointment_date'], name='order_appointment_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailymasterrevenue',
+            name='master',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.master', verbose_name='Мастер'),
+        ),
+        migrations.AddField(
+            model_name='dailyservicerevenue',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.service', verbose_name='Услуга'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailymasterrevenue',
+            constraint=models.UniqueConstraint(fields=('day', 'master'), name='daily_master_revenue_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyservicerevenue',
+            constraint=models.UniqueConstraint(fields=('day', 'service'), name='daily_service_revenue_unique'),
+        ),
+    ]
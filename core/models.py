@@ -1,5 +1,7 @@
 from django.db import models
 
+from .phone import normalize_phone
+
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -11,6 +13,7 @@ class Order(models.Model):
 
     name = models.CharField(max_length=100, verbose_name="Имя")
     phone = models.CharField(max_length=20, verbose_name="Телефон")
+    phone_normalized = models.CharField(max_length=16, blank=True, default="", editable=False, verbose_name="Телефон (E.164)")
     comment = models.CharField(max_length=500, null=True, blank=True, verbose_name='Комментарий')
     status = models.CharField(choices=STATUS_CHOICES, default="new", max_length=20, verbose_name="Статус")
     date_created = models.DateTimeField(auto_now_add=True, null=True, blank=True, verbose_name="Дата создания")
@@ -18,12 +21,79 @@ class Order(models.Model):
     master = models.ForeignKey("Master", on_delete=models.SET_NULL, null=True, verbose_name="Мастер")
     appointment_date = models.DateTimeField(null=True, blank=True, verbose_name="Дата записи")
     services = models.ManyToManyField("Service", verbose_name="Услуги", default=None, related_name="orders")
+    # Сумма цен услуг, поддерживается сигналами (см. core/stats.py)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Общая стоимость")
+    # Поля, прежние значения которых нужны сигналам (см. core/signals.py)
+    TRACKED_FIELDS = ("phone_normalized", "status", "appointment_date")
+
     def __str__(self):
         return f"{self.name} - {self.phone}"
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+
+    def _remember_state(self, fields=None):
+        """
+        Запоминает значения TRACKED_FIELDS, какими они записаны в базе.
+        Отложенные (only/defer) поля не запоминаются.
+        """
+        state = self.__dict__.setdefault("_saved_state", {})
+        for name in self.TRACKED_FIELDS:
+            if (fields is None or name in fields) and name in self.__dict__:
+                state[name] = self.__dict__[name]
+
+    def saved_state(self):
+        """
+        (phone_normalized, status, appointment_date) на момент загрузки или
+        последнего сохранения. None, если что-то из них не загружалось.
+        """
+        state = self.__dict__.get("_saved_state", {})
+        if len(state) < len(self.TRACKED_FIELDS):
+            return None
+        return tuple(state[name] for name in self.TRACKED_FIELDS)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_state(fields)
+
+    def save(self, *args, **kwargs):
+        # Канонический номер пересчитываем при каждом сохранении телефона
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_normalized"}
+        elif update_fields is None and not self._state.adding and not args and not kwargs.get("force_insert"):
+            # total_price меняют только сигналы через UPDATE (core/stats.py) - загруженная
+            # раньше заявка не должна затирать его своим устаревшим значением
+            skipped = {"total_price", *self.get_deferred_fields()}
+            kwargs["update_fields"] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+        self._remember_state(kwargs.get("update_fields"))
+
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            # Курсорная пагинация списка заявок (см. core/pagination.py)
+            models.Index(fields=["date_created", "id"], name="order_created_id_idx"),
+            models.Index(fields=["status", "date_created", "id"], name="order_status_created_id_idx"),
+            # Поиск по телефону и выручка по клиенту
+            models.Index(fields=["phone_normalized", "status"], name="order_phone_status_idx"),
+            # Фильтр по сумме заказа в админке
+            models.Index(fields=["total_price"], name="order_total_price_idx"),
+            # Занятость мастера на день (core/availability.py)
+            models.Index(fields=["master", "appointment_date"], name="order_master_appointment_idx"),
+            # Заявки за день для сводок выручки (core/rollups.py)
+            models.Index(fields=["appointment_date"], name="order_appointment_idx"),
+            # Недавно измененные заявки для догоняющего пересчета сводок (rollups.stale_days)
+            models.Index(fields=["date_updated"], name="order_updated_idx"),
+        ]
 
 
 class Master(models.Model):
@@ -36,12 +106,21 @@ class Master(models.Model):
     experience = models.PositiveIntegerField(verbose_name="Опыт работы", blank=True, null=True, default=0)
     is_active = models.BooleanField(default=True, verbose_name="Активен")
     services = models.ManyToManyField("Service", verbose_name="Услуги", default=None, related_name="masters")
+    # Сводка по опубликованным отзывам, поддерживается сигналами (см. core/stats.py)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, verbose_name="Средняя оценка")
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество отзывов")
+    # Уменьшенные копии фото (см. core/thumbnails.py)
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Миниатюры")
     def __str__(self):
         return self.name
     
     class Meta:
         verbose_name = 'Мастер'
         verbose_name_plural = 'Мастера'
+        indexes = [
+            # Сортировка мастеров по рейтингу
+            models.Index(fields=["-avg_rating", "-review_count"], name="master_rating_idx"),
+        ]
 
 
 class Service(models.Model):
@@ -55,6 +134,8 @@ class Service(models.Model):
     image = models.ImageField(
         upload_to="services/", blank=True, verbose_name="Изображение"
     )
+    # Уменьшенные копии изображения (см. core/thumbnails.py)
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Миниатюры")
 
     def __str__(self):
         return self.name
@@ -89,3 +170,154 @@ class Review(models.Model):
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
         ordering = ['-date_created']  # Сортировка от новых к старым
+        indexes = [
+            # Пересчет рейтинга мастера идет только по его опубликованным отзывам
+            models.Index(fields=["master", "is_published"], name="review_master_published_idx"),
+        ]
+
+
+class CustomerStats(models.Model):
+    """
+    Сводная выручка по клиенту (по номеру телефона в формате E.164).
+    Обновляется из сигналов при изменении заявок, см. core/stats.py.
+    """
+    phone_normalized = models.CharField(max_length=16, unique=True, verbose_name="Телефон (E.164)")
+    completed_orders = models.PositiveIntegerField(default=0, verbose_name="Завершенных заявок")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+    date_updated = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f"{self.phone_normalized} - {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Статистика клиента'
+        verbose_name_plural = 'Статистика клиентов'
+
+
+class DailyRevenue(models.Model):
+    """
+    Сводка за день по дате записи: заявки, выручка завершенных, занятые минуты.
+    Пересчитывается по затронутым дням при изменении заявок, см. core/rollups.py.
+    """
+    day = models.DateField(unique=True, verbose_name="День")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заявок")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Завершенных")
+    canceled_count = models.PositiveIntegerField(default=0, verbose_name="Отмененных")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+    booked_minutes = models.PositiveIntegerField(default=0, verbose_name="Занято минут")
+    date_updated = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f"{self.day} - {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Выручка за день'
+        verbose_name_plural = 'Выручка и загрузка'
+
+
+class DailyMasterRevenue(models.Model):
+    """
+    Сводка за день по мастеру. Строка с пустым мастером - заявки без мастера.
+    """
+    day = models.DateField(verbose_name="День")
+    master = models.ForeignKey(Master, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Мастер")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заявок")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Завершенных")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+    booked_minutes = models.PositiveIntegerField(default=0, verbose_name="Занято минут")
+
+    class Meta:
+        verbose_name = 'Выручка мастера за день'
+        verbose_name_plural = 'Выручка мастеров по дням'
+        constraints = [models.UniqueConstraint(fields=["day", "master"], name="daily_master_revenue_unique")]
+
+
+class DailyServiceRevenue(models.Model):
+    """
+    Сводка за день по услуге: в скольких заявках была и сколько принесла.
+    """
+    day = models.DateField(verbose_name="День")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Услуга")
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="Заявок")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Завершенных")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+
+    class Meta:
+        verbose_name = 'Выручка услуги за день'
+        verbose_name_plural = 'Выручка услуг по дням'
+        constraints = [models.UniqueConstraint(fields=["day", "service"], name="daily_service_revenue_unique")]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ отправки формы записи. Уникальность ключа в базе не дает повторному
+    нажатию создать вторую заявку; старые ключи удаляются (см. core/idempotency.py).
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="Ключ")
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Заявка")
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+
+
+class RateLimitBucket(models.Model):
+    """
+    Корзина токенов ограничителя частоты (core/ratelimit.py). Состояние в базе,
+    а не в памяти процесса - лимит общий для всех воркеров.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name="Ключ")
+    tokens = models.FloatField(verbose_name="Токенов")
+    # Время последнего пополнения, секунды Unix
+    updated = models.FloatField(verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = 'Корзина ограничителя'
+        verbose_name_plural = 'Корзины ограничителя'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача. Ставится через core.jobs.enqueue(), выполняется
+    командой run_jobs (см. core/jobs.py).
+    """
+    STATUS_CHOICES = (
+        ("queued", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Выполнена"),
+        ("dead", "Не выполнена"),
+    )
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued", verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(verbose_name="Выполнить после")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Обработчик")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята в работу")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+    date_created = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    date_updated = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Выборка готовых к запуску задач воркером
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
+
+
+class DeadJob(Job):
+    """Задачи, исчерпавшие попытки, - отдельный раздел в админке."""
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Невыполненная задача'
+        verbose_name_plural = 'Невыполненные задачи'
@@ -0,0 +1,171 @@
+# core/pagination.py
+"""
+Курсорная (keyset) пагинация списка заявок.
+
+Вместо OFFSET запоминаем пару (date_created, id) последней показанной заявки
+и на следующей странице просим "всё, что строго после неё". Такой запрос
+начинает чтение индекса (date_created, id) сразу с курсора и не зависит
+от номера страницы.
+
+EstimatedCountPaginator - постраничный вывод админки без полного COUNT(*)
+на каждый запрос (см. ORDER_ADMIN_SCALE_MODE).
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+ORDERS_PER_PAGE = 20
+
+
+def encode_cursor(order):
+    """
+    Упаковывает (date_created, id) заявки в строку для GET-параметра.
+    """
+    date = order.date_created.isoformat() if order.date_created else ""
+    raw = f"{date}|{order.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Распаковывает курсор. Возвращает (date_created | None, id) или None,
+    если курсор пустой или испорчен.
+    """
+    if not cursor:
+        return None
+    try:
+        date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(date) if date else None), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def _phases(queryset, position, descending):
+    """
+    Части выборки после курсора в порядке показа: заявки с датой создания
+    и заявки без нее (старые записи - в конце при убывании и в начале
+    при возрастании, как их сортирует SQLite). Условие по дате - диапазон
+    date_created <= X (>= X): по нему SQLite ищет в индексе (date_created, id)
+    сразу с нужного места, и страница стоит одинаково на любой глубине.
+    """
+    dated = queryset.filter(date_created__isnull=False)
+    undated = queryset.filter(date_created__isnull=True)
+    if descending:
+        dated, undated = dated.order_by("-date_created", "-id"), undated.order_by("-id")
+    else:
+        dated, undated = dated.order_by("date_created", "id"), undated.order_by("id")
+
+    if position is None:
+        return [dated, undated] if descending else [undated, dated]
+    date, pk = position
+    if date is None:
+        # Курсор уже в части без даты
+        if descending:
+            return [undated.filter(id__lt=pk)]
+        return [undated.filter(id__gt=pk), dated]
+    if descending:
+        after = dated.filter(date_created__lte=date).filter(Q(date_created__lt=date) | Q(id__lt=pk))
+        return [after, undated]
+    return [dated.filter(date_created__gte=date).filter(Q(date_created__gt=date) | Q(id__gt=pk))]
+
+
+def _page_key(order):
+    """Порядок заявок по возрастанию, как в _phases: сначала без даты."""
+    date = order.date_created
+    return date is not None, date.timestamp() if date else 0, order.id
+
+
+def _parts(queryset, statuses):
+    """
+    Фильтр по нескольким статусам SQLite может отсортировать только целиком
+    (USE TEMP B-TREE). Каждый статус читается отдельно по индексу
+    (status, date_created, id), страницы сливаются в Python.
+    """
+    if len(statuses) > 1:
+        return [queryset.filter(status=status) for status in statuses]
+    return [queryset]
+
+
+def _merge_page(pages, descending, per_page):
+    if len(pages) == 1:
+        page = pages[0]
+    else:
+        page = sorted((order for page in pages for order in page), key=_page_key, reverse=descending)
+    next_cursor = encode_cursor(page[per_page - 1]) if len(page) > per_page else None
+    return page[:per_page], next_cursor
+
+
+def _read(queryset, position, descending, limit):
+    page = []
+    for phase in _phases(queryset, position, descending):
+        page += phase[: limit - len(page)]
+        if len(page) >= limit:
+            break
+    return page
+
+
+async def _aread(queryset, position, descending, limit):
+    page = []
+    for phase in _phases(queryset, position, descending):
+        page += [order async for order in phase[: limit - len(page)]]
+        if len(page) >= limit:
+            break
+    return page
+
+
+def paginate_orders(queryset, cursor=None, descending=True, per_page=ORDERS_PER_PAGE, statuses=()):
+    """
+    Возвращает (список заявок страницы, курсор следующей страницы | None).
+    statuses - выбранные в фильтре статусы (queryset уже отфильтрован по ним).
+    Число запросов не зависит от глубины: по одному на статус, на границе
+    частей с датой и без - на один больше.
+    """
+    position = decode_cursor(cursor)
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    pages = [_read(part, position, descending, per_page + 1) for part in _parts(queryset, statuses)]
+    return _merge_page(pages, descending, per_page)
+
+
+async def apaginate_orders(queryset, cursor=None, descending=True, per_page=ORDERS_PER_PAGE, statuses=()):
+    """
+    То же, что paginate_orders, через асинхронный ORM.
+    """
+    position = decode_cursor(cursor)
+    pages = [await _aread(part, position, descending, per_page + 1) for part in _parts(queryset, statuses)]
+    return _merge_page(pages, descending, per_page)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц. Число строк без фильтров берется из кэша
+    (на PostgreSQL - из оценки планировщика), с фильтрами - считается
+    не дальше ADMIN_COUNT_LIMIT: страницы за этим пределом не показываются.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            key = f"admin-count:{queryset.db}:{queryset.model._meta.label_lower}"
+            return cache.get_or_set(key, lambda: self._table_count(queryset), settings.ADMIN_COUNT_CACHE_TIMEOUT)
+        # Подзапрос с LIMIT останавливается на пределе, а не проходит все совпадения
+        return queryset.order_by()[: settings.ADMIN_COUNT_LIMIT].count()
+
+    @staticmethod
+    def _table_count(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # -1 или 0 - таблицу еще не анализировали
+            if row and row[0] > 0:
+                return int(row[0])
+        return queryset.count()
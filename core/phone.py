@@ -0,0 +1,34 @@
+# core/phone.py
+"""
+Приведение телефонов к формату E.164 (+79991234567).
+
+Клиенты вводят номер как угодно: "+7 (999) 123-45-67", "8 999 123 45 67",
+"9991234567". Для поиска и подсчета выручки нужен один канонический вид.
+"""
+import re
+
+# Код страны по умолчанию - номера без кода считаем российскими
+DEFAULT_COUNTRY_CODE = "7"
+
+
+def normalize_phone(raw):
+    """
+    Возвращает номер в формате E.164 или пустую строку, если номер
+    не удается распознать.
+    """
+    if not raw:
+        return ""
+    number = re.sub(r"\D", "", raw)
+    has_plus = raw.strip().startswith("+")
+
+    if not has_plus:
+        # Российские форматы: 8XXXXXXXXXX и XXXXXXXXXX
+        if len(number) == 11 and number[0] == "8":
+            number = DEFAULT_COUNTRY_CODE + number[1:]
+        elif len(number) == 10:
+            number = DEFAULT_COUNTRY_CODE + number
+
+    # E.164: не более 15 цифр; короче 11 цифр номер неполный
+    if not 11 <= len(number) <= 15:
+        return ""
+    return "+" + number
@@ -0,0 +1,101 @@
+# core/ratelimit.py
+"""
+Ограничитель частоты отправки заявок - корзина токенов (token bucket).
+
+Корзина вмещает capacity токенов и пополняется со скоростью rate токенов
+в секунду. Каждая заявка забирает токен; нет токена - отказ. Пополнение
+и списание выполняются одним UPDATE с условием, поэтому лимит точен
+при любом числе процессов, работающих с одной базой.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Least
+
+from .metrics import registry as metrics_registry
+from .models import RateLimitBucket
+from .phone import normalize_phone
+
+# Вид ключа -> (емкость, пополнение в секунду)
+DEFAULT_ORDER_RATE_LIMITS = {
+    "ip": (5, 1 / 300),
+    "phone": (3, 1 / 600),
+}
+
+
+def take(key, capacity, rate, now=None, using="default"):
+    """Забирает токен из корзины key. Возвращает True, если токен был."""
+    now = time.time() if now is None else now
+    refilled = Least(
+        Value(float(capacity), output_field=FloatField()),
+        F("tokens") + (Value(now, output_field=FloatField()) - F("updated")) * Value(rate, output_field=FloatField()),
+    )
+    buckets = RateLimitBucket.objects.using(using).filter(key=key)
+    for _ in range(2):
+        if buckets.alias(refilled=refilled).filter(refilled__gte=1).update(tokens=refilled - 1, updated=now):
+            return True
+        if buckets.exists():
+            return False
+        # Корзины еще нет - создаем полную и повторяем UPDATE. Если ее одновременно
+        # создал другой процесс, вставка пропускается
+        RateLimitBucket.objects.using(using).bulk_create(
+            [RateLimitBucket(key=key, tokens=capacity, updated=now)], ignore_conflicts=True
+        )
+    return False
+
+
+def refund(key, capacity, using="default"):
+    """Возвращает токен в корзину key (не больше емкости)."""
+    RateLimitBucket.objects.using(using).filter(key=key).update(
+        tokens=Least(Value(float(capacity), output_field=FloatField()), F("tokens") + 1)
+    )
+
+
+def order_limits():
+    return getattr(settings, "ORDER_RATE_LIMITS", DEFAULT_ORDER_RATE_LIMITS)
+
+
+def client_ip(request):
+    # За обратным прокси адрес клиента берем из X-Forwarded-For (последний добавленный прокси)
+    if getattr(settings, "RATE_LIMIT_TRUST_FORWARDED_FOR", False):
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def order_rate_keys(request):
+    """Ключи корзин для отправки заявки: адрес клиента и нормализованный телефон."""
+    keys = {"ip": f"order:ip:{client_ip(request)}"}
+    phone = normalize_phone(request.POST.get("phone", ""))
+    if phone:
+        keys["phone"] = f"order:phone:{phone}"
+    return keys
+
+
+def allow_order(request):
+    """
+    Проверяет все лимиты заявки. Токен списывается из каждой корзины,
+    даже если отказала предыдущая: бот не должен получать "бесплатные" попытки.
+    """
+    limits = order_limits()
+    allowed = True
+    for kind, key in order_rate_keys(request).items():
+        capacity, rate = limits[kind]
+        if not take(key, capacity, rate):
+            metrics_registry.increment(f"order_rate_limited_{kind}")
+            allowed = False
+    metrics_registry.increment("order_allowed" if allowed else "order_rate_limited")
+    return allowed
+
+
+def refund_order(request):
+    """
+    Возвращает токен телефона за заявку, не прошедшую проверку формы: клиент,
+    исправляющий ошибки или выбирающий другое время, не упирается в лимит.
+    Токен адреса остается списанным - иначе бот слал бы неверные формы бесплатно.
+    """
+    keys = order_rate_keys(request)
+    if "phone" in keys:
+        refund(keys["phone"], order_limits()["phone"][0])
@@ -0,0 +1,360 @@
+# core/rollups.py
+"""
+Сводки выручки и загрузки мастеров по дням (DailyRevenue, DailyMasterRevenue,
+DailyServiceRevenue) для панели владельцев в админке.
+
+День заявки - дата записи (appointment_date) в текущем часовом поясе. Выручка -
+сумма завершенных заявок, загрузка - минуты услуг всех неотмененных заявок
+мастера против длительности рабочего дня.
+
+Сводка дня целиком пересчитывается из заявок этого дня: это дешево (заявок
+за день немного) и не накапливает ошибок, как сдвиги на разницу. Изменения
+заявок внутри транзакции (запись клиента, сохранение в админке) копят
+затронутые дни в одной фоновой задаче rollups.refresh_days на транзакцию;
+вне транзакции несколько дней пересчитываются сразу. Команда refresh_rollups
+догоняет пропущенное и перестраивает сводки целиком.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .availability import DEFAULT_DURATION
+from .models import DailyMasterRevenue, DailyRevenue, DailyServiceRevenue, Job, Order
+
+# Период, который берется за один проход пересчета
+RANGE_CHUNK_DAYS = 31
+
+
+def catch_up_days():
+    """За сколько последних дней изменений заявок проверяет сводки refresh_rollups по умолчанию."""
+    return getattr(settings, "ROLLUP_CATCH_UP_DAYS", 2)
+
+
+def inline_days_limit():
+    """Сколько дней вне транзакции пересчитывать сразу; больше - в фоновой задаче."""
+    return getattr(settings, "ROLLUP_INLINE_DAYS", 7)
+
+
+def working_minutes():
+    """Длительность рабочего дня мастера в минутах."""
+    return (settings.BARBERSHOP_CLOSING_HOUR - settings.BARBERSHOP_OPENING_HOUR) * 60
+
+
+def local_day(value):
+    return timezone.localtime(value).date() if value else None
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _contiguous_ranges(days):
+    """Разбивает множество дней на непрерывные отрезки не длиннее RANGE_CHUNK_DAYS."""
+    ranges = []
+    for day in sorted(days):
+        if ranges and day - ranges[-1][1] == timedelta(days=1) and (day - ranges[-1][0]).days < RANGE_CHUNK_DAYS:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def refresh_range(first_day, last_day, using="default"):
+    """
+    Пересчитывает сводки за дни с first_day по last_day включительно:
+    два запроса на чтение (заявки и их услуги) и замена строк сводок.
+    """
+    start, end = _day_start(first_day), _day_start(last_day + timedelta(days=1))
+    orders = {
+        pk: (local_day(appointment), master_id, status, total_price)
+        for pk, appointment, master_id, status, total_price in Order.objects.using(using)
+        .filter(appointment_date__gte=start, appointment_date__lt=end)
+        .values_list("pk", "appointment_date", "master_id", "status", "total_price")
+    }
+    order_services = defaultdict(list)
+    for order_id, service_id, price, duration in (
+        Order.services.through.objects.using(using)
+        .filter(order__appointment_date__gte=start, order__appointment_date__lt=end)
+        .values_list("order_id", "service_id", "service__price", "service__duration")
+    ):
+        order_services[order_id].append((service_id, price, duration))
+
+    def row():
+        return {"orders_count": 0, "completed_count": 0, "revenue": Decimal("0"), "booked_minutes": 0}
+
+    days, masters, services = defaultdict(row), defaultdict(row), defaultdict(row)
+    canceled = defaultdict(int)
+    for pk, (day, master_id, status, total_price) in orders.items():
+        if status == "canceled":
+            canceled[day] += 1
+            continue
+        services_ = order_services.get(pk, [])
+        minutes = sum(duration for _, _, duration in services_) or DEFAULT_DURATION
+        completed = status == "completed"
+        for totals in (days[day], masters[day, master_id]):
+            totals["orders_count"] += 1
+            totals["booked_minutes"] += minutes
+            if completed:
+                totals["completed_count"] += 1
+                totals["revenue"] += total_price
+        for service_id, price, _ in services_:
+            totals = services[day, service_id]
+            totals["orders_count"] += 1
+            if completed:
+                totals["completed_count"] += 1
+                totals["revenue"] += price
+
+    with transaction.atomic(using=using):
+        # Строки дней пишутся первыми: upsert блокирует их, и параллельный пересчет
+        # тех же дней ждет коммита, прежде чем трогать сводки мастеров и услуг
+        _write_rows(
+            DailyRevenue,
+            [
+                DailyRevenue(day=day, canceled_count=canceled[day], **days.get(day, row()))
+                for day in sorted(set(days) | set(canceled))
+            ],
+            ["day"], first_day, last_day, using,
+        )
+        _write_rows(
+            DailyMasterRevenue,
+            [DailyMasterRevenue(day=day, master_id=master_id, **totals) for (day, master_id), totals in masters.items()],
+            ["day", "master"], first_day, last_day, using,
+        )
+        _write_rows(
+            DailyServiceRevenue,
+            [
+                DailyServiceRevenue(
+                    day=day,
+                    service_id=service_id,
+                    orders_count=totals["orders_count"],
+                    completed_count=totals["completed_count"],
+                    revenue=totals["revenue"],
+                )
+                for (day, service_id), totals in services.items()
+            ],
+            ["day", "service"], first_day, last_day, using,
+        )
+    return len(orders)
+
+
+def refresh_days(days, using="default"):
+    """Пересчитывает сводки перечисленных дней (пустые значения пропускаются)."""
+    for first_day, last_day in _contiguous_ranges({day for day in days if day}):
+        refresh_range(first_day, last_day, using=using)
+
+
+def _write_rows(model, rows, unique_fields, first_day, last_day, using):
+    """
+    Записывает строки сводки за период upsert-ом по unique_fields (без окна
+    между DELETE и INSERT, где параллельный пересчет получил бы IntegrityError)
+    и удаляет строки периода, которых среди новых нет. Строки без мастера
+    уникальным индексом не ловятся (NULL != NULL) - их заменяем удалением и вставкой.
+    """
+    attnames = [model._meta.get_field(name).attname for name in unique_fields]
+
+    def key(obj):
+        return tuple(getattr(obj, attname) for attname in attnames)
+
+    keys = {key(obj) for obj in rows}
+    stale = [
+        pk
+        for pk, *values in model.objects.using(using)
+        .filter(day__gte=first_day, day__lte=last_day)
+        .values_list("pk", *attnames)
+        if tuple(values) not in keys or None in values
+    ]
+    if stale:
+        model.objects.using(using).filter(pk__in=stale).delete()
+    update_fields = [
+        field.name for field in model._meta.concrete_fields if not field.primary_key and field.name not in unique_fields
+    ]
+    keyed = [obj for obj in rows if None not in key(obj)]
+    if keyed:
+        model.objects.using(using).bulk_create(
+            keyed, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields
+        )
+    model.objects.using(using).bulk_create([obj for obj in rows if None in key(obj)])
+
+
+def schedule_days(days, using="default"):
+    """
+    Пересчет затронутых дней после изменения заявок. Внутри транзакции дни
+    добавляются в задачу rollups.refresh_days этой транзакции: она появится
+    в очереди вместе с коммитом, а запрос не ждет пересчета. Вне транзакции
+    несколько дней пересчитываются сразу, много - фоновой задачей.
+    """
+    from .jobs import enqueue
+
+    days = {day for day in days if day}
+    if not days:
+        return
+    if connections[using].in_atomic_block:
+        _defer_days(days, using)
+        return
+    if len(days) <= inline_days_limit():
+        refresh_days(days, using=using)
+        return
+    enqueue("rollups.refresh_days", {"days": sorted(day.isoformat() for day in days)}, using=using)
+
+
+def _defer_days(days, using):
+    """
+    Добавляет дни в задачу, поставленную в этой же транзакции: запись заявки
+    (post_save, затем услуги в m2m_changed) дает одну задачу, а не две.
+    Задача привязана к транзакции колбэком on_commit: после коммита он
+    забывает задачу, а при откате (в том числе точки сохранения) Django
+    выбрасывает его вместе с самой задачей - тогда ставится новая.
+    """
+    from .jobs import enqueue
+
+    connection = connections[using]
+    days = {day.isoformat() for day in days}
+    pending = getattr(connection, "_rollup_job", None)
+    if pending is not None and any(callback is pending[1] for _, callback, _ in connection.run_on_commit):
+        job = pending[0]
+        merged = sorted(set(job.payload["days"]) | days)
+        Job.objects.using(using).filter(pk=job.pk).update(payload={"days": merged})
+        job.payload = {"days": merged}
+        return
+
+    def forget():
+        if getattr(connection, "_rollup_job", None) is state:
+            connection._rollup_job = None
+
+    state = (enqueue("rollups.refresh_days", {"days": sorted(days)}, using=using), forget)
+    connection._rollup_job = state
+    transaction.on_commit(forget, using=using)
+
+
+def order_days(order_ids, using="default"):
+    """Дни записи перечисленных заявок."""
+    appointments = (
+        Order.objects.using(using)
+        .filter(pk__in=order_ids, appointment_date__isnull=False)
+        .values_list("appointment_date", flat=True)
+    )
+    return {local_day(appointment) for appointment in appointments}
+
+
+def stale_days(since=None, using="default"):
+    """
+    Дни, сводка которых старше последнего изменения заявок этого дня (например,
+    после update() в обход сигналов). since ограничивает проверку заявками,
+    измененными начиная с этого момента (диапазон по индексу date_updated).
+    Без since проверяется вся история, и в ответ попадают еще дни со сводкой,
+    но уже без заявок.
+    """
+    orders = Order.objects.using(using).filter(appointment_date__isnull=False)
+    if since is not None:
+        orders = orders.filter(date_updated__gte=since)
+    changed = dict(
+        orders.annotate(day=TruncDate("appointment_date"))
+        .values_list("day")
+        .annotate(last=Max("date_updated"))
+        .values_list("day", "last")
+    )
+    rollups = DailyRevenue.objects.using(using)
+    if since is not None:
+        rollups = rollups.filter(day__in=changed)
+    refreshed = dict(rollups.values_list("day", "date_updated"))
+    days = {day for day, last in changed.items() if day not in refreshed or (last and refreshed[day] < last)}
+    if since is None:
+        days |= set(refreshed) - set(changed)
+    return days
+
+
+def catch_up(since=None, using="default"):
+    """Пересчитывает устаревшие дни. Возвращает их количество."""
+    days = stale_days(since, using=using)
+    refresh_days(days, using=using)
+    return len(days)
+
+
+def last_refresh(using="default"):
+    return DailyRevenue.objects.using(using).aggregate(last=Max("date_updated"))["last"]
+
+
+def rebuild(using="default", on_range=None):
+    """
+    Полный пересчет всех дней отрезками по RANGE_CHUNK_DAYS; сводки вне
+    периода заявок удаляются. Возвращает число пересчитанных дней.
+    """
+    bounds = Order.objects.using(using).aggregate(first=Min("appointment_date"), last=Max("appointment_date"))
+    if bounds["first"] is None:
+        for model in (DailyRevenue, DailyMasterRevenue, DailyServiceRevenue):
+            model.objects.using(using).all().delete()
+        return 0
+    first_day, last_day = local_day(bounds["first"]), local_day(bounds["last"])
+    for model in (DailyRevenue, DailyMasterRevenue, DailyServiceRevenue):
+        model.objects.using(using).exclude(day__gte=first_day, day__lte=last_day).delete()
+    day = first_day
+    while day <= last_day:
+        chunk_end = min(last_day, day + timedelta(days=RANGE_CHUNK_DAYS - 1))
+        refresh_range(day, chunk_end, using=using)
+        if on_range is not None:
+            on_range(day, chunk_end)
+        day = chunk_end + timedelta(days=1)
+    return (last_day - first_day).days + 1
+
+
+# --- Панель владельцев ---
+
+
+def dashboard(first_day, last_day, using="default"):
+    """
+    Данные панели за период - только из сводок: строк не больше
+    (дней периода x мастеров), сколько бы истории ни было в заявках.
+    """
+    period_days = (last_day - first_day).days + 1
+    capacity = period_days * working_minutes()
+    sums = {
+        "orders_count": Sum("orders_count"),
+        "completed_count": Sum("completed_count"),
+        "revenue": Sum("revenue"),
+        "booked_minutes": Sum("booked_minutes"),
+    }
+
+    daily = list(
+        DailyRevenue.objects.using(using).filter(day__gte=first_day, day__lte=last_day).order_by("day")
+    )
+    totals = {
+        "orders_count": sum(row.orders_count for row in daily),
+        "completed_count": sum(row.completed_count for row in daily),
+        "canceled_count": sum(row.canceled_count for row in daily),
+        "revenue": sum((row.revenue for row in daily), Decimal("0")),
+    }
+    masters = list(
+        DailyMasterRevenue.objects.using(using)
+        .filter(day__gte=first_day, day__lte=last_day)
+        .values("master_id", "master__name")
+        .annotate(**sums)
+        .order_by("-revenue")
+    )
+    for master in masters:
+        # Загрузка считается только для заявок с мастером
+        master["utilization"] = master["booked_minutes"] / capacity * 100 if master["master_id"] else None
+    services_sums = {key: value for key, value in sums.items() if key != "booked_minutes"}
+    services = list(
+        DailyServiceRevenue.objects.using(using)
+        .filter(day__gte=first_day, day__lte=last_day)
+        .values("service_id", "service__name")
+        .annotate(**services_sums)
+        .order_by("-revenue")
+    )
+    return {
+        "first_day": first_day,
+        "last_day": last_day,
+        "period_days": period_days,
+        "working_minutes": working_minutes(),
+        "daily": daily,
+        "totals": totals,
+        "masters": masters,
+        "services": services,
+        "last_refresh": last_refresh(using),
+    }
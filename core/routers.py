@@ -0,0 +1,133 @@
+# core/routers.py
+"""
+Маршрутизация запросов к базе: запись - в основную базу (default),
+чтение - в одну из реплик из settings.DATABASE_REPLICAS.
+
+Тело потокового ответа (core/streaming.py) читается уже после выхода из
+middleware - выбор базы запроса действует на каждую его пачку отдельно.
+
+Чтобы клиент сразу видел свои изменения, после запроса с записью (POST и т.п.)
+ReplicaRoutingMiddleware ставит cookie, и следующие DATABASE_STICKY_SECONDS
+секунд чтение этого клиента идет из основной базы. Чтение внутри транзакции
+основной базы тоже идет из нее - иначе проверка и запись увидели бы разные данные.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+_use_primary = ContextVar("use_primary", default=False)
+
+
+@contextmanager
+def use_primary():
+    """Все чтение внутри блока - из основной базы."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными основной базы
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Читать из основной базы: во время запроса с записью и некоторое время после него.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, "DATABASE_STICKY_SECONDS", 15)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _is_write(self, request):
+        return request.method not in SAFE_METHODS
+
+    def _pin(self, request):
+        return _use_primary.set(self._is_write(request) or STICKY_COOKIE in request.COOKIES)
+
+    def _stick(self, request, response):
+        if self._is_write(request) and response.status_code < 500:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax")
+        if response.streaming:
+            pinned = self._is_write(request) or STICKY_COOKIE in request.COOKIES
+            content = response.streaming_content
+            response.streaming_content = (
+                _apinned(content, pinned) if response.is_async else _pinned(content, pinned)
+            )
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = self._pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+        return self._stick(request, response)
+
+    async def __acall__(self, request):
+        token = self._pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+        return self._stick(request, response)
+
+
+def _pinned(content, pinned):
+    # Значение ставится на время получения каждой пачки, а не через yield:
+    # между пачками код сервера работает в своем контексте
+    iterator = iter(content)
+    while True:
+        token = _use_primary.set(pinned)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _use_primary.reset(token)
+        yield chunk
+
+
+async def _apinned(content, pinned):
+    iterator = aiter(content)
+    while True:
+        token = _use_primary.set(pinned)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _use_primary.reset(token)
+        yield chunk
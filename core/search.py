@@ -0,0 +1,368 @@
+# core/search.py
+"""
+Полнотекстовый поиск по заявкам.
+
+Бэкенд выбирается настройкой ORDER_SEARCH_BACKEND (путь к классу).
+Если настройка не задана, на SQLite используется FTS5, на остальных базах -
+старый поиск через icontains.
+
+Индекс FTS5 хранит не исходный текст, а основы слов (легкий стеммер для
+русского языка), поэтому "стрижку" находит "стрижка". Вторая таблица с
+триграммным токенизатором нужна для поиска по части телефона и для
+нечеткого поиска, когда в запросе опечатка.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .phone import normalize_phone
+
+# Поля заявки, по которым возможен поиск (соответствуют чекбоксам search_by_*)
+SEARCH_FIELDS = ("name", "phone", "comment")
+
+# Сколько результатов отдавать при ранжировании по релевантности
+SEARCH_RESULTS_LIMIT = 100
+
+_WORD_RE = re.compile(r"\w+")
+
+# Окончания отсортированы по убыванию длины: отрезаем самое длинное подходящее
+_ENDINGS = sorted(
+    (
+        "ыми", "ими", "ого", "его", "ому", "ему", "ами", "ями", "ией", "иям", "иях",
+        "ать", "ять", "ить", "еть", "ешь", "ете", "ите", "ала", "ила", "или", "али",
+        "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ую", "юю", "ых", "их",
+        "ым", "им", "ом", "ем", "ах", "ях", "ов", "ев", "ей", "ам", "ям", "ью", "ия",
+        "ию", "ии", "ет", "ит", "ут", "ют", "ал", "ил",
+        "а", "я", "о", "е", "у", "ю", "ы", "и", "ь", "й",
+    ),
+    key=len,
+    reverse=True,
+)
+_MIN_STEM = 3
+
+
+def tokenize(text):
+    """
+    Разбивает текст на слова в нижнем регистре (ё приравнивается к е).
+    """
+    return _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+
+
+def stem(word):
+    """
+    Легкий стеммер: отрезает возвратную частицу и одно окончание,
+    оставляя основу не короче трех букв.
+    """
+    for suffix in ("ся", "сь"):
+        if word.endswith(suffix) and len(word) - 2 >= _MIN_STEM:
+            word = word[:-2]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def stem_text(text):
+    return " ".join(stem(word) for word in tokenize(text))
+
+
+def digits(text):
+    return re.sub(r"\D", "", text or "")
+
+
+def _quote(term):
+    """
+    Экранирует слово для языка запросов FTS5.
+    """
+    return '"%s"' % term.replace('"', '""')
+
+
+def trigrams(word):
+    return [word[i : i + 3] for i in range(len(word) - 2)]
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс поискового бэкенда.
+    """
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def phone_exact_q(self, query, fields):
+        """
+        Если запрос - полный номер телефона, ищем точным совпадением
+        по индексированному phone_normalized. Иначе возвращаем None.
+        """
+        if "phone" not in fields:
+            return None
+        normalized = normalize_phone(query)
+        return Q(phone_normalized=normalized) if normalized else None
+
+    def index(self, order):
+        """Добавляет или обновляет заявку в индексе."""
+
+    def index_many(self, orders):
+        """Добавляет в индекс новые заявки (после bulk_create)."""
+        for order in orders:
+            self.index(order)
+
+    def remove(self, order_id):
+        """Удаляет заявку из индекса."""
+
+    def rebuild(self, orders, batch_size=1000):
+        """Полностью перестраивает индекс по итератору заявок."""
+
+    def filter(self, queryset, query, fields=SEARCH_FIELDS):
+        """Оставляет в queryset только заявки, подходящие под запрос."""
+        raise NotImplementedError
+
+    def ranked_ids(self, query, fields=SEARCH_FIELDS, limit=SEARCH_RESULTS_LIMIT, queryset=None):
+        """
+        Возвращает id подходящих заявок, от самых релевантных. queryset - заявки,
+        среди которых искать (фильтры списка): limit отсчитывается уже после них.
+        """
+        raise NotImplementedError
+
+    def _orders(self, queryset):
+        from .models import Order
+
+        return Order.objects.using(self.using) if queryset is None else queryset
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Поиск через LIKE '%...%' - работает на любой базе, но без индекса.
+    """
+
+    def _q(self, query, fields):
+        search_q = Q()
+        phone_q = self.phone_exact_q(query, fields)
+        for field in fields:
+            if field == "phone" and phone_q is not None:
+                search_q |= phone_q
+            else:
+                search_q |= Q(**{f"{field}__icontains": query})
+        return search_q
+
+    def filter(self, queryset, query, fields=SEARCH_FIELDS):
+        if not fields:
+            return queryset
+        return queryset.filter(self._q(query, fields))
+
+    def ranked_ids(self, query, fields=SEARCH_FIELDS, limit=SEARCH_RESULTS_LIMIT, queryset=None):
+        if not fields:
+            return []
+        queryset = self._orders(queryset).filter(self._q(query, fields))
+        return list(queryset.order_by("-date_created", "-id").values_list("id", flat=True)[:limit])
+
+
+class Fts5SearchBackend(BaseSearchBackend):
+    """
+    Поиск через виртуальные таблицы FTS5 в SQLite.
+
+    core_order_search - основы слов имени и комментария и цифры телефона,
+    core_order_search_trigram - исходный текст в нижнем регистре
+    (поиск подстроки в телефоне и нечеткий поиск).
+    """
+
+    table = "core_order_search"
+    trigram_table = "core_order_search_trigram"
+
+    def setup(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                "USING fts5(name, phone, comment, tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.trigram_table} "
+                "USING fts5(name, phone, comment, tokenize='trigram')"
+            )
+
+    def teardown(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.trigram_table}")
+
+    def _rows(self, order):
+        name, comment = order.name or "", order.comment or ""
+        phone = digits(order.phone)
+        return (
+            (order.pk, stem_text(name), phone, stem_text(comment)),
+            (order.pk, " ".join(tokenize(name)), phone, " ".join(tokenize(comment))),
+        )
+
+    def index(self, order):
+        stemmed, raw = self._rows(order)
+        with connections[self.using].cursor() as cursor:
+            for table, row in ((self.table, stemmed), (self.trigram_table, raw)):
+                cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [order.pk])
+                cursor.execute(
+                    f"INSERT INTO {table} (rowid, name, phone, comment) VALUES (%s, %s, %s, %s)", row
+                )
+
+    def index_many(self, orders):
+        # Заявки новые - удалять старые строки не нужно, вставляем одним executemany
+        with connections[self.using].cursor() as cursor:
+            self._insert_many(cursor, [self._rows(order) for order in orders])
+
+    def remove(self, order_id):
+        with connections[self.using].cursor() as cursor:
+            for table in (self.table, self.trigram_table):
+                cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [order_id])
+
+    def rebuild(self, orders, batch_size=1000):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"DELETE FROM {self.trigram_table}")
+            batch = []
+            for order in orders:
+                batch.append(self._rows(order))
+                if len(batch) >= batch_size:
+                    self._insert_many(cursor, batch)
+                    batch = []
+            if batch:
+                self._insert_many(cursor, batch)
+
+    def _insert_many(self, cursor, batch):
+        for table, position in ((self.table, 0), (self.trigram_table, 1)):
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, name, phone, comment) VALUES (%s, %s, %s, %s)",
+                [rows[position] for rows in batch],
+            )
+
+    # --- Построение выражений MATCH ---
+
+    def _word_match(self, query, fields):
+        """
+        Все слова запроса (по префиксу основы) в выбранных текстовых колонках.
+        """
+        columns = [field for field in fields if field != "phone"]
+        words = [stem(word) for word in tokenize(query) if not word.isdigit()]
+        if not columns or not words:
+            return None
+        terms = " ".join(_quote(word) + "*" for word in words)
+        return "{%s} : (%s)" % (" ".join(columns), terms)
+
+    def _phone_match(self, query, fields):
+        """
+        Подстрока из цифр запроса в телефоне (нужно минимум 3 цифры для триграмм).
+        Полные номера ищутся точным совпадением, см. phone_exact_q().
+        """
+        number = digits(query)
+        if "phone" not in fields or len(number) < 3 or normalize_phone(query):
+            return None
+        return "phone : %s" % _quote(number)
+
+    def _fuzzy_match(self, query, fields):
+        """
+        Любая триграмма любого слова запроса - ранжирование bm25 поднимает
+        наверх заявки с наибольшим совпадением, что и дает устойчивость к опечаткам.
+        """
+        columns = [field for field in fields if field != "phone"]
+        grams = {gram for word in tokenize(query) for gram in trigrams(word)}
+        if not columns or not grams:
+            return None
+        return "{%s} : (%s)" % (" ".join(columns), " OR ".join(_quote(gram) for gram in sorted(grams)))
+
+    @staticmethod
+    def _scope(queryset, table):
+        """
+        Условие по фильтрам queryset (статусы, даты): LIMIT и проверка "точных
+        совпадений нет" должны учитывать только отфильтрованные заявки.
+        Коррелированный EXISTS проверяет по первичному ключу только найденные
+        строки индекса, а не собирает заранее все заявки под фильтром.
+        """
+        if queryset is None or not queryset.query.where:
+            return "", []
+        scoped = queryset.order_by().filter(pk=RawSQL(f"{table}.rowid", [])).values("pk")
+        sql, params = scoped.query.sql_with_params()
+        return f" AND EXISTS ({sql})", list(params)
+
+    def _subquery(self, table, match):
+        return RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match])
+
+    def _fuzzy_subquery(self, word_match, fuzzy_match, limit, queryset=None):
+        """
+        Лучшие по bm25 нечеткие совпадения - только если точных совпадений
+        по словам нет (скорее всего, в запросе опечатка). Проверка идет в том же
+        запросе, без отдельного обращения к базе.
+        """
+        fuzzy_scope, fuzzy_params = self._scope(queryset, self.trigram_table)
+        word_scope, word_params = self._scope(queryset, self.table)
+        return RawSQL(
+            f"SELECT rowid FROM {self.trigram_table} WHERE {self.trigram_table} MATCH %s{fuzzy_scope} "
+            f"AND NOT EXISTS (SELECT 1 FROM {self.table} WHERE {self.table} MATCH %s{word_scope}) "
+            f"ORDER BY bm25({self.trigram_table}) LIMIT %s",
+            [fuzzy_match, *fuzzy_params, word_match, *word_params, limit],
+        )
+
+    def _ranked(self, table, match, limit, queryset=None):
+        scope, scope_params = self._scope(queryset, table)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {table} WHERE {table} MATCH %s{scope} ORDER BY bm25({table}) LIMIT %s",
+                [match, *scope_params, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query, fields=SEARCH_FIELDS):
+        """
+        Точные совпадения не ограничены по количеству. Нечеткий поиск
+        ограничен SEARCH_RESULTS_LIMIT лучшими по bm25: под "любую общую
+        триграмму" подходит большая часть базы, полезны только первые.
+        """
+        if not fields:
+            return queryset
+        word_match = self._word_match(query, fields)
+        phone_match = self._phone_match(query, fields)
+        phone_q = self.phone_exact_q(query, fields)
+        if word_match is None and phone_match is None and phone_q is None:
+            return queryset.none()
+
+        search_q = phone_q or Q()
+        if word_match is not None:
+            search_q |= Q(id__in=self._subquery(self.table, word_match))
+            fuzzy_match = self._fuzzy_match(query, fields)
+            if fuzzy_match is not None:
+                search_q |= Q(id__in=self._fuzzy_subquery(word_match, fuzzy_match, SEARCH_RESULTS_LIMIT, queryset))
+        if phone_match is not None:
+            search_q |= Q(id__in=self._subquery(self.trigram_table, phone_match))
+        return queryset.filter(search_q)
+
+    def ranked_ids(self, query, fields=SEARCH_FIELDS, limit=SEARCH_RESULTS_LIMIT, queryset=None):
+        ids = []
+        phone_q = self.phone_exact_q(query, fields)
+        if phone_q is not None:
+            # Точное совпадение номера всегда релевантнее всего остального
+            exact = self._orders(queryset).filter(phone_q).order_by("-date_created", "-id")
+            ids += list(exact.values_list("id", flat=True)[:limit])
+        phone_match = self._phone_match(query, fields)
+        if phone_match is not None:
+            ids += self._ranked(self.trigram_table, phone_match, limit, queryset)
+        word_match = self._word_match(query, fields)
+        if word_match is not None:
+            ids += self._ranked(self.table, word_match, limit, queryset)
+        fuzzy_match = self._fuzzy_match(query, fields)
+        if word_match is not None and fuzzy_match is not None and not ids:
+            ids += self._ranked(self.trigram_table, fuzzy_match, limit, queryset)
+        # Убираем дубликаты, сохраняя порядок
+        return list(dict.fromkeys(ids))[:limit]
+
+
+def get_search_backend(using="default"):
+    """
+    Возвращает поисковый бэкенд для указанной базы.
+    """
+    path = getattr(settings, "ORDER_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)(using=using)
+    if connections[using].vendor == "sqlite":
+        return Fts5SearchBackend(using=using)
+    return IcontainsSearchBackend(using=using)
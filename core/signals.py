@@ -0,0 +1,292 @@
+# core/signals.py
+"""
+Обработчики сигналов моделей. Подключаются в CoreConfig.ready().
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .availability import engine as availability
+from . import rollups
+from .cache import bump_version
+from .jobs import enqueue
+from .models import Master, Order, Review, Service
+from .search import get_search_backend
+from .stats import recalculate_order_totals, refresh_customer_stats, refresh_master_ratings
+from .thumbnails import IMAGE_FIELDS, refresh_thumbnails
+
+
+@receiver(post_save, sender=Order)
+def index_order(sender, instance, using, raw=False, **kwargs):
+    """
+    Обновляет поисковый индекс после сохранения заявки.
+    """
+    if raw:
+        return
+    get_search_backend(using).index(instance)
+
+
+@receiver(post_delete, sender=Order)
+def unindex_order(sender, instance, using, **kwargs):
+    """
+    Удаляет заявку из поискового индекса.
+    """
+    get_search_backend(using).remove(instance.pk)
+
+
+# --- Статистика клиентов (CustomerStats) ---
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_phone(sender, instance, using, raw=False, **kwargs):
+    """
+    Запоминает прежние номер, статус и дату записи заявки: если телефон
+    (или день записи) поменялся, пересчитать нужно обоих клиентов (оба дня).
+    Значения берутся из загруженной заявки (Order.saved_state), в базу идем,
+    только если заявка создана не запросом или поля были отложены.
+    """
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_state = instance.saved_state() or (
+        Order.objects.using(using).filter(pk=instance.pk).values_list(*Order.TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def update_stats_on_save(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    previous_phone, previous_status, _ = getattr(instance, "_previous_state", None) or (None, None, None)
+    # Выручку дают только завершенные заявки - остальные изменения статистику не трогают
+    if "completed" not in (instance.status, previous_status):
+        return
+    refresh_customer_stats({instance.phone_normalized, previous_phone}, using=using)
+
+
+@receiver(post_delete, sender=Order)
+def update_stats_on_delete(sender, instance, using, **kwargs):
+    refresh_customer_stats({instance.phone_normalized}, using=using)
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_totals_on_services_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Состав услуг заявки поменялся - пересчитываем Order.total_price
+    и выручку клиента. С обратной стороны (service.orders.add(...))
+    затронуты заявки из pk_set.
+    """
+    if not reverse:
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        recalculate_order_totals([instance.pk], using=using)
+        instance.total_price = Order.objects.using(using).values_list("total_price", flat=True).get(pk=instance.pk)
+        if instance.status == "completed":
+            refresh_customer_stats({instance.phone_normalized}, using=using)
+        return
+
+    if action == "pre_clear":
+        # После очистки список заявок уже не получить - собираем его заранее
+        instance._cleared_order_ids = list(instance.orders.using(using).values_list("pk", flat=True))
+        return
+    if action in ("post_add", "post_remove"):
+        order_ids = list(pk_set)
+    elif action == "post_clear":
+        order_ids = getattr(instance, "_cleared_order_ids", [])
+    else:
+        return
+    _refresh_orders(order_ids, using)
+
+
+def _refresh_orders(order_ids, using):
+    recalculate_order_totals(order_ids, using=using)
+    phones = Order.objects.using(using).filter(pk__in=order_ids, status="completed").values_list(
+        "phone_normalized", flat=True
+    )
+    refresh_customer_stats(set(phones), using=using)
+    rollups.schedule_days(rollups.order_days(order_ids, using=using), using=using)
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_price(sender, instance, using, raw=False, **kwargs):
+    instance._previous_price = instance._previous_duration = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_price, instance._previous_duration = (
+        Service.objects.using(using).filter(pk=instance.pk).values_list("price", "duration").first()
+        or (None, None)
+    )
+
+
+@receiver(post_save, sender=Service)
+def update_totals_on_service_price(sender, instance, using, created=False, raw=False, **kwargs):
+    """
+    Цена услуги изменилась - сдвигаем total_price всех заказов с этой услугой
+    одним UPDATE и пересчитываем клиентов с завершенными заказами.
+    """
+    previous_price = getattr(instance, "_previous_price", None)
+    if raw or created or previous_price is None or previous_price == instance.price:
+        return
+    orders = Order.objects.using(using).filter(services=instance)
+    orders.update(total_price=F("total_price") + (instance.price - previous_price), date_updated=Now())
+    phones = orders.filter(status="completed").values_list("phone_normalized", flat=True).distinct()
+    refresh_customer_stats(set(phones), using=using)
+
+
+@receiver(pre_delete, sender=Service)
+def remember_service_orders(sender, instance, using, **kwargs):
+    # Строки связи удаляются каскадом без m2m_changed - запоминаем заказы заранее
+    instance._order_ids = list(instance.orders.using(using).values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def update_totals_on_service_delete(sender, instance, using, **kwargs):
+    _refresh_orders(getattr(instance, "_order_ids", []), using)
+
+
+# --- Сводки выручки и загрузки (core/rollups.py) ---
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_save(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    previous_state = getattr(instance, "_previous_state", None)
+    previous_appointment = previous_state[2] if previous_state else None
+    rollups.schedule_days(
+        {rollups.local_day(instance.appointment_date), rollups.local_day(previous_appointment)}, using=using
+    )
+
+
+@receiver(post_delete, sender=Order)
+def update_rollups_on_delete(sender, instance, using, **kwargs):
+    rollups.schedule_days({rollups.local_day(instance.appointment_date)}, using=using)
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_rollups_on_services_change(sender, instance, action, reverse, using, **kwargs):
+    # Обратная сторона (service.orders.add(...)) обрабатывается в _refresh_orders
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    rollups.schedule_days({rollups.local_day(instance.appointment_date)}, using=using)
+
+
+@receiver(post_save, sender=Service)
+def update_rollups_on_service_change(sender, instance, using, created=False, raw=False, **kwargs):
+    """
+    Цена или длительность услуги изменилась - пересчитываем все дни с этой услугой
+    (дней обычно много, поэтому чаще всего в фоновой задаче).
+    """
+    if raw or created:
+        return
+    price, duration = getattr(instance, "_previous_price", None), getattr(instance, "_previous_duration", None)
+    if (price, duration) == (None, None) or (price, duration) == (instance.price, instance.duration):
+        return
+    orders = Order.objects.using(using).filter(services=instance).values("pk")
+    rollups.schedule_days(rollups.order_days(orders, using=using), using=using)
+
+
+# --- Занятость мастеров (core/availability.py) ---
+
+
+@receiver(post_save, sender=Order)
+def update_availability_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    availability.update_order(instance)
+
+
+@receiver(post_delete, sender=Order)
+def update_availability_on_delete(sender, instance, **kwargs):
+    availability.remove_order(instance.pk)
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_availability_on_services_change(sender, instance, action, reverse, **kwargs):
+    # Длительность заявки зависит от услуг
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        availability.clear()
+    else:
+        availability.update_order(instance)
+
+
+@receiver(post_save, sender=Service)
+def update_availability_on_service_change(sender, instance, created=False, raw=False, **kwargs):
+    # Могла поменяться длительность услуги - проще загрузить расписания заново
+    if not raw and not created:
+        availability.clear()
+
+
+# --- Рейтинг мастеров ---
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_master(sender, instance, using, raw=False, **kwargs):
+    # Отзыв могли перевесить на другого мастера - пересчитать нужно обоих
+    instance._previous_master_id = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_master_id = (
+        Review.objects.using(using).filter(pk=instance.pk).values_list("master_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_master_ratings({instance.master_id, getattr(instance, "_previous_master_id", None)}, using=using)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, using, **kwargs):
+    refresh_master_ratings({instance.master_id}, using=using)
+
+
+# --- Миниатюры изображений (core/thumbnails.py) ---
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_save, sender=Service)
+def schedule_thumbnails(sender, instance, using, raw=False, **kwargs):
+    """
+    Файл изображения сменился (или удален) - ставим задачу thumbnails.refresh:
+    она попадет в очередь вместе с сохранением, и кодирование AVIF пойдет
+    в воркере run_jobs, а не в процессе, обслуживающем админку.
+    """
+    if raw:
+        return
+    field_file = getattr(instance, IMAGE_FIELDS[sender.__name__][0])
+    if (field_file.name or "") == (instance.thumbnails or {}).get("source", ""):
+        return
+    if getattr(settings, "THUMBNAILS_ASYNC", True):
+        enqueue("thumbnails.refresh", {"model": sender.__name__, "pk": instance.pk}, using=using)
+    else:
+        transaction.on_commit(lambda: refresh_thumbnails(sender, instance.pk), using=using)
+
+
+# --- Версии для кэша лендинга (core/cache.py) ---
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+@receiver(m2m_changed, sender=Master.services.through)
+def bump_master_version(sender, **kwargs):
+    bump_version("master")
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def bump_service_version(sender, **kwargs):
+    bump_version("service")
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_review_version(sender, **kwargs):
+    bump_version("review")
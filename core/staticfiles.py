@@ -0,0 +1,300 @@
+# core/staticfiles.py
+"""
+Статика для продакшена.
+
+collectstatic с CompressedManifestStaticFilesStorage:
+1. минифицирует собственные CSS и JS проекта при копировании в STATIC_ROOT;
+2. добавляет хэш содержимого в имена (css/main.3f2a9c.css) и пишет манифест -
+   {% static %} в шаблонах сам подставляет хэшированные имена;
+3. кладет рядом сжатые копии .gz и .br (brotli - если установлен пакет brotli).
+
+StaticFilesMiddleware отдает файлы из STATIC_ROOT: сжатую копию по Accept-Encoding,
+для хэшированных имен - Cache-Control на год с immutable (при изменении файла
+меняется и имя), для остальных - проверку Last-Modified при каждом запросе.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен - тогда только gzip
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".map", ".txt", ".html", ".xml", ".ico")
+# Сжатая копия нужна, только если она заметно меньше
+MIN_COMPRESSION_RATIO = 0.95
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Строки в кавычках не трогаем - в них "/*" и пробелы значимы
+_CSS_TOKEN_RE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCTUATION_RE = re.compile(r"\s*([{};,>])\s*")
+
+
+def _minify_css_code(text):
+    text = _CSS_SPACE_RE.sub(" ", text)
+    # Пробелы вокруг ":" не трогаем - они значимы в селекторах вроде "a :hover"
+    return _CSS_PUNCTUATION_RE.sub(r"\1", text).replace(";}", "}")
+
+
+def minify_css(text):
+    parts, code = [], []
+    position = 0
+    for match in _CSS_TOKEN_RE.finditer(text):
+        code.append(text[position : match.start()])
+        position = match.end()
+        if match.group(1) is None:
+            # Комментарий заменяем пробелом: "a/**/b" не должно склеиться в "ab"
+            code.append(" ")
+            continue
+        parts += [_minify_css_code("".join(code)), match.group(1)]
+        code = []
+    code.append(text[position:])
+    parts.append(_minify_css_code("".join(code)))
+    return "".join(parts).strip()
+
+
+# После этих символов (или в начале файла) "/" начинает регулярное выражение, а не деление
+_JS_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^")
+_JS_LINE_SPACE_RE = re.compile(r"[ \t]*\n\s*")
+
+
+def _js_segments(text):
+    """
+    Делит JS на код и литералы (строки, шаблоны, регулярные выражения)
+    и выбрасывает комментарии. Возвращает список (литерал?, текст).
+    Внутри ${...} шаблонной строки снова идет код со своими литералами.
+    """
+    segments = []
+    code = []
+    # Стек открытых ${ в шаблонных строках: глубина фигурных скобок в каждом
+    braces = []
+    index, length = 0, len(text)
+
+    def flush_code():
+        if code:
+            segments.append((False, "".join(code)))
+            code.clear()
+
+    def last_significant():
+        for literal, chunk in reversed(segments + [(False, "".join(code))]):
+            stripped = chunk.rstrip()
+            if stripped:
+                return ")" if literal else stripped[-1]
+        return ""
+
+    def scan_template(start):
+        # start - индекс после открывающей ` или закрывающей } подстановки
+        position = start
+        while position < length:
+            char = text[position]
+            if char == "\\":
+                position += 2
+            elif char == "`":
+                return position + 1, False
+            elif text.startswith("${", position):
+                return position + 2, True
+            else:
+                position += 1
+        return length, False
+
+    while index < length:
+        char = text[index]
+        if text.startswith("//", index):
+            end = text.find("\n", index)
+            index = length if end == -1 else end
+        elif text.startswith("/*", index):
+            end = text.find("*/", index + 2)
+            end = length if end == -1 else end + 2
+            # Перевод строки внутри комментария может завершать выражение
+            code.append("\n" if "\n" in text[index:end] else " ")
+            index = end
+        elif char in "'\"":
+            end = index + 1
+            while end < length and text[end] != char and text[end] != "\n":
+                end += 2 if text[end] == "\\" else 1
+            flush_code()
+            segments.append((True, text[index : end + 1]))
+            index = end + 1
+        elif char == "`" or (char == "}" and braces and braces[-1] == 0):
+            if char == "}":
+                braces.pop()
+            end, opened = scan_template(index + 1)
+            flush_code()
+            segments.append((True, text[index:end]))
+            if opened:
+                braces.append(0)
+            index = end
+        elif char == "/" and last_significant() in _JS_REGEX_PREFIX | {""}:
+            end, in_class = index + 1, False
+            while end < length and text[end] != "\n":
+                if text[end] == "\\":
+                    end += 2
+                    continue
+                if text[end] == "[":
+                    in_class = True
+                elif text[end] == "]":
+                    in_class = False
+                elif text[end] == "/" and not in_class:
+                    break
+                end += 1
+            flush_code()
+            segments.append((True, text[index : end + 1]))
+            index = end + 1
+        else:
+            if braces and char == "{":
+                braces[-1] += 1
+            elif braces and char == "}":
+                braces[-1] -= 1
+            code.append(char)
+            index += 1
+    flush_code()
+    return segments
+
+
+def minify_js(text):
+    """
+    Осторожная минификация: убираем комментарии, отступы и пустые строки
+    только в коде - строки, шаблоны и регулярные выражения остаются как есть.
+    Переводы строк сохраняются - на них полагается автоматическая расстановка
+    точек с запятой.
+    """
+    parts = [chunk if literal else _JS_LINE_SPACE_RE.sub("\n", chunk) for literal, chunk in _js_segments(text)]
+    return "".join(parts).strip()
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+# Минифицируем только собственные файлы проекта (static/css, static/js): сторонняя
+# статика приложений либо уже минифицирована, либо не рассчитана на такую обработку
+MINIFY_PREFIXES = ("css/", "js/")
+
+
+def compress(data):
+    """Возвращает {расширение: сжатые байты} для вариантов, которые дают выигрыш."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {ext: body for ext, body in variants.items() if len(body) < len(data) * MIN_COMPRESSION_RATIO}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # До collectstatic (тесты, первый запуск продакшен-профиля) манифеста нет -
+    # {% static %} отдает исходное имя вместо ValueError на каждой странице
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в STATIC_ROOT - хэш посчитать не из чего
+            return name
+
+    def _save(self, name, content):
+        minify = MINIFIERS.get(os.path.splitext(name)[1])
+        if minify is not None and name.startswith(MINIFY_PREFIXES) and not name.endswith((".min.css", ".min.js")):
+            content.seek(0)
+            text = content.read()
+            text = text.decode() if isinstance(text, bytes) else text
+            content = ContentFile(minify(text).encode())
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            for ext, body in compress(data).items():
+                if self.exists(name + ext):
+                    self.delete(name + ext)
+                self._save_compressed(name + ext, body)
+
+    def _save_compressed(self, name, body):
+        # Мимо _save - сжатые байты не минифицируем
+        super()._save(name, ContentFile(body))
+
+
+class StaticFilesMiddleware:
+    """
+    Раздача собранной статики самим Django (без отдельного веб-сервера).
+    Включается настройкой SERVE_STATIC; ставится сразу после SecurityMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "SERVE_STATIC", False) and bool(settings.STATIC_ROOT)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith("/") else "/" + settings.STATIC_URL
+        self._hashed_names = None
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    @property
+    def hashed_names(self):
+        if self._hashed_names is None:
+            self._hashed_names = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._hashed_names
+
+    def serve(self, request):
+        if not self.enabled or request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        immutable = name in self.hashed_names
+        if not immutable:
+            response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+            if response is not None:
+                return response
+
+        accepted = request.headers.get("Accept-Encoding", "")
+        encoding, served_path = None, path
+        for ext, token in ((".br", "br"), (".gz", "gzip")):
+            if token in accepted and os.path.isfile(path + ext):
+                encoding, served_path = token, path + ext
+                break
+
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(served_path, "rb"), content_type=content_type or "application/octet-stream")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        if immutable:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+            response.headers["Last-Modified"] = http_date(stat.st_mtime)
+        return response
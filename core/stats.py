@@ -0,0 +1,143 @@
+# core/stats.py
+"""
+Поддержка денормализованных сумм: Order.total_price, таблицы CustomerStats
+и рейтинга мастеров (Master.avg_rating / review_count).
+
+Вместо пересчета выручки по всем заявкам клиента на каждой строке админки
+храним готовую сумму. При изменении заявок пересчитываем только затронутых
+клиентов - одним GROUP BY по индексу (phone_normalized, status).
+"""
+from decimal import Decimal
+
+from django.db.models import Avg, Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+
+from .models import CustomerStats, Master, Order, Review, Service
+
+
+def recalculate_order_totals(order_ids, using="default"):
+    """
+    Пересчитывает Order.total_price для перечисленных заявок одним UPDATE
+    с коррелированным подзапросом.
+    """
+    if not order_ids:
+        return
+    services_sum = (
+        Service.objects.using(using)
+        .filter(orders=OuterRef("pk"))
+        .values("orders")
+        .annotate(total=Sum("price"))
+        .values("total")
+    )
+    Order.objects.using(using).filter(pk__in=order_ids).update(
+        total_price=Coalesce(Subquery(services_sum), Value(0), output_field=DecimalField()),
+        # update() не трогает auto_now, а от даты изменения зависит ETag карточки заказа
+        date_updated=Now(),
+    )
+
+
+def refresh_customer_stats(phones, using="default"):
+    """
+    Пересчитывает статистику для перечисленных номеров (E.164).
+    Пустые номера пропускаются - для них статистика не ведется.
+    """
+    phones = {phone for phone in phones if phone}
+    if not phones:
+        return
+
+    totals = {
+        row["phone_normalized"]: row
+        for row in Order.objects.using(using)
+        .filter(phone_normalized__in=phones, status="completed")
+        .values("phone_normalized")
+        .annotate(
+            orders_count=Count("id"),
+            revenue_sum=Sum("total_price"),
+        )
+    }
+
+    stats = []
+    for phone in phones:
+        row = totals.get(phone, {})
+        stats.append(
+            CustomerStats(
+                phone_normalized=phone,
+                completed_orders=row.get("orders_count", 0),
+                revenue=row.get("revenue_sum") or Decimal("0"),
+            )
+        )
+    CustomerStats.objects.using(using).bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=["phone_normalized"],
+        update_fields=["completed_orders", "revenue", "date_updated"],
+    )
+
+
+def rebuild_customer_stats(batch_size=1000, using="default"):
+    """
+    Полный пересчет таблицы: удаляет устаревшие строки и заполняет заново пачками.
+    """
+    phones = (
+        Order.objects.using(using)
+        .exclude(phone_normalized="")
+        .order_by("phone_normalized")
+        .values_list("phone_normalized", flat=True)
+        .distinct()
+    )
+    CustomerStats.objects.using(using).exclude(phone_normalized__in=phones).delete()
+
+    batch = []
+    for phone in phones.iterator(chunk_size=batch_size):
+        batch.append(phone)
+        if len(batch) >= batch_size:
+            refresh_customer_stats(batch, using=using)
+            batch = []
+    refresh_customer_stats(batch, using=using)
+
+
+def _rating_subqueries(using):
+    published = Review.objects.using(using).filter(master=OuterRef("pk"), is_published=True).values("master")
+    avg_rating = published.annotate(value=Avg("rating")).values("value")
+    review_count = published.annotate(value=Count("id")).values("value")
+    return (
+        Coalesce(Subquery(avg_rating), Value(0), output_field=DecimalField()),
+        Coalesce(Subquery(review_count), Value(0), output_field=IntegerField()),
+    )
+
+
+def refresh_master_ratings(master_ids, using="default"):
+    """
+    Пересчитывает рейтинг перечисленных мастеров одним UPDATE.
+    Подзапросы идут по индексу (master, is_published) - только отзывы этих мастеров.
+    """
+    from .cache import bump_version
+
+    master_ids = {master_id for master_id in master_ids if master_id}
+    if not master_ids:
+        return
+    avg_rating, review_count = _rating_subqueries(using)
+    Master.objects.using(using).filter(pk__in=master_ids).update(avg_rating=avg_rating, review_count=review_count)
+    # update() не отправляет post_save - сбрасываем кэш карточек мастеров сами
+    bump_version("master")
+
+
+def reconcile_master_ratings(batch_size=500, using="default"):
+    """
+    Сверяет сохраненный рейтинг с отзывами и исправляет расхождения.
+    Возвращает количество исправленных мастеров.
+    """
+    avg_rating, review_count = _rating_subqueries(using)
+    fixed = []
+    masters = (
+        Master.objects.using(using)
+        .annotate(actual_rating=avg_rating, actual_count=review_count)
+        .values_list("pk", "avg_rating", "review_count", "actual_rating", "actual_count")
+    )
+    for pk, rating, count, actual_rating, actual_count in masters.iterator(chunk_size=batch_size):
+        # Средняя хранится с двумя знаками - сравниваем с округлением
+        if count != actual_count or rating != Decimal(actual_rating).quantize(Decimal("0.01")):
+            fixed.append(pk)
+    for start in range(0, len(fixed), batch_size):
+        refresh_master_ratings(fixed[start : start + batch_size], using=using)
+    return len(fixed)
@@ -0,0 +1,101 @@
+# core/streaming.py
+"""
+Потоковый рендеринг длинных списков.
+
+Страница рендерится один раз с маркером на месте списка и делится по нему
+на "шапку" и "подвал". Клиент сразу получает шапку, затем карточки пачками
+по мере чтения queryset одним курсором, затем подвал. Первая пачка маленькая,
+чтобы первые карточки не ждали загрузки и рендеринга целой пачки.
+В памяти одновременно находится только одна пачка объектов.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+
+STREAM_MARKER = "<!--stream-items-->"
+
+# Сколько объектов читать из базы и отдавать клиенту за раз
+STREAM_CHUNK_SIZE = 500
+# Размер первой пачки
+STREAM_FIRST_CHUNK_SIZE = 30
+
+
+def _chunk_sizes(chunk_size):
+    yield min(STREAM_FIRST_CHUNK_SIZE, chunk_size)
+    while True:
+        yield chunk_size
+
+
+def _split_prefetch(queryset):
+    """
+    prefetch_related снимается с queryset и выполняется для каждой пачки
+    отдельно: iterator() сам делил бы объекты только на пачки одного размера.
+    """
+    return queryset.prefetch_related(None), queryset._prefetch_related_lookups
+
+
+def _render_items(queryset, item_template, item_name, chunk_size):
+    template = get_template(item_template)
+    queryset, lookups = _split_prefetch(queryset)
+    objects = queryset.iterator(chunk_size=chunk_size)
+    for size in _chunk_sizes(chunk_size):
+        chunk = list(islice(objects, size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield "".join(template.render({item_name: obj}) for obj in chunk)
+
+
+def streaming_render(request, template_name, context, queryset, item_template, item_name, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    StreamingHttpResponse со страницей template_name, в которой вместо
+    {{ stream_marker }} выводятся карточки item_template для каждого объекта queryset.
+    """
+    page = render_to_string(template_name, {**context, "stream_marker": STREAM_MARKER}, request=request)
+    head, _, tail = page.partition(STREAM_MARKER)
+
+    def content():
+        yield head
+        yield from _render_items(queryset, item_template, item_name, chunk_size)
+        yield tail
+
+    return StreamingHttpResponse(content(), content_type="text/html; charset=utf-8")
+
+
+async def _arender_items(queryset, item_template, item_name, chunk_size):
+    template = get_template(item_template)
+    queryset, lookups = _split_prefetch(queryset)
+    objects = aiter(queryset.aiterator(chunk_size=chunk_size))
+    for size in _chunk_sizes(chunk_size):
+        chunk = []
+        async for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= size:
+                break
+        if not chunk:
+            return
+        # Связанные объекты загружены пачкой - рендер карточки в базу не ходит
+        await aprefetch_related_objects(chunk, *lookups)
+        yield "".join(template.render({item_name: obj}) for obj in chunk)
+
+
+async def astreaming_render(request, template_name, context, queryset, item_template, item_name, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Асинхронный вариант streaming_render для ASGI: заявки читаются через aiterator().
+    Страница рендерится в потоке - контекстные процессоры читают сессию и пользователя.
+    """
+    page = await sync_to_async(render_to_string)(
+        template_name, {**context, "stream_marker": STREAM_MARKER}, request=request
+    )
+    head, _, tail = page.partition(STREAM_MARKER)
+
+    async def content():
+        yield head
+        async for chunk in _arender_items(queryset, item_template, item_name, chunk_size):
+            yield chunk
+        yield tail
+
+    return StreamingHttpResponse(content(), content_type="text/html; charset=utf-8")
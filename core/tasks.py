@@ -0,0 +1,84 @@
+# core/tasks.py
+"""
+Фоновые задачи после записи клиента, пересчет сводок выручки и миниатюры
+изображений. Регистрируются
+при старте приложения (CoreConfig.ready), выполняются командой run_jobs.
+"""
+import logging
+from datetime import date
+
+from django.apps import apps
+from django.core.mail import mail_managers
+from django.utils import timezone
+
+from . import rollups
+from .assistant import get_assistant
+from .jobs import enqueue, task
+from .models import Order
+from .routers import use_primary
+from .thumbnails import refresh_thumbnails
+
+logger = logging.getLogger("core.notifications")
+
+
+def enqueue_order_jobs(order):
+    """
+    Ставит задачи по новой заявке. Вызывается в транзакции сохранения заявки -
+    задачи появятся в очереди вместе с ней.
+    """
+    enqueue("orders.notify_customer", {"order_id": order.pk})
+    enqueue("orders.notify_staff", {"order_id": order.pk})
+    if order.comment:
+        enqueue("assistant.comment_reply", {"order_id": order.pk})
+
+
+def _appointment(order):
+    return timezone.localtime(order.appointment_date).strftime("%d.%m.%Y %H:%M") if order.appointment_date else "-"
+
+
+@task("orders.notify_customer")
+def notify_customer(payload):
+    order = Order.objects.select_related("master").get(pk=payload["order_id"])
+    text = f"{order.name}, вы записаны на {_appointment(order)}"
+    if order.master:
+        text += f" к мастеру {order.master.name}"
+    # SMS-шлюз не подключен - сообщение пишется в лог core.notifications
+    logger.info("SMS %s: %s", order.phone_normalized or order.phone, text)
+    return {"phone": order.phone_normalized or order.phone, "text": text}
+
+
+@task("orders.notify_staff")
+def notify_staff(payload):
+    order = Order.objects.prefetch_related("services").get(pk=payload["order_id"])
+    services = ", ".join(service.name for service in order.services.all())
+    mail_managers(
+        f"Новая заявка #{order.pk}",
+        f"{order.name}, {order.phone}\n{_appointment(order)}\n{services}\n{order.comment or ''}",
+    )
+    return {"order_id": order.pk}
+
+
+@task("assistant.comment_reply", max_attempts=3)
+def comment_reply(payload):
+    order = Order.objects.get(pk=payload["order_id"])
+    prompt = (
+        "Ты администратор барбершопа. Клиент оставил комментарий к записи. "
+        f"Предложи короткий вежливый ответ.\nКомментарий: {order.comment}"
+    )
+    return {"reply": get_assistant().complete(prompt)}
+
+
+@task("rollups.refresh_days")
+def refresh_rollup_days(payload):
+    days = [date.fromisoformat(day) for day in payload["days"]]
+    rollups.refresh_days(days)
+    return {"days": len(days)}
+
+
+@task("thumbnails.refresh", max_attempts=3)
+def refresh_image_thumbnails(payload):
+    model = apps.get_model("core", payload["model"])
+    # Строка только что записана - реплика может ее еще не видеть
+    with use_primary():
+        thumbnails = refresh_thumbnails(model, payload["pk"])
+    return {"widths": (thumbnails or {}).get("widths", [])}
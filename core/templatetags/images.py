@@ -0,0 +1,59 @@
+# core/templatetags/images.py
+"""
+Адаптивные изображения по сводке из поля thumbnails (см. core/thumbnails.py).
+
+    {% load images %}
+    {% picture master.photo master.thumbnails sizes="120px" alt=master.name class="rounded-circle" %}
+    <img srcset="{% srcset service.image service.thumbnails 'webp' %}" ...>
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from core.thumbnails import variant_name
+
+register = template.Library()
+
+
+def _ready(field_file, thumbnails):
+    # Варианты построены именно для текущего файла
+    return bool(field_file) and bool(thumbnails) and thumbnails.get("source") == field_file.name
+
+
+def _srcset(thumbnails, fmt):
+    return ", ".join(
+        f"{default_storage.url(variant_name(thumbnails['key'], width, fmt))} {width}w"
+        for width in thumbnails["widths"]
+    )
+
+
+@register.simple_tag
+def srcset(field_file, thumbnails, fmt="webp"):
+    """Значение атрибута srcset для формата fmt или пустая строка, если вариантов нет."""
+    if not _ready(field_file, thumbnails) or fmt not in thumbnails["formats"]:
+        return ""
+    return _srcset(thumbnails, fmt)
+
+
+@register.simple_tag
+def picture(field_file, thumbnails, sizes="100vw", alt="", **attrs):
+    """
+    <picture> с источниками AVIF/WebP и исходным файлом как запасным вариантом.
+    Пока варианты не построены - обычный <img> с оригиналом.
+    """
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    img = format_html(
+        '<img src="{}" alt="{}"{}>',
+        field_file.url,
+        alt,
+        format_html_join("", ' {}="{}"', sorted(attrs.items())),
+    )
+    if not _ready(field_file, thumbnails):
+        return img
+    sources = format_html_join(
+        "",
+        '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((fmt, _srcset(thumbnails, fmt), sizes) for fmt in thumbnails["formats"]),
+    )
+    return format_html("<picture>{}{}</picture>", sources, img)
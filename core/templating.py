@@ -0,0 +1,156 @@
+# core/templating.py
+"""
+Предварительная компиляция шаблонов для продакшена.
+
+С кэширующим загрузчиком шаблон компилируется при первом рендеринге, то есть
+на первом запросе каждого воркера. precompile() при старте процесса проходит
+по всем шаблонам проекта и приложений и кладет их в кэш загрузчика. Заодно
+{% include "имя" %} и {% extends "имя" %} с постоянным именем связываются с уже
+скомпилированным шаблоном: при рендеринге не нужен поиск по загрузчикам.
+
+Включается настройкой TEMPLATE_PRECOMPILE (по умолчанию - при DEBUG=False),
+вызывается из barbershop/wsgi.py и asgi.py; проверить вручную - warm_templates.
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.template.loaders import cached
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = (".html", ".txt", ".xml")
+
+
+class ResolvedTemplate:
+    """
+    Подставляется в IncludeNode и ExtendsNode вместо выражения с именем шаблона:
+    их render() получает готовый шаблон из resolve() и не ищет его по загрузчикам.
+    """
+
+    def __init__(self, name, template):
+        self.name = name
+        self.template = template
+        # ExtendsNode.__repr__ выводит исходный токен
+        self.token = f'"{name}"'
+
+    def resolve(self, context, ignore_failures=False):
+        return self.template
+
+    def __str__(self):
+        return self.name
+
+
+def template_names(engine):
+    """Имена всех шаблонов в каталогах движка и приложений (в порядке поиска загрузчиками)."""
+    directories = list(engine.dirs) + list(get_app_template_dirs("templates"))
+    names = []
+    seen = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for filename in sorted(files):
+                if not filename.endswith(TEMPLATE_EXTENSIONS):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, "/")
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+    return names
+
+
+def _constant_name(expression):
+    """Имя шаблона, если выражение - строка без фильтров, иначе None."""
+    if isinstance(expression, ResolvedTemplate) or expression.filters or not isinstance(expression.var, str):
+        return None
+    return str(expression.var)
+
+
+def link_includes(template, engine):
+    """
+    Связывает {% include %} и {% extends %} с постоянным именем без фильтров
+    с уже скомпилированным шаблоном. Возвращает число связанных тегов.
+    """
+    own_name = template.origin.template_name
+    linked = 0
+    for node in template.nodelist.get_nodes_by_type(IncludeNode):
+        name = _constant_name(node.template)
+        if name is None:
+            continue
+        try:
+            node.template = ResolvedTemplate(name, engine.get_template(name))
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            # Такой include и без связывания упадет при рендеринге - оставляем как есть
+            continue
+        linked += 1
+    for node in template.nodelist.get_nodes_by_type(ExtendsNode):
+        name = _constant_name(node.parent_name)
+        # Шаблон, расширяющий одноименный (переопределение шаблона приложения),
+        # ищет родителя с пропуском самого себя - такое связывание оставляем Django
+        if name is None or name == own_name:
+            continue
+        try:
+            node.parent_name = ResolvedTemplate(name, engine.get_template(name))
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            continue
+        linked += 1
+    return linked
+
+
+def compile_engine(engine, names=None):
+    """
+    Компилирует шаблоны движка (django.template.Engine) и, если у него
+    кэширующий загрузчик, связывает include/extends.
+    Возвращает (число шаблонов, число связанных тегов, ошибки {имя: текст}).
+    """
+    templates, errors = [], {}
+    for name in names or template_names(engine):
+        try:
+            templates.append(engine.get_template(name))
+        except (TemplateSyntaxError, UnicodeDecodeError) as error:
+            errors[name] = str(error)
+    linked = 0
+    # Без кэширующего загрузчика связывать нечего - шаблоны компилируются заново на каждый рендеринг
+    if any(isinstance(loader, cached.Loader) for loader in engine.template_loaders):
+        for template in templates:
+            linked += link_includes(template, engine)
+    return len(templates), linked, errors
+
+
+def precompile(names=None):
+    """
+    Компилирует шаблоны всех движков DjangoTemplates. Возвращает сводку:
+    число шаблонов, связанных include и extends, ошибки (имя -> текст) и время в мс.
+    Шаблоны с ошибками пропускаются - сторонние приложения иногда кладут
+    в templates файлы для пакетов, которые не установлены.
+    """
+    start = time.perf_counter()
+    compiled, linked, errors = 0, 0, {}
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        engine_compiled, engine_linked, engine_errors = compile_engine(backend.engine, names)
+        compiled += engine_compiled
+        linked += engine_linked
+        errors.update(engine_errors)
+    summary = {
+        "templates": compiled,
+        "linked_includes": linked,
+        "errors": errors,
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    logger.info(
+        "Шаблоны скомпилированы: %s, include и extends связано: %s, ошибок: %s, %s мс",
+        compiled, linked, len(errors), summary["ms"],
+    )
+    return summary
+
+
+def precompile_on_startup():
+    if getattr(settings, "TEMPLATE_PRECOMPILE", False):
+        return precompile()
+    return None
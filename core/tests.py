@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import tempfile
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from barbershop.urls import urlpatterns as project_urlpatterns
+
+from . import async_views, jobs, rollups
+from .admin import MasterAutocompleteFilter
+from .assistant import MistralAssistant, StubAssistant, get_assistant
+from .availability import engine as availability
+from .bulk import bulk_create_with_dates
+from .cache import VERSION_KEY, bump_version, get_versions, services_list_etag
+from .forms import OrderForm
+from .metrics import QueryMetricsMiddleware, registry
+from .models import (
+    CustomerStats,
+    DailyMasterRevenue,
+    DailyRevenue,
+    DailyServiceRevenue,
+    IdempotencyKey,
+    Job,
+    Master,
+    Order,
+    RateLimitBucket,
+    Review,
+    Service,
+)
+from .pagination import EstimatedCountPaginator, _phases, apaginate_orders, decode_cursor, encode_cursor, paginate_orders
+from .phone import normalize_phone
+from .ratelimit import take
+from .routers import STICKY_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware, use_primary
+from .search import Fts5SearchBackend
+from .staticfiles import minify_css, minify_js
+from .stats import reconcile_master_ratings
+from .streaming import STREAM_FIRST_CHUNK_SIZE, _arender_items
+from .views import save_order_form
+from .writes import WRITER_THREAD_NAME, WriteQueue, immediate_atomic
+
+
+@jobs.task("tests.ok")
+def ok_task(payload):
+    return {"echo": payload}
+
+
+@jobs.task("tests.fail", max_attempts=3)
+def failing_task(payload):
+    raise RuntimeError("сбой")
+
+# Лимиты частоты, которые тестовые отправки формы не выбирают
+NO_RATE_LIMITS = {"ip": (1000, 1), "phone": (1000, 1)}
+
+
+class BookingDataMixin:
+    def setUp(self):
+        super().setUp()
+        # Расписания мастеров кэшируются в памяти процесса - между тестами база откатывается
+        availability.clear()
+        self.service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        self.first = Master.objects.create(name="Иван", phone="+79990000001")
+        self.second = Master.objects.create(name="Петр", phone="+79990000002")
+        for master in (self.first, self.second):
+            master.services.add(self.service)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.start = timezone.make_aware(datetime.combine(tomorrow, time(12)))
+
+    def order_data(self, phone="+79991234567", **extra):
+        return {
+            "name": "Клиент",
+            "phone": phone,
+            "services": [self.service.pk],
+            "appointment_date": timezone.localtime(self.start).strftime("%Y-%m-%dT%H:%M"),
+            **extra,
+        }
+
+
+@override_settings(ORDER_RATE_LIMITS=NO_RATE_LIMITS)
+class BookingTests(BookingDataMixin, TestCase):
+    def book(self, **extra):
+        return self.client.post(reverse("order-create"), self.order_data(**extra))
+
+    def test_free_master_is_assigned(self):
+        self.assertRedirects(self.book(), reverse("thanks"))
+        self.assertEqual(Order.objects.get().master, self.first)
+
+    def test_double_booking_goes_to_next_master_then_is_rejected(self):
+        self.book(phone="+79991111111")
+        self.book(phone="+79992222222")
+        response = self.book(phone="+79993333333")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "На это время нет свободных мастеров")
+        self.assertEqual(
+            sorted(Order.objects.values_list("master__name", flat=True)), ["Иван", "Петр"]
+        )
+
+    def test_chosen_master_is_kept(self):
+        self.book(master=self.second.pk)
+        self.assertEqual(Order.objects.get().master, self.second)
+
+    def test_busy_chosen_master_is_reported_not_replaced(self):
+        self.book(phone="+79991111111", master=self.first.pk)
+        response = self.book(phone="+79992222222", master=self.first.pk)
+        self.assertContains(response, "Мастер Иван не может принять вас в это время")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_stale_schedule_cache_does_not_allow_double_booking(self):
+        # Расписание уже в кэше, а заявки на это время записал другой процесс:
+        # bulk_create не отправляет сигналов, и кэш этого процесса о них не знает
+        availability.free_slots(timezone.localdate(self.start), [self.service])
+        Order.objects.bulk_create(
+            [Order(name="Другой", phone="1", master=master, appointment_date=self.start) for master in (self.first, self.second)]
+        )
+        response = self.book()
+        self.assertContains(response, "На это время нет свободных мастеров")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_past_time_error_is_visible(self):
+        self.start = timezone.now() - timedelta(days=1)
+        self.assertContains(self.book(), "Нельзя записаться на прошедшее время")
+
+
+@override_settings(ORDER_RATE_LIMITS=NO_RATE_LIMITS)
+class BookingTransactionTests(BookingDataMixin, TransactionTestCase):
+    """BEGIN IMMEDIATE берет только бронирование, остальные транзакции - обычные."""
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("BEGIN IMMEDIATE нужен только на SQLite")
+        super().setUp()
+
+    def begins(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [query["sql"] for query in queries if query["sql"].startswith("BEGIN")]
+
+    def test_plain_atomic_is_deferred(self):
+        def read():
+            with transaction.atomic():
+                Order.objects.count()
+
+        self.assertEqual(self.begins(read), ["BEGIN"])
+
+    def test_booking_takes_write_lock(self):
+        self.assertEqual(self.begins(lambda: save_order_form(OrderForm(self.order_data()))), ["BEGIN IMMEDIATE"])
+        self.assertEqual(Order.objects.get().master, self.first)
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_immediate_atomic_restores_mode_after_error(self):
+        def fail():
+            with immediate_atomic():
+                raise ValueError
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(self.begins(lambda: transaction.atomic()(Order.objects.count)()), ["BEGIN"])
+
+
+@override_settings(JOB_BACKOFF_SECONDS=10, JOB_BACKOFF_MAX_SECONDS=60, JOB_CONCURRENCY={})
+class JobQueueTests(TestCase):
+    def test_successful_job_is_done_with_result(self):
+        job = jobs.enqueue("tests.ok", {"a": 1})
+        [claimed] = jobs.claim("w1", 10)
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts, claimed.locked_by), (job.pk, "running", 1, "w1"))
+        self.assertTrue(jobs.run(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), ("done", {"echo": {"a": 1}}, ""))
+
+    def test_unknown_task_cannot_be_enqueued(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue("tests.missing")
+
+    def test_failed_job_is_retried_with_backoff_then_dead(self):
+        job = jobs.enqueue("tests.fail")
+        self.assertEqual(job.max_attempts, 3)
+        for attempt in (1, 2):
+            [claimed] = jobs.claim("w1", 10)
+            with self.assertLogs("core.jobs", "WARNING"):
+                self.assertFalse(jobs.run(claimed))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("queued", attempt))
+            self.assertIn("RuntimeError", job.last_error)
+            # Повтор не раньше задержки - до нее задачу не взять
+            self.assertGreaterEqual(job.run_at - timezone.now(), timedelta(seconds=10 * 2 ** (attempt - 1) - 1))
+            self.assertEqual(jobs.claim("w1", 10), [])
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        [claimed] = jobs.claim("w1", 10)
+        with self.assertLogs("core.jobs", "ERROR"):
+            jobs.run(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("dead", 3))
+        self.assertEqual(jobs.claim("w1", 10), [])
+
+    def test_backoff_grows_exponentially_up_to_limit(self):
+        for attempts, seconds in ((1, 10), (2, 20), (3, 40), (4, 60), (10, 60)):
+            delay = jobs.backoff(attempts).total_seconds()
+            self.assertGreaterEqual(delay, seconds)
+            self.assertLessEqual(delay, seconds * 1.1)
+
+    def test_concurrency_limit_is_shared_by_workers(self):
+        for _ in range(3):
+            jobs.enqueue("tests.ok")
+        jobs.enqueue("tests.fail")
+        with self.settings(JOB_CONCURRENCY={"tests.ok": 1}):
+            first = jobs.claim("w1", 10)
+            self.assertEqual(sorted(job.name for job in first), ["tests.fail", "tests.ok"])
+            # Второй воркер не получит tests.ok, пока первый его выполняет
+            self.assertEqual(jobs.claim("w2", 10), [])
+            jobs.run(next(job for job in first if job.name == "tests.ok"))
+            self.assertEqual([job.name for job in jobs.claim("w2", 10)], ["tests.ok"])
+
+    def test_concurrency_limit_holds_with_stale_running_count(self):
+        for _ in range(2):
+            jobs.enqueue("tests.ok")
+        with self.settings(JOB_CONCURRENCY={"tests.ok": 1}):
+            self.assertEqual(len(jobs.claim("w1", 10)), 1)
+            # Второй воркер прочитал число выполняющихся задач до захвата первым
+            with mock.patch("core.jobs._running_counts", return_value={}):
+                self.assertEqual(jobs.claim("w2", 10), [])
+        self.assertEqual(Job.objects.filter(status="running").count(), 1)
+
+    def test_retry_skips_running_jobs(self):
+        running = jobs.enqueue("tests.ok")
+        jobs.claim("w1", 10)
+        dead = jobs.enqueue("tests.ok")
+        Job.objects.filter(pk=dead.pk).update(status="dead", attempts=5)
+        self.assertEqual(jobs.retry(Job.objects.all()), 1)
+        running.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((running.status, running.locked_by), ("running", "w1"))
+        self.assertEqual((dead.status, dead.attempts), ("queued", 0))
+
+    def test_stale_running_job_is_released(self):
+        jobs.enqueue("tests.ok")
+        [claimed] = jobs.claim("w1", 10)
+        Job.objects.filter(pk=claimed.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.release_stale(), 1)
+        [again] = jobs.claim("w2", 10)
+        self.assertEqual((again.pk, again.attempts), (claimed.pk, 2))
+        # Первый воркер уже не может записать результат задачи, которую у него забрали
+        jobs.run(claimed)
+        again.refresh_from_db()
+        self.assertEqual((again.status, again.locked_by), ("running", "w2"))
+
+
+class AssistantTests(TestCase):
+    @override_settings(MISTRAL_API_KEY=None, ASSISTANT_BACKEND="")
+    def test_stub_without_api_key(self):
+        assistant = get_assistant()
+        self.assertIsInstance(assistant, StubAssistant)
+        self.assertEqual(assistant.complete("Привет"), "[stub] Привет")
+
+    @override_settings(MISTRAL_API_KEY="secret", ASSISTANT_BACKEND="stub")
+    def test_stub_can_be_forced(self):
+        self.assertIsInstance(get_assistant(), StubAssistant)
+
+    @override_settings(MISTRAL_API_KEY="secret", ASSISTANT_BACKEND="")
+    def test_mistral_with_api_key(self):
+        self.assertIsInstance(get_assistant(), MistralAssistant)
+
+    @override_settings(MISTRAL_API_KEY=None, ASSISTANT_BACKEND="", ORDER_RATE_LIMITS=NO_RATE_LIMITS)
+    def test_comment_reply_job_uses_stub(self):
+        order = Order.objects.create(name="Клиент", phone="+79991234567", comment="Можно пораньше?")
+        jobs.enqueue("assistant.comment_reply", {"order_id": order.pk})
+        [job] = jobs.claim("w1", 10, names=["assistant.comment_reply"])
+        self.assertTrue(jobs.run(job))
+        job.refresh_from_db()
+        self.assertTrue(job.result["reply"].startswith("[stub] "))
+        self.assertIn("Можно пораньше?", job.result["reply"])
+
+
+@override_settings(ORDER_RATE_LIMITS=NO_RATE_LIMITS)
+class OrderJobsTests(BookingDataMixin, TestCase):
+    def job_names(self):
+        return sorted(Job.objects.exclude(name="rollups.refresh_days").values_list("name", flat=True))
+
+    def test_order_create_enqueues_jobs_with_the_order(self):
+        self.client.post(reverse("order-create"), self.order_data())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.job_names(), ["orders.notify_customer", "orders.notify_staff"])
+
+    def test_invalid_order_enqueues_nothing(self):
+        self.client.post(reverse("order-create"), self.order_data(phone=""))
+        self.assertEqual((Order.objects.count(), self.job_names()), (0, []))
+
+    def test_jobs_roll_back_with_the_order(self):
+        def enqueue_then_fail(order):
+            jobs.enqueue("orders.notify_customer", {"order_id": order.pk})
+            raise RuntimeError("сбой после постановки задачи")
+
+        with mock.patch("core.views.enqueue_order_jobs", side_effect=enqueue_then_fail):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("order-create"), self.order_data())
+        # Задача пишется в транзакции заявки - откатилась вместе с ней
+        self.assertEqual((Order.objects.count(), Job.objects.count()), (0, 0))
+
+
+@override_settings(ORDER_RATE_LIMITS=NO_RATE_LIMITS)
+class OrderSubmissionGuardTests(BookingDataMixin, TestCase):
+    def post(self, **extra):
+        return self.client.post(reverse("order-create"), self.order_data(**extra))
+
+    def test_repeated_idempotency_key_creates_one_order(self):
+        self.assertRedirects(self.post(idempotency_key="key-1"), reverse("thanks"))
+        self.assertRedirects(self.post(idempotency_key="key-1"), reverse("thanks"), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().order, Order.objects.get())
+
+    def test_concurrent_duplicate_is_rolled_back_and_reported_as_success(self):
+        # Первая отправка уже сохранила ключ, пока вторая проверяла форму
+        first = Order.objects.create(name="Клиент", phone="+79991234567")
+        IdempotencyKey.objects.create(key="key-1", order=first)
+        form = OrderForm(self.order_data(idempotency_key="key-1"))
+        self.assertTrue(save_order_form(form, "key-1"))
+        self.assertEqual(list(Order.objects.all()), [first])
+
+    @override_settings(ORDER_RATE_LIMITS={"ip": (2, 0.0001), "phone": (100, 1)})
+    def test_ip_limit_answers_429_with_message(self):
+        self.post(phone="+79991111111")
+        self.post(phone="+79992222222")
+        response = self.post(phone="+79993333333")
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, "Слишком много заявок", status_code=429)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(ORDER_RATE_LIMITS={"ip": (100, 1), "phone": (2, 0.0001)})
+    def test_rejected_form_returns_phone_token(self):
+        self.start = timezone.now() - timedelta(days=1)
+        for _ in range(3):
+            self.assertEqual(self.post().status_code, 200)
+        self.start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(12)))
+        self.assertRedirects(self.post(), reverse("thanks"))
+        self.assertEqual(self.post(phone="+7 999 123-45-67", master=self.second.pk).status_code, 302)
+        self.assertEqual(self.post().status_code, 429)
+
+
+class TokenBucketTests(TestCase):
+    def test_bucket_refills_at_rate_up_to_capacity(self):
+        self.assertEqual([take("k", 2, 1.0, now=0) for _ in range(3)], [True, True, False])
+        self.assertFalse(take("k", 2, 1.0, now=0.5))
+        self.assertTrue(take("k", 2, 1.0, now=1.5))
+        # За долгую паузу корзина наполняется только до емкости
+        self.assertEqual([take("k", 2, 1.0, now=1000) for _ in range(3)], [True, True, False])
+
+    def test_buckets_are_independent(self):
+        self.assertTrue(take("a", 1, 0.001, now=0))
+        self.assertFalse(take("a", 1, 0.001, now=0))
+        self.assertTrue(take("b", 1, 0.001, now=0))
+        self.assertEqual(RateLimitBucket.objects.count(), 2)
+
+
+class BulkDatesTests(TestCase):
+    def test_dates_from_objects_are_kept(self):
+        moment = timezone.now() - timedelta(days=400)
+        [order] = bulk_create_with_dates(
+            Order, [Order(name="Клиент", phone="1", date_created=moment, date_updated=moment)]
+        )
+        order.refresh_from_db()
+        self.assertEqual((order.date_created, order.date_updated), (moment, moment))
+        # Флаги полей модели общие для процесса и не меняются
+        self.assertTrue(Order._meta.get_field("date_updated").auto_now)
+
+    def test_missing_date_is_set_to_now(self):
+        before = timezone.now()
+        bulk_create_with_dates(Review, [Review(name="Клиент", text="Хорошо", rating=5)])
+        self.assertGreaterEqual(Review.objects.get().date_created, before)
+
+
+class FtsSearchTests(TestCase):
+    def setUp(self):
+        self.anna = Order.objects.create(name="Анна", phone="+7 (999) 123-45-67", comment="Хочу стрижку покороче")
+        self.boris = Order.objects.create(name="Борис", phone="8 912 555-00-11", comment="Бритье")
+        self.backend = Fts5SearchBackend()
+
+    def search(self, query, fields=("name", "phone", "comment")):
+        return set(self.backend.filter(Order.objects.all(), query, fields))
+
+    def test_word_forms_are_found(self):
+        self.assertEqual(self.search("стрижка"), {self.anna})
+
+    def test_phone_substring_and_full_number(self):
+        self.assertEqual(self.search("555-00"), {self.boris})
+        self.assertEqual(self.search("+7 912 555 00 11"), {self.boris})
+
+    def test_typo_falls_back_to_fuzzy_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search("стрыжку"), {self.anna})
+
+    def test_fuzzy_fallback_keeps_exact_phone(self):
+        # Слова в запросе не нашлись, а номер совпал точно
+        self.assertIn(self.anna, self.search("Анка 89991234567"))
+
+    def test_exact_matches_are_not_limited(self):
+        for index in range(3):
+            Order.objects.create(name=f"Гость {index}", phone="1", comment="стрижка")
+        with mock.patch("core.search.SEARCH_RESULTS_LIMIT", 2):
+            self.assertEqual(len(self.search("стрижки")), 4)
+
+    def test_unselected_fields_are_ignored(self):
+        self.assertEqual(self.search("Анна", fields=("comment",)), set())
+
+    def test_fuzzy_fallback_respects_filters(self):
+        # Точное совпадение есть, но только среди отфильтрованных статусом заявок
+        Order.objects.create(name="Гость", phone="1", comment="стрыжку", status="canceled")
+        new_orders = Order.objects.filter(status="new")
+        self.assertEqual(set(self.backend.filter(new_orders, "стрыжку", ("comment",))), {self.anna})
+        self.assertEqual(self.backend.ranked_ids("стрыжку", ("comment",), queryset=new_orders), [self.anna.pk])
+
+    def test_ranked_limit_applies_after_filters(self):
+        for index in range(3):
+            Order.objects.create(name=f"Гость {index}", phone="1", comment="стрижка", status="canceled")
+        new_orders = Order.objects.filter(status="new")
+        self.assertEqual(self.backend.ranked_ids("стрижка", ("comment",), limit=2, queryset=new_orders), [self.anna.pk])
+
+    def test_migration_explains_missing_trigram_tokenizer(self):
+        migration = importlib.import_module("core.migrations.0008_order_search_index")
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = "sqlite"
+        schema_editor.execute.side_effect = OperationalError("no such tokenizer: trigram")
+        with self.assertRaisesMessage(ImproperlyConfigured, "токенизатором trigram"):
+            migration.create_search_index(None, schema_editor)
+
+
+class PhoneTests(SimpleTestCase):
+    def test_russian_formats_are_normalized(self):
+        for raw in ("+7 (999) 123-45-67", "8 999 123 45 67", "9991234567", "79991234567"):
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_phone(raw), "+79991234567")
+
+    def test_foreign_number_keeps_its_code(self):
+        self.assertEqual(normalize_phone("+44 20 7946 0958"), "+442079460958")
+
+    def test_incomplete_or_too_long_numbers_are_rejected(self):
+        for raw in ("", None, "123-45", "+1234567890123456"):
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_phone(raw), "")
+
+
+class PhoneNormalizedFieldTests(TestCase):
+    def test_save_fills_normalized_phone(self):
+        order = Order.objects.create(name="Клиент", phone="8 (999) 123-45-67")
+        self.assertEqual(order.phone_normalized, "+79991234567")
+
+    def test_update_fields_include_normalized_phone(self):
+        order = Order.objects.create(name="Клиент", phone="8 (999) 123-45-67")
+        order.phone = "+7 912 555 00 11"
+        order.save(update_fields=["phone"])
+        order.refresh_from_db()
+        self.assertEqual(order.phone_normalized, "+79125550011")
+
+
+class BackfillPhonesTests(BookingDataMixin, TestCase):
+    def test_backfill_refreshes_customer_stats(self):
+        orders = []
+        for status in ("completed", "completed", "new"):
+            order = Order.objects.create(name="Клиент", phone="8 (999) 123-45-67", status=status)
+            order.services.add(self.service)
+            orders.append(order)
+        # Заявки до появления колонки: номер не заполнен, статистики по нему нет
+        Order.objects.update(phone_normalized="")
+        CustomerStats.objects.all().delete()
+
+        call_command("backfill_phones", batch_size=2, stdout=io.StringIO())
+        self.assertEqual(Order.objects.filter(phone_normalized="+79991234567").count(), 3)
+        stats = CustomerStats.objects.get(phone_normalized="+79991234567")
+        self.assertEqual((stats.completed_orders, stats.revenue), (2, 2 * self.service.price))
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        moment = timezone.now()
+        # Одинаковые даты создания и заявки без даты - порядок решает id
+        dates = [moment, moment, moment - timedelta(hours=1), None, None, moment + timedelta(hours=1), moment, None]
+        statuses = ["new", "completed", "canceled"]
+        for index, date in enumerate(dates):
+            order = Order.objects.create(name="Клиент", phone="1", status=statuses[index % 3])
+            Order.objects.filter(pk=order.pk).update(date_created=date)
+
+    def walk(self, descending, statuses=()):
+        queryset = Order.objects.filter(status__in=statuses) if statuses else Order.objects.all()
+        ids, cursor = [], None
+        while True:
+            page, cursor = paginate_orders(queryset, cursor=cursor, descending=descending, per_page=2, statuses=statuses)
+            ids += [order.id for order in page]
+            if cursor is None:
+                return ids
+
+    def expected(self, descending, statuses=()):
+        orders = Order.objects.filter(status__in=statuses) if statuses else Order.objects.all()
+        # Как в SQLite: NULL меньше любой даты
+        key = lambda order: (order.date_created is not None, order.date_created or timezone.now(), order.id)
+        return [order.id for order in sorted(orders, key=key, reverse=descending)]
+
+    def test_pages_cover_every_order_once_in_order(self):
+        for descending in (True, False):
+            with self.subTest(descending=descending):
+                self.assertEqual(self.walk(descending), self.expected(descending))
+
+    def test_several_statuses_are_merged_in_order(self):
+        for descending in (True, False):
+            with self.subTest(descending=descending):
+                statuses = ["new", "canceled"]
+                self.assertEqual(self.walk(descending, statuses), self.expected(descending, statuses))
+
+    async def test_async_pages_match_sync(self):
+        page, cursor = await apaginate_orders(Order.objects.all(), per_page=3)
+        second, _ = await apaginate_orders(Order.objects.all(), cursor=cursor, per_page=3)
+        self.assertEqual([order.id for order in page + second], (await sync_to_async(self.expected)(True))[:6])
+
+    def test_page_seeks_in_index_at_any_depth(self):
+        order = Order.objects.exclude(date_created=None).order_by("date_created", "id")[1]
+        position = (order.date_created, order.id)
+        for descending in (True, False):
+            for queryset in (Order.objects.all(), Order.objects.filter(status="new")):
+                plan = _phases(queryset, position, descending)[0][:21].explain()
+                with self.subTest(descending=descending, plan=plan):
+                    self.assertIn("SEARCH core_order USING INDEX", plan)
+                    self.assertIn("date_created" + (">" if not descending else "<"), plan)
+                    self.assertNotIn("TEMP B-TREE", plan)
+        # Одна страница - один запрос на статус, сколько бы заявок ни было до курсора
+        cursor = encode_cursor(order)
+        with self.assertNumQueries(2):
+            paginate_orders(Order.objects.all(), cursor=cursor, descending=False, per_page=1, statuses=["new", "completed"])
+
+    def test_cursor_round_trip_and_broken_cursor(self):
+        order = Order.objects.exclude(date_created=None).first()
+        self.assertEqual(decode_cursor(encode_cursor(order)), (order.date_created, order.id))
+        self.assertIsNone(decode_cursor("не курсор"))
+        page, _ = paginate_orders(Order.objects.all(), cursor="не курсор", per_page=2)
+        self.assertEqual([order.id for order in page], self.expected(True)[:2])
+
+    def test_next_link_keeps_filters(self):
+        with mock.patch("core.views.paginate_orders", partial(paginate_orders, per_page=2)):
+            response = self.client.get(reverse("orders"), {"status_new": "on"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["next_query"].startswith("status_new=on&cursor="))
+
+
+class OrderDetailConditionalTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        self.order = Order.objects.create(name="Клиент", phone="1")
+        self.order.services.add(self.service)
+        self.url = reverse("order_detail", args=[self.order.pk])
+
+    def test_repeat_request_gets_304_until_service_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, headers={"if-none-match": etag}).status_code, 304)
+        self.service.name = "Модельная стрижка"
+        self.service.save()
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertContains(response, "Модельная стрижка")
+
+    def test_if_modified_since_alone_is_not_enough(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+        later = "Wed, 01 Jan 2100 00:00:00 GMT"
+        self.assertEqual(self.client.get(self.url, headers={"if-modified-since": later}).status_code, 200)
+
+
+class OrderPreviousStateTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        order = Order.objects.create(name="Клиент", phone="+79990000001", status="completed")
+        order.services.add(self.service)
+        self.order = Order.objects.get(pk=order.pk)
+
+    def revenue(self, phone):
+        return CustomerStats.objects.filter(phone_normalized=phone).values_list("revenue", flat=True).first()
+
+    def test_loaded_order_is_saved_without_extra_select(self):
+        self.order.phone = "+79990000002"
+        with CaptureQueriesContext(connection) as queries:
+            self.order.save()
+        tracked = ", ".join(f'"core_order"."{name}"' for name in Order.TRACKED_FIELDS)
+        self.assertFalse([query for query in queries if tracked in query["sql"]])
+        # Статистика пересчитана для обоих номеров
+        self.assertEqual(self.revenue("+79990000001"), 0)
+        self.assertEqual(self.revenue("+79990000002"), 1000)
+
+    def test_state_follows_saves(self):
+        self.order.status = "canceled"
+        self.order.save()
+        self.assertEqual(self.order.saved_state()[1], "canceled")
+        self.assertEqual(self.revenue("+79990000001"), 0)
+        self.order.status = "completed"
+        self.order.save()
+        self.assertEqual(self.revenue("+79990000001"), 1000)
+
+    def test_deferred_or_unloaded_state_falls_back_to_database(self):
+        order = Order.objects.only("id", "name", "phone").get(pk=self.order.pk)
+        self.assertIsNone(order.saved_state())
+        detached = Order(pk=self.order.pk, name="Клиент", phone="+79990000003", status="completed")
+        detached.save()
+        self.assertEqual(self.revenue("+79990000001"), 0)
+
+
+class OrderTotalPriceTests(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        order = Order.objects.create(name="Клиент", phone="+79990000001")
+        order.services.add(self.service)
+        self.order = Order.objects.get(pk=order.pk)
+
+    def total(self):
+        return Order.objects.values_list("total_price", flat=True).get(pk=self.order.pk)
+
+    def test_stale_instance_keeps_new_total(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.service.price = 1500
+        self.service.save()
+        stale.comment = "Опоздаю на 5 минут"
+        stale.save()
+        self.assertEqual(self.total(), 1500)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).comment, "Опоздаю на 5 минут")
+
+    def test_services_change_updates_total(self):
+        extra = Service.objects.create(name="Борода", price=500, duration=30)
+        self.order.services.add(extra)
+        self.assertEqual(self.order.total_price, 1500)
+        self.order.save()
+        self.assertEqual(self.total(), 1500)
+
+    def test_plain_save_does_not_write_total(self):
+        self.order.name = "Новое имя"
+        with CaptureQueriesContext(connection) as queries:
+            self.order.save()
+        [update] = [query["sql"] for query in queries if query["sql"].startswith('UPDATE "core_order"')]
+        self.assertIn('"name"', update)
+        self.assertNotIn('"total_price"', update)
+
+
+class MasterRatingTests(TestCase):
+    def setUp(self):
+        self.first = Master.objects.create(name="Иван", phone="+79990000001")
+        self.second = Master.objects.create(name="Петр", phone="+79990000002")
+
+    def review(self, rating, master=None, **extra):
+        return Review.objects.create(name="Клиент", text="Текст", rating=rating, master=master or self.first, **extra)
+
+    def rating(self, master):
+        master.refresh_from_db()
+        return master.avg_rating, master.review_count
+
+    def test_only_published_reviews_count(self):
+        self.review(5)
+        self.review(4)
+        self.review(1, is_published=False)
+        self.assertEqual(self.rating(self.first), (Decimal("4.50"), 2))
+
+    def test_moving_and_deleting_review_updates_both_masters(self):
+        review = self.review(5)
+        review.master = self.second
+        review.save()
+        self.assertEqual(self.rating(self.first), (0, 0))
+        self.assertEqual(self.rating(self.second), (5, 1))
+        review.delete()
+        self.assertEqual(self.rating(self.second), (0, 0))
+
+    def test_reconcile_fixes_drift(self):
+        # bulk_create не отправляет сигналов - рейтинг расходится с отзывами
+        Review.objects.bulk_create([Review(name="Клиент", text="Текст", rating=3, master=self.second)])
+        self.assertEqual(reconcile_master_ratings(), 1)
+        self.assertEqual(self.rating(self.second), (3, 1))
+        self.assertEqual(reconcile_master_ratings(), 0)
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        for index in range(STREAM_FIRST_CHUNK_SIZE + 10):
+            order = Order.objects.create(name=f"Клиент {index}", phone="1")
+            order.services.add(service)
+
+    def cards(self, chunk):
+        return chunk.count("Стрижка")
+
+    def test_first_chunk_is_small_then_full_chunks(self):
+        response = self.client.get(reverse("orders"), {"stream": "1"})
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        # Шапка, маленькая первая пачка, остаток одной пачкой, подвал
+        self.assertEqual([self.cards(chunk) for chunk in chunks[1:-1]], [STREAM_FIRST_CHUNK_SIZE, 10])
+
+    async def test_async_chunks_are_prefetched(self):
+        queryset = Order.objects.prefetch_related("services").order_by("id")
+        chunks = [chunk async for chunk in _arender_items(queryset, "include_order_card.html", "order", 500)]
+        self.assertEqual([self.cards(chunk) for chunk in chunks], [STREAM_FIRST_CHUNK_SIZE, 10])
+
+
+@override_settings(THUMBNAIL_WIDTHS=(16, 32), THUMBNAIL_FORMATS=("webp",), THUMBNAILS_ASYNC=True)
+class ThumbnailJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def photo(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (48, 48), "green").save(buffer, format="PNG")
+        return SimpleUploadedFile("master.png", buffer.getvalue(), content_type="image/png")
+
+    def test_upload_enqueues_job_that_builds_variants(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            master = Master.objects.create(name="Иван", phone="1", photo=self.photo())
+        # Ничего не строится в процессе, сохранившем файл
+        self.assertEqual(callbacks, [])
+        master.refresh_from_db()
+        self.assertFalse(master.thumbnails)
+
+        [job] = jobs.claim("w1", 10)
+        self.assertEqual((job.name, job.payload), ("thumbnails.refresh", {"model": "Master", "pk": master.pk}))
+        self.assertTrue(jobs.run(job))
+        master.refresh_from_db()
+        self.assertEqual((master.thumbnails["widths"], master.thumbnails["formats"]), ([16, 32], ["webp"]))
+
+    def test_unchanged_photo_enqueues_nothing(self):
+        master = Master.objects.create(name="Иван", phone="1", photo=self.photo())
+        jobs.run(jobs.claim("w1", 10)[0])
+        master.refresh_from_db()
+        master.name = "Иван Петров"
+        master.save()
+        self.assertFalse(Job.objects.filter(status="queued").exists())
+
+    def test_command_builds_variants_in_batches(self):
+        masters = [Master.objects.create(name=f"Мастер {i}", phone="1", photo=self.photo()) for i in range(2)]
+        broken = Master.objects.create(name="Без файла", phone="1", photo="masters/missing.png")
+        Master.objects.create(name="Без фото", phone="1")
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("generate_thumbnails", model=["master"], workers=1, batch_size=1, stdout=stdout, stderr=stderr)
+        self.assertIn("Миниатюры готовы: 2 из 3", stdout.getvalue())
+        self.assertIn(f"Master #{broken.pk}", stderr.getvalue())
+        for master in masters:
+            master.refresh_from_db()
+            self.assertEqual(master.thumbnails["widths"], [16, 32])
+
+
+class MinifyTests(SimpleTestCase):
+    def test_code_after_closed_comment_is_kept(self):
+        self.assertEqual(minify_js("/* a */ var x = 1;\nvar y = 2;"), "var x = 1;\nvar y = 2;")
+
+    def test_comment_markers_inside_literals_are_kept(self):
+        template = "const t = `\n  // не комментарий\n  /* тоже */ ${a ? `${b}` : c}\n`;"
+        self.assertEqual(minify_js(template + "\n// комментарий"), template)
+        strings = "var s = 'it\\'s // ok', u = \"/* ok */\";"
+        self.assertEqual(minify_js(strings + " // хвост"), strings)
+        regex = "var r = /\\/*[/*]/g, d = a / b / c;"
+        self.assertEqual(minify_js(regex), regex)
+
+    def test_indentation_and_blank_lines_are_removed(self):
+        self.assertEqual(minify_js("function f() {\n    return 1;\n\n}\n"), "function f() {\nreturn 1;\n}")
+
+    def test_css_strings_are_kept(self):
+        css = 'a::before { content: "a  /* b */ { c ;}" ; }\n/* it\'s */ .b  >  .c { font: 12px "Open  Sans" ; }'
+        self.assertEqual(minify_css(css), 'a::before{content: "a  /* b */ { c ;}"}.b>.c{font: 12px "Open  Sans"}')
+
+
+class ReviewPublishActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+
+    def unpublish(self, review):
+        return self.client.post(
+            reverse("admin:core_review_changelist"),
+            {"action": "unpublish", "_selected_action": [review.pk]},
+        )
+
+    def test_unpublished_review_leaves_cached_landing(self):
+        review = Review.objects.create(name="Клиент", text="Лучший барбершоп в городе", rating=5)
+        self.assertContains(self.client.get(reverse("landing")), "Лучший барбершоп в городе")
+        self.assertEqual(self.unpublish(review).status_code, 302)
+        self.assertNotContains(self.client.get(reverse("landing")), "Лучший барбершоп в городе")
+
+    def test_unpublish_updates_master_rating(self):
+        master = Master.objects.create(name="Иван", phone="1")
+        review = Review.objects.create(name="Клиент", text="Хорошо", rating=4, master=master)
+        self.unpublish(review)
+        master.refresh_from_db()
+        self.assertEqual((master.avg_rating, master.review_count), (0, 0))
+
+
+class RollupTests(BookingDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate(self.start)
+
+    def create_order(self, master=None, status="completed", **extra):
+        order = Order.objects.create(
+            name="Клиент", phone="1", master=master, status=status, appointment_date=self.start, **extra
+        )
+        order.services.add(self.service)
+        return order
+
+    def rollup_jobs(self):
+        return list(Job.objects.filter(name="rollups.refresh_days", status="queued").values_list("payload", flat=True))
+
+    def test_refresh_range_writes_and_replaces_rows(self):
+        order = self.create_order(self.first)
+        self.create_order(None, status="new")
+        rollups.refresh_days([self.day])
+        daily = DailyRevenue.objects.get(day=self.day)
+        self.assertEqual((daily.orders_count, daily.completed_count, daily.revenue, daily.booked_minutes), (2, 1, 1000, 120))
+        self.assertEqual(DailyServiceRevenue.objects.get(day=self.day).orders_count, 2)
+
+        # Повторный пересчет обновляет строки на месте: заявка ушла к другому мастеру
+        Order.objects.filter(pk=order.pk).update(master=self.second)
+        rollups.refresh_days([self.day])
+        rollups.refresh_days([self.day])
+        masters = dict(DailyMasterRevenue.objects.filter(day=self.day).values_list("master_id", "orders_count"))
+        self.assertEqual(masters, {self.second.pk: 1, None: 1})
+        self.assertEqual(DailyRevenue.objects.filter(day=self.day).count(), 1)
+
+    def test_changes_in_one_transaction_make_one_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_order(self.first)
+            Order.objects.create(name="Клиент", phone="2", appointment_date=self.start + timedelta(days=1))
+        [payload] = self.rollup_jobs()
+        self.assertEqual(payload["days"], [self.day.isoformat(), (self.day + timedelta(days=1)).isoformat()])
+
+        # После коммита следующая транзакция ставит свою задачу
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_order(self.second)
+        self.assertEqual(len(self.rollup_jobs()), 2)
+
+    def test_rolled_back_job_is_not_reused(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.create_order(self.first)
+                    raise RuntimeError("откат")
+            except RuntimeError:
+                pass
+            self.assertEqual(self.rollup_jobs(), [])
+            self.create_order(self.second)
+        self.assertEqual(self.rollup_jobs(), [{"days": [self.day.isoformat()]}])
+
+    def test_job_refreshes_days(self):
+        self.create_order(self.first)
+        [job] = jobs.claim("w1", 10)
+        self.assertTrue(jobs.run(job))
+        self.assertEqual(DailyRevenue.objects.get(day=self.day).revenue, 1000)
+
+    def test_day_changed_after_rollup_is_caught_up(self):
+        order = self.create_order(self.first, status="new")
+        rollups.refresh_days([self.day])
+        since = timezone.now()
+        # update() в обход сигналов - сводка дня устарела
+        Order.objects.filter(pk=order.pk).update(status="completed", date_updated=timezone.now())
+        self.assertEqual(rollups.stale_days(since), {self.day})
+        self.assertEqual(rollups.stale_days(timezone.now() + timedelta(minutes=1)), set())
+        self.assertEqual(rollups.catch_up(since), 1)
+        self.assertEqual(DailyRevenue.objects.get(day=self.day).revenue, 1000)
+        self.assertEqual(rollups.stale_days(since), set())
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], DATABASE_STICKY_SECONDS=15)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_db(self):
+        return self.router.db_for_read(Order)
+
+    def test_reads_go_to_replica_writes_to_primary(self):
+        self.assertEqual(self.read_db(), "replica1")
+        self.assertEqual(self.router.db_for_write(Order), "default")
+        with use_primary():
+            self.assertEqual(self.read_db(), "default")
+        self.assertEqual(self.read_db(), "replica1")
+
+    def test_write_request_reads_primary_and_sets_sticky_cookie(self):
+        seen = []
+        middleware = ReplicaRoutingMiddleware(lambda request: seen.append(self.read_db()) or HttpResponse())
+        response = middleware(self.factory.post("/order/create/"))
+        self.assertEqual(seen, ["default"])
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 15)
+        # После запроса выбор базы сброшен
+        self.assertEqual(self.read_db(), "replica1")
+
+        request = self.factory.get("/orders/")
+        request.COOKIES[STICKY_COOKIE] = "1"
+        middleware(request)
+        middleware(self.factory.get("/orders/"))
+        self.assertEqual(seen, ["default", "default", "replica1"])
+
+    def test_streamed_body_keeps_sticky_reads(self):
+        def view(request):
+            return StreamingHttpResponse(self.read_db() for _ in range(3))
+
+        request = self.factory.get("/orders/", {"stream": "1"})
+        request.COOKIES[STICKY_COOKIE] = "1"
+        response = ReplicaRoutingMiddleware(view)(request)
+        self.assertEqual(b"".join(response.streaming_content), b"default" * 3)
+        self.assertEqual(self.read_db(), "replica1")
+
+        response = ReplicaRoutingMiddleware(view)(self.factory.get("/orders/"))
+        self.assertEqual(b"".join(response.streaming_content), b"replica1" * 3)
+
+    async def test_async_streamed_body_keeps_sticky_reads(self):
+        async def content():
+            for _ in range(2):
+                yield self.read_db()
+
+        async def view(request):
+            return StreamingHttpResponse(content())
+
+        request = self.factory.get("/orders/")
+        request.COOKIES[STICKY_COOKIE] = "1"
+        response = await ReplicaRoutingMiddleware(view)(request)
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), b"default" * 2)
+        self.assertEqual(self.read_db(), "replica1")
+
+
+@override_settings(DATABASE_WRITE_QUEUE=True)
+class WriteQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.queue = WriteQueue()
+        self.addCleanup(self.queue.shutdown)
+
+    def test_writes_run_one_at_a_time_in_writer_thread(self):
+        lock = threading.Lock()
+        state = {"active": 0, "max": 0, "threads": set()}
+
+        def write(i):
+            with lock:
+                state["active"] += 1
+                state["max"] = max(state["max"], state["active"])
+                state["threads"].add(threading.current_thread().name)
+            time_module.sleep(0.005)
+            with lock:
+                state["active"] -= 1
+            return i * 2
+
+        results = {}
+        callers = [
+            threading.Thread(target=lambda i=i: results.__setitem__(i, self.queue.run(write, i)))
+            for i in range(8)
+        ]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(results, {i: i * 2 for i in range(8)})
+        self.assertEqual(state["max"], 1)
+        self.assertEqual(len(state["threads"]), 1)
+        self.assertTrue(state["threads"].pop().startswith(WRITER_THREAD_NAME))
+
+    def test_exception_reaches_caller(self):
+        def write():
+            raise ValueError("boom")
+
+        with self.assertRaisesMessage(ValueError, "boom"):
+            self.queue.run(write)
+        # Поток-писатель продолжает работать после ошибки
+        self.assertEqual(self.queue.run(lambda: 1), 1)
+
+    def test_nested_call_from_writer_runs_inline(self):
+        def inner():
+            return threading.current_thread().name
+
+        self.assertTrue(self.queue.run(lambda: self.queue.run(inner)).startswith(WRITER_THREAD_NAME))
+
+    def test_disabled_queue_runs_inline(self):
+        with self.settings(DATABASE_WRITE_QUEUE=False):
+            self.assertEqual(self.queue.run(lambda: threading.current_thread().name), threading.current_thread().name)
+
+    def test_flush_and_shutdown_wait_for_queued_writes(self):
+        done = []
+        started = threading.Event()
+
+        def write(i):
+            started.set()
+            time_module.sleep(0.01)
+            done.append(i)
+
+        caller = threading.Thread(target=self.queue.run, args=(write, 1))
+        caller.start()
+        started.wait()
+        self.queue.flush()
+        self.assertEqual(done, [1])
+
+        started.clear()
+        caller = threading.Thread(target=self.queue.run, args=(write, 2))
+        caller.start()
+        started.wait()
+        self.queue.shutdown()
+        self.assertEqual(done, [1, 2])
+        caller.join()
+
+        # После остановки очередь поднимает новый поток при следующей записи
+        self.assertEqual(self.queue.run(lambda: 3), 3)
+        self.queue.flush()
+
+
+class LandingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.master = Master.objects.create(name="Иван", phone="1")
+        self.service = Service.objects.create(name="Стрижка", price=1000, duration=60)
+        self.review = Review.objects.create(name="Клиент", text="Отлично", rating=5, master=self.master)
+
+    def landing(self):
+        return self.client.get(reverse("landing"))
+
+    def test_warm_hit_runs_no_queries(self):
+        self.landing()
+        with self.assertNumQueries(0):
+            response = self.landing()
+        self.assertContains(response, "Отлично")
+
+    def test_master_change_refreshes_master_and_review_sections(self):
+        self.landing()
+        self.master.name = "Петр"
+        self.master.save()
+        content = self.landing().content.decode()
+        self.assertIn('<h5 class="card-title">Петр</h5>', content)
+        self.assertIn("Мастер: Петр", content)
+        self.assertNotIn("Иван", content)
+
+    def test_master_services_change_refreshes_masters_section(self):
+        self.assertContains(self.landing(), "Предоставляет услуг: 0")
+        self.master.services.add(self.service)
+        self.assertContains(self.landing(), "Предоставляет услуг: 1")
+
+    def test_service_change_refreshes_page(self):
+        self.landing()
+        self.service.name = "Бритье"
+        self.service.save()
+        self.assertContains(self.landing(), "Бритье")
+        self.service.delete()
+        self.assertNotContains(self.landing(), "Бритье")
+
+    def test_review_change_refreshes_page(self):
+        self.landing()
+        Review.objects.create(name="Гость", text="Вернусь еще", rating=5)
+        self.assertContains(self.landing(), "Вернусь еще")
+        self.review.delete()
+        self.assertNotContains(self.landing(), "Отлично")
+
+    def test_each_model_bumps_only_its_version(self):
+        before = get_versions("master", "service", "review")
+        Service.objects.create(name="Укладка", price=500, duration=30)
+        after = get_versions("master", "service", "review")
+        self.assertEqual(after["service"], before["service"] + 1)
+        self.assertEqual((after["master"], after["review"]), (before["master"], before["review"]))
+
+    def test_evicted_version_does_not_reuse_old_numbers(self):
+        etags = {services_list_etag(None)}
+        for _ in range(3):
+            cache.delete(VERSION_KEY % "service")
+            etags.add(services_list_etag(None))
+            cache.delete(VERSION_KEY % "service")
+            bump_version("service")
+            etags.add(services_list_etag(None))
+        self.assertEqual(len(etags), 7)
+
+
+class QueryMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_request_line_counts_queries(self):
+        Service.objects.create(name="Стрижка", price=1000, duration=60)
+        with self.assertLogs("core.metrics", "INFO") as logs, CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("services-list"))
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(logs.records[-1].levelname, "INFO")
+        self.assertEqual(line["view"], "services-list")
+        self.assertEqual(line["path"], "/services/")
+        self.assertEqual((line["method"], line["status"]), ("GET", 200))
+        self.assertEqual(line["queries"], len(queries))
+        self.assertGreaterEqual(line["ms"], line["db_ms"])
+        self.assertEqual(registry.snapshot()["services-list"]["requests"], 1)
+
+    @override_settings(METRICS_DUPLICATE_QUERY_THRESHOLD=3)
+    def test_repeated_queries_logged_as_warning(self):
+        def view(request):
+            for _ in range(3):
+                Service.objects.filter(pk=1).first()
+            return HttpResponse()
+
+        with self.assertLogs("core.metrics", "INFO") as logs:
+            QueryMetricsMiddleware(view)(RequestFactory().get("/services/"))
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(logs.records[-1].levelname, "WARNING")
+        self.assertEqual((line["view"], line["path"], line["queries"]), ("unresolved", "/services/", 3))
+        self.assertEqual(list(line["n_plus_one"].values()), [3])
+        self.assertEqual(registry.snapshot()["unresolved"]["n_plus_one"], 1)
+
+    async def test_async_request_counts_queries(self):
+        async def view(request):
+            await Service.objects.acount()
+            return HttpResponse()
+
+        with self.assertLogs("core.metrics", "INFO") as logs:
+            await QueryMetricsMiddleware(view)(RequestFactory().get("/"))
+        self.assertEqual(json.loads(logs.records[-1].getMessage())["queries"], 1)
+
+
+# Асинхронные view поверх маршрутов проекта (ASYNC_VIEWS читается при импорте urls)
+urlpatterns = [
+    path("", async_views.landing, name="landing"),
+    path("orders/<int:order_id>/", async_views.order_detail, name="order_detail"),
+    path("services/", async_views.services_list, name="services-list"),
+] + project_urlpatterns
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewsCacheTests(BookingDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.loop_calls = []
+        for name in ("get", "get_many", "add", "set"):
+            patcher = mock.patch.object(LocMemCache, name, self.guard(getattr(LocMemCache, name)))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def guard(self, method):
+        # Синхронный вызов кэша в потоке цикла событий блокировал бы его
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                self.loop_calls.append(method.__name__)
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    async def test_landing_reads_cache_without_blocking_loop(self):
+        await Review.objects.acreate(name="Клиент", text="Отлично", rating=5)
+        first = await self.async_client.get("/")
+        self.assertContains(first, "Отлично")
+        second = await self.async_client.get("/")
+        self.assertEqual(second.content, first.content)
+        not_modified = await self.async_client.get("/", headers={"if-none-match": first["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.loop_calls, [])
+
+    async def test_etag_views_read_versions_without_blocking_loop(self):
+        response = await self.async_client.get("/services/")
+        self.assertContains(response, self.service.name)
+        await Service.objects.acreate(name="Бритье", price=500, duration=30)
+        changed = await self.async_client.get("/services/", headers={"if-none-match": response["ETag"]})
+        self.assertContains(changed, "Бритье")
+
+        order = await Order.objects.acreate(name="Клиент", phone="1", appointment_date=self.start)
+        detail = await self.async_client.get(f"/orders/{order.pk}/")
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(self.loop_calls, [])
+
+
+@override_settings(ORDER_ADMIN_SCALE_MODE=True, ADMIN_COUNT_LIMIT=3)
+class OrderAdminScaleModeTests(BookingDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pass"))
+        self.orders = [self.create_order(self.first, f"+7999000000{i}") for i in range(4)]
+        self.orders.append(self.create_order(self.second, "+79990000009"))
+
+    def create_order(self, master, phone):
+        order = Order.objects.create(name="Клиент", phone=phone, master=master, appointment_date=self.start)
+        order.services.add(self.service)
+        return order
+
+    def changelist(self, **params):
+        return self.client.get(reverse("admin:core_order_changelist"), params)
+
+    def master_filter(self, response):
+        return next(spec for spec in response.context["cl"].filter_specs if isinstance(spec, MasterAutocompleteFilter))
+
+    def test_unfiltered_count_is_cached(self):
+        self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 20).count, 5)
+        self.create_order(self.second, "+79990000010")
+        with self.assertNumQueries(0):
+            # Оценка обновится по ADMIN_COUNT_CACHE_TIMEOUT
+            self.assertEqual(EstimatedCountPaginator(Order.objects.all(), 20).count, 5)
+
+    def test_filtered_count_stops_at_limit(self):
+        self.assertEqual(EstimatedCountPaginator(Order.objects.filter(master=self.first), 20).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Order.objects.filter(master=self.second), 20).count, 1)
+
+    def test_changelist_skips_full_count(self):
+        self.changelist()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist(status__exact="new")
+        self.assertEqual(response.status_code, 200)
+        counts = [query["sql"] for query in queries if "COUNT(" in query["sql"]]
+        # Один ограниченный подсчет отфильтрованных заявок, без COUNT(*) по всей таблице
+        self.assertEqual(len(counts), 1)
+        self.assertIn("LIMIT 3", counts[0])
+
+    def test_autocomplete_filter_loads_only_selected_master(self):
+        response = self.changelist(master__id__exact=self.second.pk)
+        self.assertEqual(list(response.context["cl"].result_list), [self.orders[-1]])
+        spec = self.master_filter(response)
+        self.assertEqual(spec.lookup_choices, [(self.second.pk, str(self.second))])
+        self.assertIn("field_name=master", spec.autocomplete_url)
+        # Без выбранного значения мастера не загружаются вовсе
+        self.assertEqual(self.master_filter(self.changelist()).lookup_choices, [])
+
+    def test_bulk_cancel_frees_cached_slots(self):
+        day = timezone.localdate(self.start)
+        self.assertEqual(len(availability.intervals([self.first.pk], day)[self.first.pk]), 4)
+        self.client.post(
+            reverse("admin:core_order_changelist"),
+            {"action": "mark_canceled", "_selected_action": [order.pk for order in self.orders[:4]]},
+        )
+        self.assertEqual(availability.intervals([self.first.pk], day)[self.first.pk], [])
+
+    def test_autocomplete_filter_rejects_bad_value(self):
+        response = self.changelist(master__id__exact="abc")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("e=1", response.url)
+
+    @override_settings(ORDER_ADMIN_ACTION_CHUNK_SIZE=2)
+    def test_bulk_status_action_refreshes_denormalized_data(self):
+        targets = self.orders[:3]
+        with mock.patch("core.signals.get_search_backend") as search:
+            response = self.client.post(
+                reverse("admin:core_order_changelist"),
+                {"action": "mark_completed", "_selected_action": [order.pk for order in targets]},
+            )
+        self.assertEqual(response.status_code, 302)
+        # update() идет мимо save() и сигналов
+        search.assert_not_called()
+        self.assertEqual(Order.objects.filter(status="completed").count(), 3)
+
+        # Статистика клиентов пересчитана в той же транзакции
+        stats = CustomerStats.objects.get(phone_normalized=targets[0].phone_normalized)
+        self.assertEqual((stats.completed_orders, stats.revenue), (1, self.service.price))
+        self.assertEqual(CustomerStats.objects.filter(completed_orders=1).count(), 3)
+        # Сводки - одна задача на все пачки, ее выполняет воркер
+        [job] = jobs.claim("w1", 10)
+        self.assertEqual((job.name, job.payload), ("rollups.refresh_days", {"days": [self.start.date().isoformat()]}))
+        self.assertTrue(jobs.run(job))
+        self.assertEqual(DailyRevenue.objects.get(day=self.start.date()).revenue, 3 * self.service.price)
@@ -0,0 +1,119 @@
+# core/thumbnails.py
+"""
+Уменьшенные копии фото мастеров и изображений услуг в форматах AVIF и WebP.
+
+Варианты лежат в storage по ключу из хэша содержимого исходника:
+thumbs/ab/<ключ>-<ширина>.<формат>. Один и тот же файл, загруженный повторно,
+не пережимается - варианты уже есть. Сводка (ключ, ширины, форматы, имя
+исходника) хранится в поле thumbnails модели и используется в шаблонах
+тегами {% picture %} и {% srcset %} (core/templatetags/images.py).
+
+После загрузки файла варианты строит фоновая задача thumbnails.refresh
+(см. core/signals.py и core/tasks.py), для уже загруженных файлов - команда
+generate_thumbnails.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Модель -> поле с исходным изображением и версия кэша лендинга
+IMAGE_FIELDS = {"Master": ("photo", "master"), "Service": ("image", "service")}
+
+ENCODER_OPTIONS = {
+    "avif": {"quality": 55, "speed": 6},
+    "webp": {"quality": 80, "method": 4},
+}
+
+
+def thumbnail_widths():
+    return tuple(getattr(settings, "THUMBNAIL_WIDTHS", (160, 320, 640, 960)))
+
+
+def thumbnail_formats():
+    """Форматы из настройки, которые умеет кодировать установленный Pillow (лучший первым)."""
+    # Pillow импортируется при первой обработке изображения, а не при старте воркера
+    from PIL import features
+
+    return tuple(fmt for fmt in getattr(settings, "THUMBNAIL_FORMATS", ("avif", "webp")) if features.check(fmt))
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def variant_name(key, width, fmt):
+    return f"thumbs/{key[:2]}/{key}-{width}.{fmt}"
+
+
+def render_variants(data, key, widths, formats, skip=()):
+    """
+    Пережимает исходник во все ширины и форматы. Чистая функция без Django -
+    ее можно выполнять в отдельном процессе. Ширины больше исходной пропускаются
+    (без увеличения). Возвращает (ширины, {имя варианта: байты}) без имен из skip.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        usable = [width for width in sorted(widths) if width < image.width] or [image.width]
+        files = {}
+        for width in usable:
+            names = {fmt: variant_name(key, width, fmt) for fmt in formats}
+            if all(name in skip for name in names.values()):
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt, name in names.items():
+                if name in skip:
+                    continue
+                buffer = io.BytesIO()
+                resized.save(buffer, format=fmt.upper(), **ENCODER_OPTIONS.get(fmt, {}))
+                files[name] = buffer.getvalue()
+    return usable, files
+
+
+def build_thumbnails(field_file, force=False, storage=default_storage):
+    """
+    Строит варианты изображения и возвращает сводку для поля thumbnails.
+    Уже сохраненные варианты с тем же ключом не пережимаются (если не force).
+    """
+    with field_file.open("rb") as source:
+        data = source.read()
+    key = content_key(data)
+    widths, formats = thumbnail_widths(), thumbnail_formats()
+    candidates = {variant_name(key, width, fmt) for width in widths for fmt in formats}
+    existing = set() if force else {name for name in candidates if storage.exists(name)}
+    usable, files = render_variants(data, key, widths, formats, skip=existing)
+    for name, content in files.items():
+        if force and storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(content))
+    return {"source": field_file.name, "key": key, "widths": usable, "formats": list(formats)}
+
+
+def save_thumbnails(model, pk, thumbnails):
+    """
+    Записывает сводку без сигналов модели и сбрасывает кэш лендинга.
+    """
+    from .cache import bump_version
+    from .writes import write_queue
+
+    write_queue.run(lambda: model.objects.filter(pk=pk).update(thumbnails=thumbnails))
+    bump_version(IMAGE_FIELDS[model.__name__][1])
+
+
+def refresh_thumbnails(model, pk, force=False):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    field_file = getattr(instance, IMAGE_FIELDS[model.__name__][0])
+    thumbnails = build_thumbnails(field_file, force=force) if field_file else {}
+    if thumbnails != instance.thumbnails:
+        save_thumbnails(model, pk, thumbnails)
+    return thumbnails
+
@@ -1,18 +1,56 @@
 # core/views.py
 from django.shortcuts import render, HttpResponse, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from .data import orders
 from .models import Order, Master, Service, Review  # Модель Review еще не создана
 from .forms import OrderForm
-from django.db.models import Q, Count, Sum
+from .pagination import paginate_orders
+from .search import get_search_backend
+from django.db import IntegrityError
+from django.db.models import Q, Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .availability import engine as availability
+from .cache import (
+    cache_timeout,
+    landing_etag,
+    landing_page_key,
+    landing_versions,
+    order_detail_etag,
+    services_list_etag,
+)
+from django.core.cache import cache
+from django.views.decorators.http import condition
+from django.contrib.admin.views.decorators import staff_member_required
+from .metrics import registry as metrics_registry
+from .bulk import export_lines
+from .streaming import streaming_render
+from .writes import immediate_atomic, write_queue
+from .tasks import enqueue_order_jobs
+from . import idempotency
+from .ratelimit import allow_order, refund_order
+import os
+from datetime import datetime, time, timedelta
 
 
+@condition(etag_func=landing_etag)
 def landing(request):
     """
     Отвечает за маршрут '/'
+    Анонимным посетителям отдаем готовую страницу из кэша, секции кэшируются
+    отдельно тегом {% cache %} - см. core/cache.py.
     """
-    masters = Master.objects.prefetch_related('services').annotate(num_services=Count('services'))
+    versions = landing_versions(request)
+    page_key = landing_page_key(versions)
+    use_page_cache = not request.user.is_authenticated
+    if use_page_cache:
+        html = cache.get(page_key)
+        if html is not None:
+            return HttpResponse(html)
+
+    # Запросы ленивые: если фрагмент секции есть в кэше, запрос к базе не выполнится
+    masters = Master.objects.prefetch_related('services').annotate(num_services=Count('services')).order_by('-avg_rating', '-review_count', 'id')
     services = Service.objects.all()
     
     # Если у вас есть модель Review, раскомментируйте и измените эту строку:
@@ -22,8 +60,13 @@ def landing(request):
         "masters": masters,
         "services": services,
         "reviews": reviews,  # Не забудьте раскомментировать эту строку
+        "versions": versions,
+        "cache_timeout": cache_timeout(),
     }
-    return render(request, "landing.html", context=context)
+    response = render(request, "landing.html", context=context)
+    if use_page_cache:
+        cache.set(page_key, response.content, cache_timeout())
+    return response
 
 
 def thanks(request):
@@ -34,9 +77,20 @@ def thanks(request):
     return render(request, "thanks.html", context=context)
 
 
-def orders_list(request):
+def selected_statuses(request):
     """
-    Отвечает за маршрут 'orders/'
+    Статусы, отмеченные в фильтре списка заявок. Все четыре - то же,
+    что без фильтра, пагинатору их передавать не нужно.
+    """
+    statuses = [status for status, _ in Order.STATUS_CHOICES if request.GET.get(f"status_{status}")]
+    return statuses if len(statuses) < len(Order.STATUS_CHOICES) else []
+
+
+def orders_filter(request):
+    """
+    Разбирает GET-параметры страницы заявок - общая часть синхронного
+    и асинхронного (core/async_views.py) view. Запросов к базе не выполняет.
+    Возвращает (queryset, поисковый запрос, поля поиска, порядок сортировки).
     """
     # Получаю из GET запроса все данные URL
     # ПОИСКОВАЯ ФОРМА
@@ -59,19 +113,17 @@ def orders_list(request):
     checkbox_status_canceled = request.GET.get("status_canceled", "")
 
     # РАДИОКНОПКА Порядок сортировки по дате
-    # order_by_date - desc, asc
+    # order_by_date - desc, asc, relevance (только при поиске)
     order_by_date = request.GET.get("order_by_date", "desc")
 
-    # 1. Создаем Q-объект для текстового поиска
-    search_q = Q()
-    if search_query:
-        # Внутренние условия поиска объединяем через ИЛИ (|=)
-        if checkbox_phone:
-            search_q |= Q(phone__icontains=search_query)
-        if checkbox_name:
-            search_q |= Q(name__icontains=search_query)
-        if checkbox_comment:
-            search_q |= Q(comment__icontains=search_query)
+    # 1. Поля для текстового поиска - чекбоксы превращаются в колонки поискового индекса
+    search_fields = []
+    if checkbox_phone:
+        search_fields.append("phone")
+    if checkbox_name:
+        search_fields.append("name")
+    if checkbox_comment:
+        search_fields.append("comment")
 
     # 2. Создаем Q-объект для фильтрации по статусам
     status_q = Q()
@@ -85,25 +137,80 @@ def orders_list(request):
     if checkbox_status_canceled:
         status_q |= Q(status="canceled")
 
-    # Порядок сортировки
-    ordering = "-date_created" if order_by_date == "desc" else "date_created"
+    orders = Order.objects.prefetch_related("services").select_related("master").filter(status_q)
+
+    # Диапазон дат создания заявки - границами по datetime, чтобы работал индекс по date_created
+    date_from = parse_date(request.GET.get("date_from", "") or "")
+    date_to = parse_date(request.GET.get("date_to", "") or "")
+    if date_from:
+        orders = orders.filter(date_created__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        day_after = date_to + timedelta(days=1)
+        orders = orders.filter(date_created__lt=timezone.make_aware(datetime.combine(day_after, time.min)))
+
+    search_query = search_query if search_fields else ""
+    return orders, search_query, search_fields, order_by_date
+
 
-    # 3. Объединяем два Q-объекта через И (&)
-    # Это гарантирует, что запись должна соответствовать И условиям поиска, И условиям статуса
-    orders = Order.objects.prefetch_related("services").select_related("master").filter(search_q & status_q).order_by(ordering)
+def stream_ordering(order_by_date):
+    ordering = "-date_created" if order_by_date != "asc" else "date_created"
+    return ordering, ordering.replace("date_created", "id")
 
-    context = {"orders": orders}
 
-    return render(request, "orders_list.html", context=context)
+def orders_page_context(request, orders, next_cursor):
+    # Ссылки "Далее" и "В начало" сохраняют все параметры фильтра
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    first_query = params.urlencode() if "cursor" in request.GET else None
+    next_query = None
+    if next_cursor:
+        params["cursor"] = next_cursor
+        next_query = params.urlencode()
+    return {"orders": orders, "next_query": next_query, "first_query": first_query}
 
 
+def orders_list(request):
+    """
+    Отвечает за маршрут 'orders/'
+    """
+    orders, search_query, search_fields, order_by_date = orders_filter(request)
+
+    # 3. Сортировка по релевантности - одна страница лучших совпадений из поискового индекса
+    if search_query and order_by_date == "relevance":
+        ranked_ids = get_search_backend().ranked_ids(search_query, search_fields, queryset=orders)
+        position = {order_id: index for index, order_id in enumerate(ranked_ids)}
+        orders = sorted(orders.filter(id__in=ranked_ids), key=lambda order: position[order.id])
+        return render(request, "orders_list.html", context={"orders": orders})
+
+    # Условия поиска и статусов объединяются через И
+    if search_query:
+        orders = get_search_backend().filter(orders, search_query, search_fields)
+
+    # Потоковый режим: все найденные заявки без пагинации, карточки отдаются пачками
+    if request.GET.get("stream"):
+        return streaming_render(
+            request, "orders_list.html", {}, orders.order_by(*stream_ordering(order_by_date)),
+            "include_order_card.html", "order",
+        )
+
+    # 4. Курсорная пагинация по (date_created, id) - порядок сортировки задает сам пагинатор
+    orders, next_cursor = paginate_orders(
+        orders,
+        cursor=request.GET.get("cursor"),
+        descending=order_by_date != "asc",
+        statuses=selected_statuses(request),
+    )
+    return render(request, "orders_list.html", context=orders_page_context(request, orders, next_cursor))
+
+
+@condition(etag_func=order_detail_etag)
 def order_detail(request, order_id):
     """
     Отвечает за маршрут 'orders/<int:order_id>/'
     :param request: HttpRequest
     :param order_id: int (номер заказа)
     """
-    order = Order.objects.prefetch_related("services").select_related("master").annotate(total_price=Sum('services__price')).get(id=order_id)
+    order = Order.objects.prefetch_related("services").select_related("master").get(id=order_id)
 
     context = {"order": order}
     return render(request, "order_detail.html", context=context)
@@ -113,11 +220,77 @@ def order_page(request):
     form = OrderForm()
     return render(request, 'order_page.html', {'form': form})
 
+def _validate_and_save(form, idempotency_key=""):
+    with immediate_atomic():
+        is_valid = form.is_valid()
+        if is_valid:
+            order = form.save()
+            if idempotency_key:
+                idempotency.remember(idempotency_key, order)
+            # Уведомления и прочее - в фоновых задачах (core/tasks.py), запрос их не ждет
+            enqueue_order_jobs(order)
+    return is_valid
+
+
+def save_order_form(form, idempotency_key=""):
+    """
+    Проверка свободного времени и сохранение - в одной транзакции,
+    чтобы два клиента не заняли одного мастера на одно время.
+    Выполняется через очередь записи (core/writes.py).
+    Повторная отправка с тем же ключом идемпотентности считается успешной.
+    """
+    try:
+        return write_queue.run(_validate_and_save, form, idempotency_key)
+    except IntegrityError:
+        if idempotency.is_used(idempotency_key):
+            metrics_registry.increment("order_duplicate")
+            return True
+        raise
+
+
+def check_order_submission(request):
+    """
+    Проверки до валидации формы: повтор уже принятой отправки и лимиты частоты.
+    Возвращает "duplicate", "limited" или None.
+    """
+    if idempotency.is_used(request.POST.get("idempotency_key", "")):
+        metrics_registry.increment("order_duplicate")
+        return "duplicate"
+    if not write_queue.run(allow_order, request):
+        return "limited"
+    return None
+
+
+def submit_order_form(request, form):
+    """
+    Сохраняет заявку, прошедшую check_order_submission. Не прошедшая проверку
+    форма возвращает токен телефона (см. ratelimit.refund_order).
+    """
+    saved = save_order_form(form, request.POST.get("idempotency_key", ""))
+    if not saved:
+        write_queue.run(refund_order, request)
+    return saved
+
+
+def rate_limited_form(request):
+    """Форма с введенными данными для ответа 429 (без проверки - ее не выполняем для спама)."""
+    initial = {
+        field: request.POST.get(field, "") for field in ("name", "phone", "master", "appointment_date", "idempotency_key")
+    }
+    initial["services"] = request.POST.getlist("services")
+    return OrderForm(initial=initial)
+
+
 def order_create(request):
     if request.method == "POST":
+        verdict = check_order_submission(request)
+        if verdict == "duplicate":
+            return redirect("thanks")
+        if verdict == "limited":
+            context = {"form": rate_limited_form(request), "rate_limited": True}
+            return render(request, "order_page.html", context, status=429)
         form = OrderForm(request.POST)
-        if form.is_valid():
-            form.save()
+        if submit_order_form(request, form):
             messages.success(request, "Заявка успешно отправлена!")
             return redirect("thanks")
         # Если форма невалидна, снова рендерим страницу с формой и ошибками
@@ -126,6 +299,60 @@ def order_create(request):
     return redirect('order-page')
 
 
+@condition(etag_func=services_list_etag)
 def services_list(request):
     services = Service.objects.all()
     return render(request, "services_list.html", {"services": services})
+
+
+def order_slots(request):
+    """
+    Отвечает за маршрут 'order/slots/'
+    Свободное время на день: ?date=2025-03-20&services=1&services=2[&master=3]
+    """
+    day = parse_date(request.GET.get("date", "") or "")
+    if day is None:
+        return JsonResponse({"error": "Укажите дату в формате ГГГГ-ММ-ДД"}, status=400)
+    service_ids = [pk for pk in request.GET.getlist("services") if pk.isdigit()]
+    services = list(Service.objects.filter(pk__in=service_ids))
+    master_id = request.GET.get("master")
+    master_id = int(master_id) if master_id and master_id.isdigit() else None
+
+    slots = availability.free_slots(day, services, master_id=master_id)
+    return JsonResponse({
+        "date": day.isoformat(),
+        "slots": {
+            str(master_id): [timezone.localtime(start).strftime("%H:%M") for start in starts]
+            for master_id, starts in slots.items()
+        },
+    })
+
+
+@staff_member_required
+def metrics(request):
+    """
+    Отвечает за маршрут 'metrics/'
+    Гистограммы QueryMetricsMiddleware и счетчики событий текущего процесса;
+    ?reset=1 обнуляет их после выдачи.
+    """
+    data = {"pid": os.getpid(), "views": metrics_registry.snapshot(), "counters": metrics_registry.counters()}
+    if request.GET.get("reset"):
+        metrics_registry.reset()
+    return JsonResponse(data, json_dumps_params={"ensure_ascii": False})
+
+
+@staff_member_required
+def orders_export(request):
+    """
+    Отвечает за маршрут 'orders/export/'
+    Потоковая выгрузка заявок: ?format=csv|jsonl&after_id=<id> (продолжить с заявки после id).
+    """
+    file_format = "jsonl" if request.GET.get("format") == "jsonl" else "csv"
+    after_id = request.GET.get("after_id", "")
+    after_id = int(after_id) if after_id.isdigit() else 0
+    response = StreamingHttpResponse(
+        export_lines(file_format, after_id=after_id),
+        content_type="application/x-ndjson" if file_format == "jsonl" else "text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="orders.{file_format}"'
+    return response
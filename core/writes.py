@@ -0,0 +1,113 @@
+# core/writes.py
+"""
+Очередь записи в базу с одним потоком-писателем.
+
+SQLite допускает только одного писателя: при одновременных записях из
+нескольких потоков они ждут друг друга в busy_timeout и могут упасть
+с "database is locked". Через очередь записи процесса выполняются по одной
+в отдельном потоке, а вызывающий поток ждет результат.
+
+Включается настройкой DATABASE_WRITE_QUEUE (профиль production). Внутри уже
+открытой транзакции запись выполняется на месте: поток-писатель работает
+со своим соединением и не увидел бы незакоммиченных данных.
+
+immediate_atomic() - транзакция для записей, которые сначала читают (проверка
+свободного времени при бронировании): на SQLite она сразу берет блокировку записи.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+WRITER_THREAD_NAME = "db-writer"
+
+
+@contextmanager
+def immediate_atomic(using="default"):
+    """
+    transaction.atomic(), который на SQLite начинается с BEGIN IMMEDIATE.
+
+    Обычная (DEFERRED) транзакция берет блокировку записи только на первом
+    INSERT/UPDATE: два бронирования успели бы прочитать одно и то же свободное
+    время, а SELECT ... FOR UPDATE в SQLite нет. Режим включается только
+    на эту транзакцию - остальные atomic() (админка, чтение) писателей не ждут.
+    Внутри уже открытой транзакции - обычная точка сохранения.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # Режим читается из OPTIONS при подключении - подключаемся заранее
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous
+            yield
+    finally:
+        connection.transaction_mode = previous
+
+
+class WriteQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, "DATABASE_WRITE_QUEUE", False)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=WRITER_THREAD_NAME)
+            return self._executor
+
+    @staticmethod
+    def _call(func, args, kwargs):
+        # Соединение писателя живет между задачами (CONN_MAX_AGE) - проверяем его,
+        # как это делает обработчик запросов
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    def _run_inline(self, using):
+        return (
+            not self.enabled
+            or threading.current_thread().name.startswith(WRITER_THREAD_NAME)
+            or connections[using].in_atomic_block
+        )
+
+    def run(self, func, *args, using="default", **kwargs):
+        """
+        Выполняет func в потоке-писателе и возвращает ее результат
+        (исключения пробрасываются вызывающему).
+        """
+        if self._run_inline(using):
+            return func(*args, **kwargs)
+        # Контекст вызывающего (метрики запроса, выбор базы для чтения) переносим в поток-писатель
+        context = contextvars.copy_context()
+        return self._get_executor().submit(context.run, self._call, func, args, kwargs).result()
+
+    def flush(self):
+        """Ждет завершения уже поставленных в очередь записей."""
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.submit(lambda: None).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+write_queue = WriteQueue()